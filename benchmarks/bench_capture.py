@@ -0,0 +1,56 @@
+"""
+Compares per-URL browser launch with the shared BrowserPool on a local static page.
+
+Usage:
+    python -m benchmarks.bench_capture [--urls 8] [--pool-size 2] [--concurrency 4]
+"""
+import argparse
+import asyncio
+import time
+from pathlib import Path
+
+from src.screenshot.browser_pool import BrowserPool
+from src.screenshot.capture import capture_screenshot
+
+FIXTURE = Path(__file__).resolve().parent.parent / "tests" / "fixtures" / "static_page.html"
+
+
+async def run_per_url(urls, concurrency: int) -> float:
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def capture(url):
+        async with semaphore:
+            return await capture_screenshot(url)
+
+    start = time.perf_counter()
+    await asyncio.gather(*(capture(url) for url in urls))
+    return time.perf_counter() - start
+
+
+async def run_pooled(urls, pool_size: int, concurrency: int) -> float:
+    start = time.perf_counter()
+    async with BrowserPool(size=pool_size, max_concurrent_pages=concurrency) as pool:
+        await asyncio.gather(*(capture_screenshot(url, pool=pool) for url in urls))
+    return time.perf_counter() - start
+
+
+async def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--urls", type=int, default=8, help="Number of captures per mode")
+    parser.add_argument("--pool-size", type=int, default=2)
+    parser.add_argument("--concurrency", type=int, default=4)
+    args = parser.parse_args()
+
+    urls = [FIXTURE.as_uri()] * args.urls
+
+    per_url = await run_per_url(urls, args.concurrency)
+    pooled = await run_pooled(urls, args.pool_size, args.concurrency)
+
+    print(f"Captures per mode: {args.urls} (concurrency {args.concurrency})")
+    print(f"Per-URL launch : {per_url:8.2f} s total, {per_url / args.urls:6.2f} s/URL")
+    print(f"Pooled ({args.pool_size} br.) : {pooled:8.2f} s total, {pooled / args.urls:6.2f} s/URL")
+    print(f"Speed-up       : {per_url / pooled:8.2f}x")
+
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,70 @@
+"""
+Bytes per segment and encode time for each upload encoding setting.
+
+Runs on the segments of an existing output folder, or on synthetic
+screenshot-like segments when no folder is given.
+
+Usage:
+    python -m benchmarks.bench_encoding [--folder target_websites/example.com] [--count 6]
+"""
+import argparse
+import os
+import tempfile
+import time
+
+import numpy as np
+from PIL import Image, ImageDraw
+
+from src.analysis.encoding import encode_image
+
+SETTINGS = [
+    ("original PNG", None, "PNG", None),
+    ("2048 PNG", 2048, "PNG", None),
+    ("1536 PNG", 1536, "PNG", None),
+    ("1536 WEBP q85", 1536, "WEBP", 85),
+    ("1536 JPEG q85", 1536, "JPEG", 85),
+    ("1024 WEBP q85", 1024, "WEBP", 85),
+    ("1024 JPEG q85", 1024, "JPEG", 85),
+]
+
+
+def synthetic_segment(path: str, seed: int, size=(2560, 2000)) -> None:
+    """Light page with headline bars, 'text' lines, a button and a photo-like block."""
+    rng = np.random.default_rng(seed)
+    img = Image.new("RGB", size, color=(250, 250, 252))
+    draw = ImageDraw.Draw(img)
+    draw.rectangle((160, 120, 1600, 220), fill=(20, 30, 60))
+    for y in range(300, 1000, 48):
+        draw.rectangle((160, y, 160 + int(rng.integers(900, 2200)), y + 22), fill=(70, 70, 80))
+    draw.rounded_rectangle((160, 1080, 700, 1200), radius=24, fill=(240, 140, 20))
+    gradient = np.linspace(0, 255, 1000, dtype=np.uint8)[None, :, None]
+    photo = np.clip(gradient + rng.normal(0, 12, (700, 1000, 3)), 0, 255).astype(np.uint8)
+    img.paste(Image.fromarray(photo, "RGB"), (1400, 1250))
+    img.save(path)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--folder", help="Folder of segment_N.png files")
+    parser.add_argument("--count", type=int, default=6, help="Synthetic segments when no folder is given")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp:
+        if args.folder:
+            paths = [os.path.join(args.folder, f) for f in sorted(os.listdir(args.folder)) if f.endswith(".png")]
+        else:
+            paths = [os.path.join(tmp, f"segment_{i}.png") for i in range(1, args.count + 1)]
+            for seed, path in enumerate(paths):
+                synthetic_segment(path, seed)
+
+        print(f"{len(paths)} segments")
+        print(f"{'setting':<16} {'KB/segment':>11} {'ms/segment':>11}")
+        for label, max_edge, fmt, quality in SETTINGS:
+            start = time.perf_counter()
+            sizes = [len(encode_image(path, max_edge, fmt, quality).data) for path in paths]
+            elapsed = (time.perf_counter() - start) / len(paths) * 1000
+            print(f"{label:<16} {sum(sizes) / len(sizes) / 1024:>11.1f} {elapsed:>11.1f}")
+
+
+if __name__ == "__main__":
+    main()
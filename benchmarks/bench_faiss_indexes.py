@@ -0,0 +1,64 @@
+"""
+Recall@k, query latency and memory of each FAISS index type against the flat baseline.
+
+Vectors are synthetic and clustered, like embeddings of many similar page
+segments. Recall is measured against exact (flat) search.
+
+Usage:
+    python -m benchmarks.bench_faiss_indexes [--sizes 10000 100000] [--dimension 1536] [--k 5]
+"""
+import argparse
+import time
+
+import numpy as np
+
+from src.analysis.faiss_index import INDEX_TYPES, build_index, choose_index_type, index_memory
+
+
+def clustered_vectors(n: int, dimension: int, clusters: int = 200, seed: int = 0) -> np.ndarray:
+    rng = np.random.default_rng(seed)
+    centres = rng.normal(size=(clusters, dimension)).astype(np.float32)
+    vectors = centres[rng.integers(0, clusters, n)] + 0.3 * rng.normal(size=(n, dimension)).astype(np.float32)
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def measure(index_type: str, vectors: np.ndarray, queries: np.ndarray, truth: np.ndarray, k: int):
+    start = time.perf_counter()
+    index = build_index(vectors, index_type)
+    index.add(vectors)
+    build_seconds = time.perf_counter() - start
+
+    start = time.perf_counter()
+    for query in queries:
+        _, found = index.search(query[None, :], k)
+    latency_ms = (time.perf_counter() - start) / len(queries) * 1000
+
+    _, found = index.search(queries, k)
+    recall = np.mean([len(set(row) & set(expected)) / k for row, expected in zip(found, truth)])
+    return build_seconds, latency_ms, recall, index_memory(index) / 1024 / 1024
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000])
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--queries", type=int, default=200)
+    parser.add_argument("--k", type=int, default=5)
+    args = parser.parse_args()
+
+    for n in args.sizes:
+        vectors = clustered_vectors(n, args.dimension)
+        queries = clustered_vectors(args.queries, args.dimension, seed=1)
+        flat = build_index(vectors, "flat")
+        flat.add(vectors)
+        _, truth = flat.search(queries, args.k)
+
+        print(f"\n{n} vectors x {args.dimension} dims (auto picks {choose_index_type(n, 'auto')})")
+        print(f"{'index':>9} | {'build s':>8} | {'query ms':>8} | {f'recall@{args.k}':>9} | {'memory MB':>9}")
+        for index_type in INDEX_TYPES:
+            build_seconds, latency_ms, recall, memory = measure(index_type, vectors, queries, truth, args.k)
+            print(f"{index_type:>9} | {build_seconds:>8.2f} | {latency_ms:>8.3f} | {recall:>9.3f} | {memory:>9.1f}")
+
+
+if __name__ == "__main__":
+    main()
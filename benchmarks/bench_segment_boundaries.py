@@ -0,0 +1,62 @@
+"""
+Reports segment counts and split sections for fixed vs content-aware cuts.
+
+Fixture pages are synthetic landing pages: stacked sections of random height
+separated by whitespace gutters, rendered at the 2x capture scale.
+
+Usage:
+    python -m benchmarks.bench_segment_boundaries [--pages 5]
+"""
+import argparse
+
+import numpy as np
+from PIL import Image
+
+from src.config.setting import SEGMENT_HEIGHT, SEGMENT_OVERLAP
+from src.image_processing.segmentation import RowStatistics, content_cuts, fixed_cuts
+
+
+def fixture_page(seed: int, width: int = 1280):
+    """Returns (image, sections) for a page of textured sections with gutters between them."""
+    rng = np.random.default_rng(seed)
+    sections = []
+    y = 120
+    for _ in range(int(rng.integers(8, 16))):
+        height = int(rng.integers(300, 1800))
+        sections.append((y, y + height))
+        y += height + int(rng.integers(60, 240))
+    pixels = np.full((y + 120, width), 255, dtype=np.uint8)
+    for top, bottom in sections:
+        texture = rng.random((bottom - top, width - 80)) < 0.1
+        pixels[top:bottom, 40:width - 40][texture] = 30
+    return Image.fromarray(pixels), sections
+
+
+def split_sections(cuts, sections) -> int:
+    """Sections that no single segment contains entirely."""
+    return sum(
+        not any(top <= s_top and s_bottom <= bottom for top, bottom in cuts)
+        for s_top, s_bottom in sections
+    )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--pages", type=int, default=5)
+    args = parser.parse_args()
+
+    print(f"{'page':>4} {'height':>7} {'sections':>8} | {'fixed':>5} {'split':>5} | {'content':>7} {'split':>5}")
+    totals = np.zeros(4, dtype=int)
+    for seed in range(args.pages):
+        img, sections = fixture_page(seed)
+        stats = RowStatistics.from_image(img)
+        fixed = fixed_cuts(img.height, SEGMENT_HEIGHT, SEGMENT_OVERLAP)
+        content = content_cuts(stats, SEGMENT_HEIGHT, SEGMENT_OVERLAP)
+        row = [len(fixed), split_sections(fixed, sections), len(content), split_sections(content, sections)]
+        totals += row
+        print(f"{seed:>4} {img.height:>7} {len(sections):>8} | {row[0]:>5} {row[1]:>5} | {row[2]:>7} {row[3]:>5}")
+    print(f"{'all':>4} {'':>7} {'':>8} | {totals[0]:>5} {totals[1]:>5} | {totals[2]:>7} {totals[3]:>5}")
+
+
+if __name__ == "__main__":
+    main()
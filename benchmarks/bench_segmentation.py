@@ -0,0 +1,91 @@
+"""
+Micro-benchmark for blank-segment detection on tall synthetic screenshots.
+
+Compares the old per-strip `getcolors` check with the vectorised RowStatistics
+detector and reports how many strips each one skips.
+
+Usage:
+    python -m benchmarks.bench_segmentation [--width 2560] [--heights 10000 30000]
+"""
+import argparse
+import time
+
+import numpy as np
+from PIL import Image
+
+from src.config.setting import SEGMENT_HEIGHT, SEGMENT_OVERLAP
+from src.image_processing.segmentation import RowStatistics
+
+
+def synthetic_page(width: int, height: int, seed: int = 0) -> Image.Image:
+    """Off-white page with text blocks, photo-like blocks, blank gaps and divider lines."""
+    rng = np.random.default_rng(seed)
+    pixels = np.full((height, width, 3), 248, dtype=np.uint8)
+    y = 0
+    while y < height:
+        block = int(rng.integers(400, 2400))
+        rows = slice(y, min(y + block, height))
+        kind = rng.random()
+        if kind < 0.4:
+            # Text-like block: short dark runs on light rows
+            noise = rng.random(pixels[rows].shape[:2]) < 0.08
+            pixels[rows][noise] = 40
+        elif kind < 0.6:
+            # Photo-like block: many distinct colours
+            pixels[rows] = rng.integers(0, 256, pixels[rows].shape, dtype=np.uint8)
+        else:
+            divider = min(y + block // 2, height - 1)
+            pixels[divider] = 200
+        y += block
+    return Image.fromarray(pixels, "RGB")
+
+
+def strips(height: int):
+    y = 0
+    while y < height:
+        bottom = min(y + SEGMENT_HEIGHT, height)
+        yield y, bottom
+        if bottom == height:
+            break
+        y += SEGMENT_HEIGHT - SEGMENT_OVERLAP
+
+
+def legacy_skips(img: Image.Image) -> int:
+    skipped = 0
+    for top, bottom in strips(img.height):
+        colors = img.crop((0, top, img.width, bottom)).convert("RGB").getcolors(maxcolors=1000000)
+        if colors and len(colors) == 1 and colors[0][1] in [(255, 255, 255), (0, 0, 0)]:
+            skipped += 1
+    return skipped
+
+
+def vectorised_skips(img: Image.Image) -> int:
+    stats = RowStatistics.from_image(img)
+    return sum(stats.is_low_information(top, bottom) for top, bottom in strips(img.height))
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=2560)
+    parser.add_argument("--heights", type=int, nargs="+", default=[10000, 30000])
+    args = parser.parse_args()
+
+    print(f"{'height':>8} {'strips':>7} {'legacy s':>9} {'skipped':>8} {'vector s':>9} {'skipped':>8}")
+    for height in args.heights:
+        img = synthetic_page(args.width, height)
+        img.load()
+        n_strips = len(list(strips(height)))
+
+        start = time.perf_counter()
+        legacy = legacy_skips(img)
+        legacy_time = time.perf_counter() - start
+
+        start = time.perf_counter()
+        vectorised = vectorised_skips(img)
+        vector_time = time.perf_counter() - start
+
+        print(f"{height:>8} {n_strips:>7} {legacy_time:>9.3f} {legacy:>8} {vector_time:>9.3f} {vectorised:>8}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,86 @@
+"""
+Time and resident memory of opening a vector store, pickle format vs memory-mapped format.
+
+Each load runs in a fresh process; memory is the RSS it adds after opening the
+store and answering one query.
+
+Usage:
+    python -m benchmarks.bench_store_loading [--sizes 20000 100000] [--dimension 1536]
+"""
+import argparse
+import multiprocessing
+import os
+import tempfile
+import time
+
+import numpy as np
+from langchain_community.docstore.in_memory import InMemoryDocstore
+from langchain_community.embeddings import FakeEmbeddings
+from langchain_community.vectorstores import FAISS
+
+from benchmarks.bench_faiss_indexes import clustered_vectors
+from src.analysis.disk_store import load_store, save_store
+from src.analysis.faiss_index import build_index
+
+
+def rss_mb() -> float:
+    with open("/proc/self/status") as f:
+        return next(int(line.split()[1]) for line in f if line.startswith("VmRSS")) / 1024
+
+
+def _load(fmt: str, persist_dir: str, dimension: int, queue) -> None:
+    embeddings = FakeEmbeddings(size=dimension)
+    before = rss_mb()
+    start = time.perf_counter()
+    if fmt == "pickle":
+        store = FAISS.load_local(persist_dir, embeddings, allow_dangerous_deserialization=True)
+    else:
+        store = load_store(persist_dir, embeddings)
+    seconds = time.perf_counter() - start
+    store.similarity_search_with_score_by_vector(np.ones(store.index.d, dtype=np.float32).tolist(), k=5)
+    queue.put((seconds, rss_mb() - before))
+
+
+def measure(fmt: str, persist_dir: str, dimension: int):
+    # Spawned, not forked, so the child does not share the benchmark's own memory
+    context = multiprocessing.get_context("spawn")
+    queue = context.Queue()
+    process = context.Process(target=_load, args=(fmt, persist_dir, dimension, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def build(n: int, dimension: int, index_type: str) -> FAISS:
+    vectors = clustered_vectors(n, dimension)
+    store = FAISS(FakeEmbeddings(size=dimension), build_index(vectors, index_type), InMemoryDocstore(), {})
+    texts = [f"Segment Analysis:\nSegment {i} of a competitor page\n\nCritique:\n" + "Detail " * 150 for i in range(n)]
+    metadatas = [{"website": f"site{i % 50}.com", "category": "competitor", "segment_index": i} for i in range(n)]
+    store.add_embeddings(list(zip(texts, vectors.tolist())), metadatas)
+    return store
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--sizes", type=int, nargs="+", default=[20000, 100000])
+    parser.add_argument("--dimension", type=int, default=1536)
+    parser.add_argument("--index", default="ivf_flat")
+    args = parser.parse_args()
+
+    print(f"{'vectors':>8} | {'pickle s':>8} {'RSS MB':>8} | {'mapped s':>8} {'RSS MB':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for n in args.sizes:
+            store = build(n, args.dimension, args.index)
+            pickle_dir, mapped_dir = os.path.join(tmp, f"pickle_{n}"), os.path.join(tmp, f"mapped_{n}")
+            store.save_local(pickle_dir)
+            save_store(store, mapped_dir)
+            del store
+
+            pickled = measure("pickle", pickle_dir, args.dimension)
+            mapped = measure("mapped", mapped_dir, args.dimension)
+            print(f"{n:>8} | {pickled[0]:>8.2f} {pickled[1]:>8.0f} | {mapped[0]:>8.2f} {mapped[1]:>8.0f}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,77 @@
+"""
+Peak memory and time of segmenting tall screenshots, banded vs whole-image decode.
+
+Each measurement runs in a fresh process so ru_maxrss reflects only that run.
+
+Usage:
+    python -m benchmarks.bench_tall_screenshots [--width 2560] [--heights 20000 60000]
+"""
+import argparse
+import multiprocessing
+import os
+import resource
+import tempfile
+import time
+
+from PIL import Image
+
+from benchmarks.bench_segmentation import synthetic_page
+from src.config.setting import SEGMENT_HEIGHT, SEGMENT_OVERLAP
+from src.image_processing.segmentation import RowStatistics, fixed_cuts, segment_image
+
+
+def whole_image(path: str, output_folder: str) -> int:
+    """The pre-banding approach: decode everything, then crop."""
+    os.makedirs(output_folder, exist_ok=True)
+    Image.MAX_IMAGE_PIXELS = None
+    img = Image.open(path)
+    stats = RowStatistics.from_image(img)
+    saved = 0
+    for index, (top, bottom) in enumerate(fixed_cuts(img.height, SEGMENT_HEIGHT, SEGMENT_OVERLAP), start=1):
+        if not stats.is_low_information(top, bottom):
+            img.crop((0, top, img.width, bottom)).save(os.path.join(output_folder, f"segment_{index}.png"))
+            saved += 1
+    return saved
+
+
+def banded(path: str, output_folder: str) -> int:
+    return len(segment_image(path, SEGMENT_HEIGHT, SEGMENT_OVERLAP, output_folder, mode="fixed"))
+
+
+def _measure(name: str, path: str, output_folder: str, queue) -> None:
+    start = time.perf_counter()
+    saved = {"whole": whole_image, "banded": banded}[name](path, output_folder)
+    queue.put((saved, time.perf_counter() - start, resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024))
+
+
+def measure(name: str, path: str, output_folder: str):
+    queue = multiprocessing.Queue()
+    process = multiprocessing.Process(target=_measure, args=(name, path, output_folder, queue))
+    process.start()
+    result = queue.get()
+    process.join()
+    return result
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("--width", type=int, default=2560)
+    parser.add_argument("--heights", type=int, nargs="+", default=[20000, 60000])
+    args = parser.parse_args()
+
+    print(f"{'height':>8} | {'whole s':>8} {'peak MB':>8} | {'banded s':>8} {'peak MB':>8} | {'segments':>8}")
+    with tempfile.TemporaryDirectory() as tmp:
+        for height in args.heights:
+            path = os.path.join(tmp, f"page_{height}.png")
+            page = synthetic_page(args.width, height)
+            page.save(path, compress_level=1)
+            del page
+
+            whole = measure("whole", path, os.path.join(tmp, f"whole_{height}"))
+            band = measure("banded", path, os.path.join(tmp, f"banded_{height}"))
+            assert whole[0] == band[0]
+            print(f"{height:>8} | {whole[1]:>8.2f} {whole[2]:>8.0f} | {band[1]:>8.2f} {band[2]:>8.0f} | {band[0]:>8}")
+
+
+if __name__ == "__main__":
+    main()
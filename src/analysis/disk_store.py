@@ -0,0 +1,315 @@
+import json
+import os
+import re
+import sqlite3
+from contextlib import contextmanager
+from pathlib import Path
+from typing import Dict, Iterator, List, Mapping, Optional, Tuple, Union
+import faiss
+from langchain.docstore.document import Document
+from langchain_community.docstore.base import AddableMixin, Docstore
+from langchain_community.vectorstores import FAISS
+from langchain_core.embeddings import Embeddings
+
+DOCSTORE_FILE = "docstore.sqlite"
+INDEX_FILE = "index.faiss"  # Index of stores saved before index generations
+INVLISTS_FILE = "index.ivfdata"
+LEGACY_DOCSTORE_FILE = "index.pkl"
+INDEX_FILE_PATTERN = re.compile(r"^index\.(\d+)\.(faiss|ivfdata)$")
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS documents (id TEXT PRIMARY KEY, content TEXT NOT NULL, metadata TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS positions (position INTEGER PRIMARY KEY, id TEXT NOT NULL);
+CREATE TABLE IF NOT EXISTS meta (key TEXT PRIMARY KEY, value TEXT NOT NULL);
+CREATE VIRTUAL TABLE IF NOT EXISTS documents_fts USING fts5(id UNINDEXED, content);
+"""
+FTS_VERSION = 1  # PRAGMA user_version once documents_fts mirrors documents
+
+
+def index_files(generation: int) -> Tuple[str, str]:
+    """
+    Index file and IVF inverted-lists file of an index generation. The lists
+    are kept in their own file so they are memory-mapped rather than read on load.
+    """
+    return f"index.{generation}.faiss", f"index.{generation}.ivfdata"
+
+
+class SQLiteDocstore(Docstore, AddableMixin):
+    """
+    Documents of a vector store kept in SQLite and read one id at a time.
+
+    Writes are only committed by `save_store`, together with the generation
+    of the index they belong to. Contents are also kept in an FTS5 table for
+    BM25 search.
+
+    A read-only docstore never writes. The database is in WAL mode, so reads
+    inside `snapshot` see one committed generation while the store is
+    updated. Outside a snapshot no transaction is held, so the writer can
+    checkpoint the WAL while a reader stays open. `index_generation` is the
+    generation of the index `load_store` opened with the docstore.
+    """
+
+    def __init__(self, path: str, read_only: bool = False):
+        self.path = path
+        self.read_only = read_only
+        self.index_generation: Optional[int] = None
+        self._snapshots = 0
+        if read_only:
+            self._db = sqlite3.connect(Path(path).absolute().as_uri() + "?mode=ro", uri=True, isolation_level=None)
+            return
+        self._db = sqlite3.connect(path)
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.executescript(SCHEMA)
+        if self._db.execute("PRAGMA user_version").fetchone()[0] < FTS_VERSION:
+            # Stores saved before the lexical index existed
+            self._db.execute("DELETE FROM documents_fts")
+            self._db.execute("INSERT INTO documents_fts (rowid, id, content) SELECT rowid, id, content FROM documents")
+            self._db.execute(f"PRAGMA user_version = {FTS_VERSION}")
+            self._db.commit()
+
+    def search(self, search: str) -> Union[str, Document]:
+        row = self._db.execute("SELECT content, metadata FROM documents WHERE id = ?", (search,)).fetchone()
+        if row is None:
+            return f"ID {search} not found."
+        return Document(id=search, page_content=row[0], metadata=json.loads(row[1]))
+
+    def add(self, texts: Dict[str, Document]) -> None:
+        self.delete(list(texts))
+        self._db.executemany(
+            "INSERT INTO documents VALUES (?, ?, ?)",
+            [(doc_id, doc.page_content, json.dumps(doc.metadata)) for doc_id, doc in texts.items()],
+        )
+        self._db.executemany(
+            "INSERT INTO documents_fts (rowid, id, content) SELECT rowid, id, content FROM documents WHERE id = ?",
+            [(doc_id,) for doc_id in texts],
+        )
+
+    def delete(self, ids: List) -> None:
+        # FTS rows share the rowid of their document
+        self._db.executemany(
+            "DELETE FROM documents_fts WHERE rowid = (SELECT rowid FROM documents WHERE id = ?)", [(doc_id,) for doc_id in ids]
+        )
+        self._db.executemany("DELETE FROM documents WHERE id = ?", [(doc_id,) for doc_id in ids])
+
+    def clear(self) -> None:
+        self._db.execute("DELETE FROM documents")
+        self._db.execute("DELETE FROM documents_fts")
+
+    def lexical_search(self, match: str, limit: int) -> List[Tuple[str, float]]:
+        """
+        Ids and BM25 scores (higher is better) of the documents matching the
+        FTS5 query `match`, best first.
+        """
+        rows = self._db.execute(
+            "SELECT id, bm25(documents_fts) FROM documents_fts WHERE documents_fts MATCH ? ORDER BY bm25(documents_fts) LIMIT ?",
+            (match, limit),
+        )
+        return [(doc_id, -score) for doc_id, score in rows]
+
+    def set_positions(self, index_to_docstore_id: Mapping[int, str]) -> None:
+        self._db.execute("DELETE FROM positions")
+        self._db.executemany("INSERT INTO positions VALUES (?, ?)", index_to_docstore_id.items())
+
+    def positions(self) -> Dict[int, str]:
+        return dict(self._db.execute("SELECT position, id FROM positions"))
+
+    def generation(self) -> Optional[int]:
+        """The index generation the committed documents and positions belong to."""
+        try:
+            row = self._db.execute("SELECT value FROM meta WHERE key = 'generation'").fetchone()
+        except sqlite3.OperationalError:  # Docstores saved before index generations
+            return None
+        return int(row[0]) if row else None
+
+    @contextmanager
+    def snapshot(self) -> Iterator[Optional[int]]:
+        """
+        Runs the reads of the block in one read transaction and yields the
+        generation they see. Nested snapshots share the outermost one.
+        Writable docstores read their own uncommitted state instead.
+        """
+        if self.read_only and self._snapshots == 0:
+            self._db.execute("BEGIN")
+        self._snapshots += 1
+        try:
+            yield self.generation()
+        finally:
+            self._snapshots -= 1
+            if self.read_only and self._snapshots == 0:
+                self._db.execute("COMMIT")
+
+    def set_generation(self, generation: int) -> None:
+        self._db.execute("INSERT OR REPLACE INTO meta VALUES ('generation', ?)", (str(generation),))
+
+    def needs_upgrade(self) -> bool:
+        return self.generation() is None or self._db.execute("PRAGMA user_version").fetchone()[0] < FTS_VERSION
+
+    def commit(self) -> None:
+        self._db.commit()
+
+    def close(self) -> None:
+        self._db.close()
+
+
+class PositionMap(Mapping):
+    """Read-only `index_to_docstore_id` that looks positions up in the docstore on demand."""
+
+    def __init__(self, docstore: SQLiteDocstore):
+        self._db = docstore._db
+
+    def __getitem__(self, position: int) -> str:
+        row = self._db.execute("SELECT id FROM positions WHERE position = ?", (int(position),)).fetchone()
+        if row is None:
+            raise KeyError(position)
+        return row[0]
+
+    def __iter__(self) -> Iterator[int]:
+        return (position for position, in self._db.execute("SELECT position FROM positions ORDER BY position"))
+
+    def __len__(self) -> int:
+        return self._db.execute("SELECT COUNT(*) FROM positions").fetchone()[0]
+
+
+def _write_index(index: faiss.Index, persist_dir: str, generation: int) -> None:
+    """
+    Writes `index` as `generation`. The files are new, so readers of the
+    current generation are unaffected until the docstore commits the switch.
+    """
+    index_name, invlists_name = index_files(generation)
+    index_path, invlists_path = os.path.join(persist_dir, index_name), os.path.join(persist_dir, invlists_name)
+    for path in (index_path, invlists_path):
+        if os.path.exists(path):  # Left by a save that did not commit
+            os.remove(path)
+    ivf = faiss.try_extract_index_ivf(index)
+    if ivf is None:
+        faiss.write_index(index, index_path)
+        return
+
+    on_disk = faiss.OnDiskInvertedLists(ivf.nlist, ivf.code_size, invlists_path)
+    on_disk.merge_from_1(ivf.invlists, False)
+    in_memory = ivf.invlists
+    ivf.own_invlists = False  # Keep the in-memory lists alive while they are swapped out
+    ivf.replace_invlists(on_disk, False)
+    try:
+        faiss.write_index(index, index_path)
+    finally:
+        ivf.replace_invlists(in_memory, True)
+    del on_disk
+
+
+def _read_index(index_path: str, writable: bool) -> faiss.Index:
+    index = faiss.read_index(index_path, faiss.IO_FLAG_ONDISK_SAME_DIR | (0 if writable else faiss.IO_FLAG_READ_ONLY))
+    ivf = faiss.try_extract_index_ivf(index)
+    if writable and ivf is not None:
+        # The inverted lists are mapped from disk; updates happen on an in-memory copy
+        in_memory = faiss.ArrayInvertedLists(ivf.nlist, ivf.code_size)
+        in_memory.merge_from(ivf.invlists, 0)
+        in_memory.this.disown()
+        ivf.replace_invlists(in_memory, True)
+    return index
+
+
+def _remove_stale_files(persist_dir: str, generation: int) -> None:
+    """Removes index files of other generations and of the older formats."""
+    for name in os.listdir(persist_dir):
+        match = INDEX_FILE_PATTERN.match(name)
+        if (match and int(match.group(1)) != generation) or name in (INDEX_FILE, INVLISTS_FILE, LEGACY_DOCSTORE_FILE):
+            os.remove(os.path.join(persist_dir, name))
+
+
+def save_store(store: FAISS, persist_dir: str) -> None:
+    """
+    Persists `store` as a FAISS index file plus an SQLite docstore.
+
+    The index is written as a new generation first; committing the documents,
+    positions and generation number in one SQLite transaction then switches
+    to it. A crash at any point leaves a docstore that matches the index
+    files of its generation.
+    """
+    os.makedirs(persist_dir, exist_ok=True)
+    path = os.path.join(persist_dir, DOCSTORE_FILE)
+    docstore = store.docstore
+    if not (isinstance(docstore, SQLiteDocstore) and os.path.abspath(docstore.path) == os.path.abspath(path)):
+        docstore = SQLiteDocstore(path)
+        docstore.clear()
+        docstore.add({doc_id: store.docstore.search(doc_id) for doc_id in store.index_to_docstore_id.values()})
+    generation = (docstore.generation() or 0) + 1
+    _write_index(store.index, persist_dir, generation)
+    docstore.set_positions(store.index_to_docstore_id)
+    docstore.set_generation(generation)
+    docstore.commit()
+    _remove_stale_files(persist_dir, generation)
+
+
+def _saved_generation(persist_dir: str) -> Optional[int]:
+    path = os.path.join(persist_dir, DOCSTORE_FILE)
+    if not os.path.exists(path):
+        return None
+    docstore = SQLiteDocstore(path, read_only=True)
+    try:
+        return docstore.generation()
+    finally:
+        docstore.close()
+
+
+def _needs_upgrade(docstore_path: str) -> bool:
+    docstore = SQLiteDocstore(docstore_path, read_only=True)
+    try:
+        return docstore.needs_upgrade()
+    finally:
+        docstore.close()
+
+
+def store_exists(persist_dir: str) -> bool:
+    return _saved_generation(persist_dir) is not None or os.path.exists(os.path.join(persist_dir, INDEX_FILE))
+
+
+def _upgrade(persist_dir: str, embeddings: Embeddings) -> None:
+    """Converts a store in the pickle format, or saved before index generations, to the current format."""
+    docstore_path = os.path.join(persist_dir, DOCSTORE_FILE)
+    if not os.path.exists(docstore_path):
+        store = FAISS.load_local(persist_dir, embeddings, allow_dangerous_deserialization=True)
+    else:
+        docstore = SQLiteDocstore(docstore_path)
+        if docstore.generation() is not None:
+            docstore.close()  # Only the FTS backfill was missing, done on opening
+            return
+        store = FAISS(
+            embedding_function=embeddings,
+            index=_read_index(os.path.join(persist_dir, INDEX_FILE), writable=True),
+            docstore=docstore,
+            index_to_docstore_id=docstore.positions(),
+        )
+    save_store(store, persist_dir)
+
+
+def load_store(persist_dir: str, embeddings: Embeddings, writable: bool = False) -> Optional[FAISS]:
+    """
+    Opens the store in `persist_dir`, or returns None if there is none.
+
+    Read-only stores memory-map the index where FAISS supports it and fetch
+    documents and positions from SQLite only for the hits of a search, so
+    opening costs about the same at any corpus size. They do not write.
+    Their reads run inside `docstore.snapshot()`, and once the snapshot's
+    generation differs from `docstore.index_generation` the store is stale
+    and has to be opened again (see `ShardedStore`). Writable stores load
+    the index into memory and the id mapping into a dict for
+    `FAISS.add`/`delete`. A store in an older format is converted on first load.
+    """
+    if not store_exists(persist_dir):
+        return None
+    docstore_path = os.path.join(persist_dir, DOCSTORE_FILE)
+    if not os.path.exists(docstore_path) or _needs_upgrade(docstore_path):
+        _upgrade(persist_dir, embeddings)
+
+    docstore = SQLiteDocstore(docstore_path, read_only=not writable)
+    with docstore.snapshot() as generation:
+        index_name, _ = index_files(generation)
+        index = _read_index(os.path.join(persist_dir, index_name), writable)
+    docstore.index_generation = generation
+    return FAISS(
+        embedding_function=embeddings,
+        index=index,
+        docstore=docstore,
+        index_to_docstore_id=docstore.positions() if writable else PositionMap(docstore),
+    )
@@ -0,0 +1,151 @@
+import asyncio
+import hashlib
+import sqlite3
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from functools import lru_cache
+from typing import Callable, Dict, List, Optional
+import numpy as np
+import tiktoken
+from langchain_core.embeddings import Embeddings
+from langchain_openai import OpenAIEmbeddings
+from ..config.setting import (
+    OPENAI_API_KEY,
+    EMBEDDING_MODEL,
+    EMBEDDING_CACHE_PATH,
+    EMBEDDING_BATCH_SIZE,
+    EMBEDDING_BATCH_TOKENS,
+    EMBEDDING_MAX_CONCURRENCY,
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS embeddings (
+    model TEXT NOT NULL,
+    text_hash TEXT NOT NULL,
+    vector BLOB NOT NULL,
+    PRIMARY KEY (model, text_hash)
+);
+"""
+LOOKUP_CHUNK = 500  # Hashes per SQL lookup, below SQLite's bound-parameter limit
+
+
+@lru_cache(maxsize=None)
+def get_tokenizer() -> tiktoken.Encoding:
+    return tiktoken.get_encoding("cl100k_base")
+
+
+def count_tokens(texts: List[str]) -> List[int]:
+    return [len(tokens) for tokens in get_tokenizer().encode_ordinary_batch(texts)]
+
+
+def truncate_tokens(text: str, max_tokens: int) -> str:
+    """Returns the longest prefix of `text` of at most `max_tokens` tokens."""
+    tokens = get_tokenizer().encode_ordinary(text)
+    return text if len(tokens) <= max_tokens else get_tokenizer().decode(tokens[:max_tokens])
+
+
+def text_hash(text: str) -> str:
+    return hashlib.sha256(text.encode("utf-8")).hexdigest()
+
+
+class CachedEmbeddings(Embeddings):
+    """
+    Embedding service shared by indexing and chat.
+
+    Vectors are persisted in SQLite keyed by model and text hash, so a text is
+    embedded once no matter how often it is indexed or asked about. Cache
+    misses are de-duplicated, packed into requests of at most `batch_size`
+    texts and `batch_tokens` tokens, and sent with at most `max_concurrency`
+    requests in flight.
+    """
+
+    def __init__(
+        self,
+        embedder: Optional[Embeddings] = None,
+        model: str = EMBEDDING_MODEL,
+        cache_path: str = EMBEDDING_CACHE_PATH,
+        batch_size: int = EMBEDDING_BATCH_SIZE,
+        batch_tokens: int = EMBEDDING_BATCH_TOKENS,
+        max_concurrency: int = EMBEDDING_MAX_CONCURRENCY,
+        count_tokens: Callable[[List[str]], List[int]] = count_tokens,
+    ):
+        self.embedder = embedder or OpenAIEmbeddings(api_key=OPENAI_API_KEY, model=model, chunk_size=batch_size)
+        self.model = model
+        self.batch_size = batch_size
+        self.batch_tokens = batch_tokens
+        self.max_concurrency = max_concurrency
+        self.count_tokens = count_tokens
+        self.hits = 0
+        self.misses = 0
+        self._lock = threading.Lock()
+        self._db = sqlite3.connect(cache_path, check_same_thread=False)
+        self._db.executescript(SCHEMA)
+
+    def _lookup(self, hashes: List[str]) -> Dict[str, List[float]]:
+        found = {}
+        with self._lock:
+            for start in range(0, len(hashes), LOOKUP_CHUNK):
+                chunk = hashes[start:start + LOOKUP_CHUNK]
+                rows = self._db.execute(
+                    f"SELECT text_hash, vector FROM embeddings WHERE model = ? AND text_hash IN ({','.join('?' * len(chunk))})",
+                    (self.model, *chunk),
+                )
+                found.update((h, np.frombuffer(blob, dtype=np.float32).tolist()) for h, blob in rows)
+        return found
+
+    def _store(self, vectors: Dict[str, List[float]]) -> None:
+        with self._lock:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO embeddings VALUES (?, ?, ?)",
+                [(self.model, h, np.asarray(v, dtype=np.float32).tobytes()) for h, v in vectors.items()],
+            )
+            self._db.commit()
+
+    def _batches(self, texts: List[str]) -> List[List[str]]:
+        """Packs texts into requests within the count and token limits."""
+        batches, current, tokens = [], [], 0
+        for text, count in zip(texts, self.count_tokens(texts)):
+            if current and (len(current) >= self.batch_size or tokens + count > self.batch_tokens):
+                batches.append(current)
+                current, tokens = [], 0
+            current.append(text)
+            tokens += count
+        if current:
+            batches.append(current)
+        return batches
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        hashes = [text_hash(text) for text in texts]
+        vectors = self._lookup(list(set(hashes)))
+        missing = list({h: text for h, text in zip(hashes, texts) if h not in vectors}.items())
+        self.hits += len(texts) - sum(1 for h in hashes if h not in vectors)
+        self.misses += len(missing)
+
+        if missing:
+            batches = self._batches([text for _, text in missing])
+            with ThreadPoolExecutor(max_workers=max(1, min(self.max_concurrency, len(batches)))) as executor:
+                embedded = [v for batch in executor.map(self.embedder.embed_documents, batches) for v in batch]
+            fresh = {h: vector for (h, _), vector in zip(missing, embedded)}
+            self._store(fresh)
+            vectors.update(fresh)
+        return [vectors[h] for h in hashes]
+
+    def embed_query(self, text: str) -> List[float]:
+        h = text_hash(text)
+        cached = self._lookup([h]).get(h)
+        if cached is not None:
+            self.hits += 1
+            return cached
+        self.misses += 1
+        vector = self.embedder.embed_query(text)
+        self._store({h: vector})
+        return vector
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        return await asyncio.to_thread(self.embed_documents, texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return await asyncio.to_thread(self.embed_query, text)
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,76 @@
+import io
+from concurrent.futures import Executor, ProcessPoolExecutor
+from itertools import repeat
+from typing import List, NamedTuple, Optional
+from PIL import Image
+from ..config.setting import IMAGE_ENCODINGS, ENCODE_WORKERS
+
+MIME_TYPES = {"PNG": "image/png", "WEBP": "image/webp", "JPEG": "image/jpeg"}
+
+
+class EncodedImage(NamedTuple):
+    data: bytes
+    mime_type: str
+
+
+def encoding_for(model: str) -> dict:
+    """Returns the encoding settings (max_edge, format, quality) used for `model`."""
+    return IMAGE_ENCODINGS.get(model, IMAGE_ENCODINGS["default"])
+
+
+def encode_image(image_path: str, max_edge: Optional[int] = None, format: str = "PNG", quality: Optional[int] = None) -> EncodedImage:
+    """
+    Downscales an image so its long edge is at most `max_edge` and re-encodes it.
+
+    Args:
+        image_path: Path to image file
+        max_edge: Longest side in pixels after resizing, None to keep the size
+        format: "PNG", "WEBP" or "JPEG"
+        quality: Lossy quality for WEBP/JPEG; ignored for PNG
+    Returns:
+        Encoded bytes with their MIME type
+    """
+    format = format.upper()
+    if format not in MIME_TYPES:
+        raise ValueError(f"Unsupported image format '{format}', expected one of {list(MIME_TYPES)}")
+
+    with Image.open(image_path) as img:
+        if max_edge and max(img.size) > max_edge:
+            scale = max_edge / max(img.size)
+            img = img.resize((max(1, round(img.width * scale)), max(1, round(img.height * scale))), Image.Resampling.LANCZOS)
+        if format == "JPEG" or img.mode not in ("RGB", "RGBA"):
+            img = img.convert("RGB")
+
+        options = {"quality": quality} if format != "PNG" and quality is not None else {}
+        buffer = io.BytesIO()
+        img.save(buffer, format=format, **options)
+    return EncodedImage(buffer.getvalue(), MIME_TYPES[format])
+
+
+def _encode_with(image_path: str, settings: dict) -> EncodedImage:
+    return encode_image(image_path, settings.get("max_edge"), settings.get("format", "PNG"), settings.get("quality"))
+
+
+def encode_for_model(image_path: str, model: str) -> EncodedImage:
+    """Encodes a single image with the settings for `model`."""
+    return _encode_with(image_path, encoding_for(model))
+
+
+def encode_segments(
+    image_paths: List[str], model: str, max_workers: int = ENCODE_WORKERS, executor: Optional[Executor] = None
+) -> List[EncodedImage]:
+    """
+    Encodes every segment once for `model`, in `executor` (e.g. a process pool
+    shared by a whole run) or else in a process pool of `max_workers` created
+    for this call.
+
+    Returns:
+        Encoded images in the same order as `image_paths`
+    """
+    settings = encoding_for(model)
+    if executor is not None and len(image_paths) > 1:
+        return list(executor.map(_encode_with, image_paths, repeat(settings)))
+    if max_workers <= 1 or len(image_paths) <= 1:
+        return [_encode_with(path, settings) for path in image_paths]
+    with ProcessPoolExecutor(max_workers=min(max_workers, len(image_paths))) as executor:
+        return list(executor.map(_encode_with, image_paths, repeat(settings)))
@@ -0,0 +1,98 @@
+import math
+import faiss
+import numpy as np
+from ..config.setting import (
+    FAISS_INDEX_TYPE,
+    FAISS_FLAT_MAX_VECTORS,
+    FAISS_PQ_MIN_VECTORS,
+    FAISS_IVF_NPROBE,
+    FAISS_HNSW_M,
+    FAISS_HNSW_EF_CONSTRUCTION,
+    FAISS_HNSW_EF_SEARCH,
+)
+
+INDEX_TYPES = ("flat", "ivf_flat", "hnsw", "ivf_pq")
+TRAINING_POINTS_PER_CENTROID = 39  # FAISS warns below this many training vectors per cluster
+
+
+def choose_index_type(n_vectors: int, index_type: str = FAISS_INDEX_TYPE) -> str:
+    """
+    Resolves "auto" to an index type for a corpus of `n_vectors`: exact search
+    while it is small, IVF-Flat in the middle and IVF-PQ once full vectors
+    would no longer fit comfortably in memory. HNSW is only used when asked
+    for, since its vectors cannot be removed and every deletion means a rebuild.
+    """
+    if index_type != "auto":
+        if index_type not in INDEX_TYPES:
+            raise ValueError(f"Unknown FAISS index type {index_type!r}; expected 'auto' or one of {INDEX_TYPES}")
+        return index_type
+    if n_vectors < FAISS_FLAT_MAX_VECTORS:
+        return "flat"
+    if n_vectors < FAISS_PQ_MIN_VECTORS:
+        return "ivf_flat"
+    return "ivf_pq"
+
+
+def index_type_of(index: faiss.Index) -> str:
+    if isinstance(index, faiss.IndexHNSW):
+        return "hnsw"
+    if isinstance(index, faiss.IndexIVFPQ):
+        return "ivf_pq"
+    if isinstance(index, faiss.IndexIVF):
+        return "ivf_flat"
+    return "flat"
+
+
+def supports_removal(index: faiss.Index) -> bool:
+    """
+    Whether entries can be deleted in place. LangChain renumbers the remaining
+    entries after a removal, which only matches how flat indexes compact.
+    """
+    return index_type_of(index) == "flat"
+
+
+def _nlist(n_vectors: int) -> int:
+    """Inverted lists for IVF: about 4 * sqrt(n), capped so every list has enough training points."""
+    return max(1, min(int(4 * math.sqrt(n_vectors)), n_vectors // TRAINING_POINTS_PER_CENTROID))
+
+
+def _pq_subquantizers(dimension: int) -> int:
+    """Largest supported sub-vector count dividing `dimension`, keeping sub-vectors at least 8 dims wide."""
+    for m in (96, 64, 48, 32, 24, 16, 12, 8, 4, 2):
+        if dimension % m == 0 and dimension // m >= 8:
+            return m
+    return 1
+
+
+def build_index(vectors: np.ndarray, index_type: str) -> faiss.Index:
+    """
+    Creates an empty L2 index of `index_type` for vectors like `vectors`,
+    trained on them where the type needs training.
+    """
+    vectors = np.ascontiguousarray(vectors, dtype=np.float32)
+    n_vectors, dimension = vectors.shape
+    if index_type == "flat":
+        return faiss.IndexFlatL2(dimension)
+    if index_type == "hnsw":
+        index = faiss.IndexHNSWFlat(dimension, FAISS_HNSW_M)
+        index.hnsw.efConstruction = FAISS_HNSW_EF_CONSTRUCTION
+        index.hnsw.efSearch = FAISS_HNSW_EF_SEARCH
+        return index
+
+    nlist = _nlist(n_vectors)
+    quantizer = faiss.IndexFlatL2(dimension)
+    if index_type == "ivf_flat":
+        index = faiss.IndexIVFFlat(quantizer, dimension, nlist)
+    elif index_type == "ivf_pq":
+        nbits = max(1, min(8, int(math.log2(max(n_vectors // TRAINING_POINTS_PER_CENTROID, 2)))))
+        index = faiss.IndexIVFPQ(quantizer, dimension, nlist, _pq_subquantizers(dimension), nbits)
+    else:
+        raise ValueError(f"Unknown FAISS index type {index_type!r}")
+    index.train(vectors)
+    index.nprobe = min(FAISS_IVF_NPROBE, nlist)
+    return index
+
+
+def index_memory(index: faiss.Index) -> int:
+    """Serialized size of `index` in bytes, a close proxy for its resident size."""
+    return faiss.serialize_index(index).nbytes
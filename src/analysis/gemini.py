@@ -1,25 +1,55 @@
+import asyncio
+import io
+import json
+import logging
+import math
 import os
-import PIL.Image
+import time
+import requests
 from google import genai
-from ..config.setting import GEMINI_API_KEY
+from google.genai import errors, types
+from PIL import Image
+from ..config.setting import (
+    GEMINI_API_KEY,
+    GEMINI_MODEL,
+    GEMINI_MAX_CONCURRENCY,
+    GEMINI_RPM,
+    GEMINI_TPM,
+    GEMINI_MAX_RETRIES,
+    GEMINI_RETRY_DELAY,
+    GEMINI_BATCH_SIZE,
+    GEMINI_BATCH_TOKEN_BUDGET,
+    GEMINI_RETRY_MAX_DELAY,
+    GEMINI_BREAKER_THRESHOLD,
+    GEMINI_BREAKER_COOLDOWN,
+    ANALYSIS_JOURNAL,
+    RESULTS_RECORDS,
+    ENCODE_WORKERS,
+)
 import datetime
+from concurrent.futures import ProcessPoolExecutor
+from typing import Callable, Dict, List, Optional, Tuple, Union
+from .encoding import EncodedImage, encode_segments, encode_for_model
+from .journal import AnalysisJournal
+from .rate_limit import CircuitBreaker, RateLimiter, backoff_delay
+from .vision_cache import VisionCache
+from ..fingerprint import pixel_fingerprint
+from ..image_processing.dedup import PerceptualHashIndex
+
+logger = logging.getLogger('website_critic.gemini')
 
 # Initialize Gemini client
 client = genai.Client(api_key=GEMINI_API_KEY)
 
-def analyze_image(image_path: str) -> str:
-    """
-    Analyzes an image using Gemini Vision API with detailed UX analysis prompt.
-    
-    Args:
-        image_path: Path to image file
-    Returns:
-        Analysis text from Gemini
-    """
-    image = PIL.Image.open(image_path)
-    segment_num = int(os.path.basename(image_path).split('_')[1].split('.')[0])
-    
-    prompt = f"""
+IMAGE_TILE = 768  # Gemini bills large images per 768x768 tile
+TOKENS_PER_TILE = 258
+RETRYABLE_STATUS = {408, 429, 500, 502, 503, 504}
+
+def segment_number(image_path: str) -> int:
+    return int(os.path.basename(image_path).split('_')[1].split('.')[0])
+
+# Vision cache keys include a hash of the prompt templates, so editing them invalidates cached analyses
+PROMPT_TEMPLATE = """
 You are a user experience expert. Analyze the following image segment of a website thoroughly.
 
 Part 1: Detailed Analysis
@@ -41,64 +71,519 @@ Segment Analysis:
 
 Critique:
 [Your professional critique here]
-    """.strip()
+""".strip()
+
+BATCH_PROMPT_TEMPLATE = """
+You are a user experience expert. The following images are {count} segments of a website, each preceded by its identifier. Analyze every segment thoroughly and separately.
+
+For each segment:
+
+Part 1: Detailed Analysis
+- Translate the image content into text.
+- Describe all the text content in detail.
+- Describe all visible elements in detail (for example: hero section, layout, textual content, imagery, color scheme, fonts, and design patterns).
+
+Part 2: Professional Critique
+- Evaluate this segment from a marketing and user experience perspective.
+- Focus on design aesthetics, content clarity, and ease of navigation.
+- Provide constructive feedback and suggest specific improvements.
+
+Segment Identifiers: {identifiers}
+
+Respond with a JSON object that has one key per segment identifier, written exactly as above. Each value is an object with two string fields:
+"analysis": your detailed analysis of that segment
+"critique": your professional critique of that segment
+""".strip()
+
+# A batched answer is rendered in the same layout as a single-segment answer
+BATCH_SEGMENT_FORMAT = "Segment Analysis:\n{analysis}\n\nCritique:\n{critique}"
+
+def build_prompt(segment_num: int) -> str:
+    return PROMPT_TEMPLATE.format(segment_num=segment_num)
+
+def cache_prompt(segment_num: int) -> str:
+    """
+    Prompt a segment's cached analysis is keyed by. Answers name their segment,
+    so this is the rendered prompt; single and batched analyses are
+    interchangeable, so it covers the batch template too.
+    """
+    return build_prompt(segment_num) + "\n" + BATCH_PROMPT_TEMPLATE
+
+def image_tokens(encoded: EncodedImage) -> int:
+    """Input tokens Gemini bills for an image: one tile if small, else one per 768 px tile."""
+    with Image.open(io.BytesIO(encoded.data)) as img:
+        width, height = img.size
+    if max(width, height) <= IMAGE_TILE // 2:
+        return TOKENS_PER_TILE
+    return math.ceil(width / IMAGE_TILE) * math.ceil(height / IMAGE_TILE) * TOKENS_PER_TILE
+
+def estimate_tokens(prompt: str, encoded: EncodedImage) -> int:
+    """Rough input-token count of a request, for the tokens-per-minute limit."""
+    return len(prompt) // 4 + image_tokens(encoded)
+
+def parse_batch_response(text: str, identifiers: List[str]) -> Optional[Dict[str, str]]:
+    """
+    Splits a batched JSON answer into one analysis per segment identifier,
+    laid out like a single-segment answer.
+
+    Returns:
+        Analyses by identifier, or None if the answer is not valid JSON or
+        misses a segment
+    """
+    text = text.strip()
+    if text.startswith("```"):
+        text = text.strip("`").removeprefix("json").strip()
+    try:
+        answer = json.loads(text)
+    except ValueError:
+        return None
+    if not isinstance(answer, dict):
+        return None
+
+    analyses = {}
+    for identifier in identifiers:
+        entry = answer.get(identifier)
+        if not (isinstance(entry, dict) and isinstance(entry.get("analysis"), str) and isinstance(entry.get("critique"), str)):
+            return None
+        analyses[identifier] = BATCH_SEGMENT_FORMAT.format(analysis=entry["analysis"].strip(), critique=entry["critique"].strip())
+    return analyses
+
+def analysis_sections(analysis: str) -> Dict[str, str]:
+    """Splits an answer laid out as in PROMPT_TEMPLATE into its two sections."""
+    head, found_critique, critique = analysis.partition("Critique:")
+    _, found_analysis, segment_analysis = head.partition("Segment Analysis:")
+    if not found_critique:
+        head, critique = analysis, ""
+    return {
+        "segment_analysis": (segment_analysis if found_analysis else head).strip().strip("*").strip(),
+        "critique": critique.strip().strip("*").strip(),
+    }
+
+def render_results_text(records: List[dict], folder_name: str) -> str:
+    """Renders results.jsonl records as the human-readable results.txt report."""
+    results = []
+    
+    # Add header metadata
+    results.append(f"Folder: {folder_name}")
+    results.append(f"Number of segments: {len(records)}")
+    results.append("=" * 80 + "\n")
+    
+    for record in records:
+        filename = record["segment"]
+        if record["error"] is not None:
+            results.append(f"Failed to process {filename}: {record['error']}\n")
+            continue
+        
+        # Add a metadata block for each segment
+        metadata_block = (
+            f"Segment Identifier: {filename}\n"
+            f"Segment ID: {record['segment_id']}\n"
+            f"Filename: {filename}\n"
+            f"Folder: {folder_name}\n"
+            f"Processed At: {record['processed_at']}\n"
+            + (f"Duplicate Of: {record['duplicate_of']}\n" if record["duplicate_of"] else "")
+            + "-" * 60
+        )
+        results.append(metadata_block)
+        results.append(record["analysis"])
+        results.append("-" * 60 + "\n")
+    
+    return "\n".join(results)
+
+def records_complete(folder_path: str) -> bool:
+    """True if the folder has a results.jsonl and every record in it holds an analysis."""
+    records_file = os.path.join(folder_path, RESULTS_RECORDS)
+    if not os.path.exists(records_file):
+        return False
+    with open(records_file, "r", encoding="utf-8") as f:
+        return all(json.loads(line)["error"] is None for line in f if line.strip())
+
+def is_retryable(error: BaseException) -> bool:
+    """True for rate limits, provider overload and transport failures."""
+    if isinstance(error, errors.APIError):
+        return error.code in RETRYABLE_STATUS
+    return isinstance(error, (requests.ConnectionError, requests.Timeout, asyncio.TimeoutError))
+
+def analyze_image(image_path: str, encoded: Optional[EncodedImage] = None, cache: Optional[VisionCache] = None) -> str:
+    """
+    Analyzes an image using Gemini Vision API with detailed UX analysis prompt.
+
+    Args:
+        image_path: Path to image file
+        encoded: Upload payload already encoded for the model (see
+                 `encode_segments`); encoded on the fly when omitted
+        cache: Vision cache checked before calling Gemini and filled after
+    Returns:
+        Analysis text from Gemini
+    """
+    if encoded is None:
+        encoded = encode_for_model(image_path, GEMINI_MODEL)
+    if cache is not None:
+        cached = cache.get(encoded.data, cache_prompt(segment_number(image_path)), GEMINI_MODEL)
+        if cached is not None:
+            return cached
+    prompt = build_prompt(segment_number(image_path))
 
     response = client.models.generate_content(
-        model="gemini-2.0-flash",
-        contents=[prompt, image]
+        model=GEMINI_MODEL,
+        contents=[prompt, types.Part.from_bytes(data=encoded.data, mime_type=encoded.mime_type)]
     )
+    if cache is not None:
+        cache.put(encoded.data, cache_prompt(segment_number(image_path)), GEMINI_MODEL, response.text)
     return response.text
 
-def process_folder(folder_path: str) -> str:
+class AnalysisEngine:
+    """
+    Concurrent segment analysis on the SDK's async client.
+
+    One engine is shared by every site in a run: at most `max_concurrency`
+    requests are in flight, and a token-bucket limiter keeps requests and
+    input tokens per minute within the project's quota. Requests failing with
+    a retryable error are retried with jittered exponential backoff, and a
+    circuit breaker pauses every worker after repeated failures instead of
+    burning through the quota. With a `cache`, segments already analysed with the same pixels,
+    rendered prompt (templates and segment number) and model are answered without a request.
+
+    `analyze_all` packs up to `batch_size` segments, within
+    `batch_token_budget` image tokens, into one request that asks for a JSON
+    answer keyed by segment identifier. Segments of an answer that cannot be
+    parsed are analysed one by one.
+
+    Segments are encoded in a process pool of `encode_workers` that the
+    engine creates on first use and every folder of the run shares; `close`
+    shuts it down.
+    """
+
+    def __init__(
+        self,
+        api_client: Optional[genai.Client] = None,
+        model: str = GEMINI_MODEL,
+        max_concurrency: int = GEMINI_MAX_CONCURRENCY,
+        requests_per_minute: float = GEMINI_RPM,
+        tokens_per_minute: float = GEMINI_TPM,
+        max_retries: int = GEMINI_MAX_RETRIES,
+        retry_delay: float = GEMINI_RETRY_DELAY,
+        cache: Optional[VisionCache] = None,
+        batch_size: int = GEMINI_BATCH_SIZE,
+        batch_token_budget: int = GEMINI_BATCH_TOKEN_BUDGET,
+        max_retry_delay: float = GEMINI_RETRY_MAX_DELAY,
+        breaker_threshold: int = GEMINI_BREAKER_THRESHOLD,
+        breaker_cooldown: float = GEMINI_BREAKER_COOLDOWN,
+        encode_workers: int = ENCODE_WORKERS,
+    ):
+        self.client = api_client if api_client is not None else client
+        self.model = model
+        self.max_retries = max_retries
+        self.retry_delay = retry_delay
+        self.max_retry_delay = max_retry_delay
+        self.cache = cache
+        self.batch_size = batch_size
+        self.batch_token_budget = batch_token_budget
+        self.requests_sent = 0
+        self.limiter = RateLimiter(requests_per_minute, tokens_per_minute)
+        self.breaker = CircuitBreaker(breaker_threshold, breaker_cooldown)
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.encode_workers = encode_workers
+        self._encode_pool: Optional[ProcessPoolExecutor] = None
+
+    async def encode_all(self, image_paths: List[str]) -> List[EncodedImage]:
+        """Encodes segments for the engine's model in the run's shared process pool."""
+        if self.encode_workers > 1 and len(image_paths) > 1 and self._encode_pool is None:
+            self._encode_pool = ProcessPoolExecutor(max_workers=self.encode_workers)
+        return await asyncio.to_thread(encode_segments, image_paths, self.model, self.encode_workers, self._encode_pool)
+
+    def close(self) -> None:
+        """Shuts down the encoding pool, if one was started."""
+        if self._encode_pool is not None:
+            self._encode_pool.shutdown()
+            self._encode_pool = None
+
+    def _cached(self, image_path: str, encoded: EncodedImage) -> Optional[str]:
+        if self.cache is None:
+            return None
+        return self.cache.get(encoded.data, cache_prompt(segment_number(image_path)), self.model)
+
+    def _store(self, image_path: str, encoded: EncodedImage, analysis: str) -> None:
+        if self.cache is not None:
+            self.cache.put(encoded.data, cache_prompt(segment_number(image_path)), self.model, analysis)
+
+    async def _generate(self, contents: list, tokens: int, label: str, config: Optional[types.GenerateContentConfig] = None) -> str:
+        """Sends one request within the concurrency and rate limits, retrying retryable errors."""
+        for attempt in range(self.max_retries + 1):
+            # A probe cancelled or failing outside the recorded outcomes is handed back on exit
+            async with self.breaker.admit():
+                await self.limiter.acquire(tokens)
+                async with self._semaphore:
+                    self.requests_sent += 1
+                    try:
+                        response = await self.client.aio.models.generate_content(model=self.model, contents=contents, config=config)
+                    except Exception as e:
+                        error = e
+                    else:
+                        self.breaker.record_success()
+                        return response.text
+
+                if not is_retryable(error):
+                    # The provider answered, so it is not overloaded
+                    self.breaker.record_success()
+                    raise error
+                self.breaker.record_failure()
+            if attempt == self.max_retries:
+                raise error
+            delay = backoff_delay(attempt, self.retry_delay, self.max_retry_delay)
+            logger.warning(f"Retryable error on {label} ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+
+    async def _analyze_encoded(self, image_path: str, encoded: EncodedImage) -> str:
+        prompt = build_prompt(segment_number(image_path))
+        contents = [prompt, types.Part.from_bytes(data=encoded.data, mime_type=encoded.mime_type)]
+        analysis = await self._generate(contents, estimate_tokens(prompt, encoded), os.path.basename(image_path))
+        self._store(image_path, encoded, analysis)
+        return analysis
+
+    async def analyze(self, image_path: str, encoded: Optional[EncodedImage] = None) -> str:
+        """Async counterpart of `analyze_image`."""
+        if encoded is None:
+            encoded = await asyncio.to_thread(encode_for_model, image_path, self.model)
+        cached = self._cached(image_path, encoded)
+        if cached is not None:
+            return cached
+        return await self._analyze_encoded(image_path, encoded)
+
+    async def _analyze_batch(self, items: List[Tuple[str, EncodedImage]]) -> List[Union[str, BaseException]]:
+        """One request for several segments, falling back to one request per segment."""
+        if len(items) > 1:
+            identifiers = [f"Segment {segment_number(path)}" for path, _ in items]
+            prompt = BATCH_PROMPT_TEMPLATE.format(count=len(items), identifiers=", ".join(identifiers))
+            contents = [prompt]
+            for identifier, (_, encoded) in zip(identifiers, items):
+                contents += [identifier, types.Part.from_bytes(data=encoded.data, mime_type=encoded.mime_type)]
+            tokens = len(prompt) // 4 + sum(image_tokens(encoded) for _, encoded in items)
+            label = f"{os.path.basename(items[0][0])} (+{len(items) - 1})"
+            try:
+                text = await self._generate(
+                    contents, tokens, label, config=types.GenerateContentConfig(response_mime_type="application/json")
+                )
+                analyses = parse_batch_response(text, identifiers)
+            except Exception as e:
+                # Only a rejected request (e.g. too large) is worth splitting up
+                if is_retryable(e) or not isinstance(e, errors.APIError):
+                    return [e] * len(items)
+                analyses = None
+            if analyses is not None:
+                for (path, encoded), identifier in zip(items, identifiers):
+                    self._store(path, encoded, analyses[identifier])
+                return [analyses[identifier] for identifier in identifiers]
+            logger.warning(f"Batched analysis of {label} unusable, analysing segments individually")
+        return await asyncio.gather(*(self._analyze_encoded(path, encoded) for path, encoded in items), return_exceptions=True)
+
+    def _plan_batches(self, items: List[Tuple[int, str, EncodedImage]]) -> List[List[Tuple[int, str, EncodedImage]]]:
+        """Groups consecutive segments into batches within the size and image-token budgets."""
+        batches, current, budget = [], [], 0
+        for item in items:
+            cost = image_tokens(item[2])
+            if current and (len(current) >= self.batch_size or budget + cost > self.batch_token_budget):
+                batches.append(current)
+                current, budget = [], 0
+            current.append(item)
+            budget += cost
+        if current:
+            batches.append(current)
+        return batches
+
+    async def analyze_all(
+        self,
+        items: List[Tuple[str, Optional[EncodedImage]]],
+        on_result: Optional[Callable[[int, str], None]] = None,
+    ) -> List[Union[str, BaseException]]:
+        """
+        Analyzes (image_path, encoded) pairs concurrently, in batches when enabled.
+
+        Args:
+            items: Segments to analyse
+            on_result: Called with (item index, analysis) as soon as each
+                       analysis is available, e.g. to checkpoint it
+        Returns:
+            One analysis per item, in input order; failed items hold their exception
+        """
+        def report(index: int, answer: Union[str, BaseException]) -> None:
+            if on_result is not None and not isinstance(answer, BaseException):
+                on_result(index, answer)
+
+        if self.batch_size <= 1:
+            async def single(index: int, path: str, encoded: Optional[EncodedImage]) -> str:
+                analysis = await self.analyze(path, encoded)
+                report(index, analysis)
+                return analysis
+
+            return await asyncio.gather(*(single(i, path, encoded) for i, (path, encoded) in enumerate(items)), return_exceptions=True)
+
+        results: List[Union[str, BaseException, None]] = [None] * len(items)
+        pending = []
+        for index, (path, encoded) in enumerate(items):
+            try:
+                if encoded is None:
+                    encoded = await asyncio.to_thread(encode_for_model, path, self.model)
+                results[index] = self._cached(path, encoded)
+            except Exception as e:
+                results[index] = e
+            if results[index] is None:
+                pending.append((index, path, encoded))
+            else:
+                report(index, results[index])
+
+        async def run_batch(batch: List[Tuple[int, str, EncodedImage]]) -> None:
+            answers = await self._analyze_batch([(path, encoded) for _, path, encoded in batch])
+            for (index, _, _), answer in zip(batch, answers):
+                results[index] = answer
+                report(index, answer)
+
+        await asyncio.gather(*(run_batch(batch) for batch in self._plan_batches(pending)))
+        return results
+
+async def process_folder(
+    folder_path: str,
+    phash_index: Optional[PerceptualHashIndex] = None,
+    engine: Optional[AnalysisEngine] = None,
+    segments: Optional[List[str]] = None,
+    digests: Optional[Dict[str, str]] = None,
+) -> str:
     """
-    Process all images in folder and compile results into a structured text file.
+    Process all images in folder and write one JSON record per segment to
+    results.jsonl, plus results.txt as a readable view of the same records.
     
     Args:
         folder_path: Path to folder containing image segments
+        phash_index: Perceptual-hash index; segments with a reusable analysis
+                     (near-duplicates or unchanged since the last run) are not
+                     sent to Gemini again
+        engine: Analysis engine whose concurrency and rate limits are shared
+                with other folders; a private one is created when omitted
+        segments: Paths of the segments to analyse, e.g. those just saved by
+                  segmentation; every image in the folder when omitted
+        digests: Pixel digests of the segments by path, as filled by
+                 segmentation; missing ones are computed off the event loop
+
+    Every new analysis is checkpointed in the folder's journal as it arrives,
+    so after an interruption only unfinished segments are sent again.
+
     Returns:
-        Combined analysis text
+        Combined analysis text (the results.txt view)
     """
+    private_engine = engine is None
+    engine = engine or AnalysisEngine()
+
     # Sort files by segment number
-    files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    if segments is None:
+        files = [f for f in os.listdir(folder_path) if f.lower().endswith(('.png', '.jpg', '.jpeg'))]
+    else:
+        files = [os.path.basename(path) for path in segments]
     files_sorted = sorted(files, key=lambda x: int(x.split('_')[1].split('.')[0]))
     
-    results = []
     folder_name = os.path.basename(os.path.normpath(folder_path))
     
-    # Add header metadata
-    results.append(f"Folder: {folder_name}")
-    results.append(f"Number of segments: {len(files_sorted)}")
-    results.append("=" * 80 + "\n")
+    # Analyses journaled by an earlier, possibly interrupted, run of unchanged segments
+    journal = AnalysisJournal(os.path.join(folder_path, ANALYSIS_JOURNAL))
+    digests = digests or {}
+    image_hashes = await asyncio.to_thread(lambda: {
+        f: digests.get(os.path.join(folder_path, f)) or pixel_fingerprint(os.path.join(folder_path, f))
+        for f in files_sorted
+    })
+    journaled = {f: journal.get(f, image_hashes[f]) for f in files_sorted}
+    if any(journaled.values()):
+        logger.info(f"Resuming {sum(1 for a in journaled.values() if a)} analyses from the journal")
+    
+    analyses = {
+        f: journaled[f] or (phash_index.analysis_for(os.path.join(folder_path, f)) if phash_index else None)
+        for f in files_sorted
+    }
+    # Near-duplicates of a segment analysed in this batch wait for its analysis
+    waiting = {os.path.join(folder_path, f) for f in files_sorted if analyses[f] is None}
+    pending = [
+        f for f in files_sorted
+        if analyses[f] is None and not (phash_index and phash_index.duplicate_of(os.path.join(folder_path, f)) in waiting)
+    ]
+
+    # Encode every segment that needs a Gemini call once, in parallel
+    try:
+        encoded = dict(zip(pending, await engine.encode_all([os.path.join(folder_path, f) for f in pending])))
+    except Exception as e:
+        logger.warning(f"Parallel encoding failed, encoding segments individually: {e}")
+        encoded = {}
+    if private_engine:
+        engine.close()
+
+    # Analyse the remaining segments concurrently; results come back in segment order
+    started = time.perf_counter()
+    finished = {}
+    
+    def checkpoint(index: int, analysis: str) -> None:
+        finished[pending[index]] = time.perf_counter() - started
+        journal.append(pending[index], image_hashes[pending[index]], analysis)
     
-    # Process each image
+    fresh = dict(zip(pending, await engine.analyze_all(
+        [(os.path.join(folder_path, f), encoded.get(f)) for f in pending], on_result=checkpoint
+    )))
+    journal.compact(files_sorted)
+    if phash_index:
+        for filename in files_sorted:
+            analysis = fresh.get(filename, journaled[filename])
+            if analysis and not isinstance(analysis, BaseException):
+                phash_index.record_analysis(os.path.join(folder_path, filename), analysis)
+    
+    # One record per segment, in segment order
+    records = []
     for filename in files_sorted:
         image_path = os.path.join(folder_path, filename)
+        duplicate_of = phash_index.duplicate_of(image_path) if phash_index else None
+        record = {
+            "folder": folder_name,
+            "segment": filename,
+            "segment_id": segment_number(filename),
+            "image_hash": image_hashes[filename],
+            "duplicate_of": duplicate_of,
+            "model": engine.model,
+            "source": None,
+            "processed_at": None,
+            "analysis_seconds": finished.get(filename),
+            "sections": None,
+            "analysis": None,
+            "error": None,
+        }
         try:
-            analysis = analyze_image(image_path)
-            # Get current timestamp
-            processed_at = datetime.datetime.utcnow().isoformat() + "Z"
-            
-            # Add a metadata block for each segment
-            metadata_block = (
-                f"Segment Identifier: {filename}\n"
-                f"Segment ID: {int(filename.split('_')[1].split('.')[0])}\n"
-                f"Filename: {filename}\n"
-                f"Folder: {folder_name}\n"
-                f"Processed At: {processed_at}\n"
-                + "-" * 60
-            )
-            results.append(metadata_block)
-            results.append(analysis)
-            results.append("-" * 60 + "\n")
+            if filename in fresh:
+                analysis, record["source"] = fresh[filename], "gemini"
+                if isinstance(analysis, BaseException):
+                    raise analysis
+            elif journaled[filename]:
+                analysis, record["source"] = journaled[filename], "journal"
+            else:
+                analysis, record["source"] = analyses[filename] or phash_index.analysis_for(image_path), "reused"
+                if analysis is None:
+                    raise RuntimeError(f"analysis of {duplicate_of} failed")
+                logger.info(f"Reusing analysis for {filename}")
+            record["processed_at"] = datetime.datetime.utcnow().isoformat() + "Z"
+            record["sections"] = analysis_sections(analysis)
+            record["analysis"] = analysis
             print(f"Processed {filename}")
         except Exception as e:
-            results.append(f"Failed to process {filename}: {str(e)}\n")
+            record["error"] = str(e)
             print(f"Failed to process {filename}: {e}")
+        records.append(record)
+    
+    if phash_index:
+        phash_index.save()
+    
+    # Write the records, then the text view derived from them
+    records_file = os.path.join(folder_path, RESULTS_RECORDS)
+    with open(records_file + ".tmp", "w", encoding="utf-8") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+    os.replace(records_file + ".tmp", records_file)
     
-    # Write results to file
-    result_text = "\n".join(results)
+    result_text = render_results_text(records, folder_name)
     result_file = os.path.join(folder_path, "results.txt")
     with open(result_file, "w", encoding="utf-8") as f:
         f.write(result_text)
     
-    return result_text
\ No newline at end of file
+    return result_text
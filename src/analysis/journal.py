@@ -0,0 +1,52 @@
+import json
+import os
+from typing import Dict, Iterable, Optional
+
+
+class AnalysisJournal:
+    """
+    Append-only checkpoint of finished segment analyses for one folder.
+
+    Every analysis is appended as one JSON line and flushed to disk as soon as
+    it arrives, so an interrupted run loses at most the requests in flight. An
+    entry is reused only while the segment's pixel fingerprint is unchanged; a
+    torn last line from a crash is ignored.
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        entry = json.loads(line)
+                    except ValueError:
+                        continue
+                    self._entries[entry["segment"]] = entry
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def get(self, segment: str, image_hash: str) -> Optional[str]:
+        """Returns the journaled analysis of `segment` if it was made for the same pixels."""
+        entry = self._entries.get(segment)
+        return entry["analysis"] if entry and entry["image_hash"] == image_hash else None
+
+    def append(self, segment: str, image_hash: str, analysis: str) -> None:
+        entry = {"segment": segment, "image_hash": image_hash, "analysis": analysis}
+        with open(self.path, "a", encoding="utf-8") as f:
+            f.write(json.dumps(entry) + "\n")
+            f.flush()
+            os.fsync(f.fileno())
+        self._entries[segment] = entry
+
+    def compact(self, segments: Iterable[str]) -> None:
+        """Rewrites the journal with only the latest entry of each of `segments`."""
+        keep = [self._entries[s] for s in segments if s in self._entries]
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            for entry in keep:
+                f.write(json.dumps(entry) + "\n")
+        os.replace(tmp_path, self.path)
+        self._entries = {entry["segment"]: entry for entry in keep}
@@ -0,0 +1,74 @@
+import re
+from collections import defaultdict
+from typing import Dict, Hashable, List, Optional, Tuple
+from ..config.setting import HYBRID_RRF_K
+
+# Split like FTS5's default unicode61 tokenizer, so query terms line up with indexed tokens
+WORD = re.compile(r"\w+")
+QUOTED = re.compile(r"\"([^\"]+)\"|“([^”]+)”")
+STOPWORDS = frozenset("""
+a an and are as at be by can could do does for from has have how i in is it its me my of on or our should so
+than that the their there these this to was we were what when where which who why will with would you your
+""".split())
+
+
+def query_terms(text: str) -> List[str]:
+    """Lower-cased content words of `text`, stopwords removed, in first-seen order."""
+    return list(dict.fromkeys(w for w in WORD.findall(text.lower()) if w not in STOPWORDS))
+
+
+def _fts_phrase(words: List[str]) -> str:
+    return '"' + " ".join(words).replace('"', '""') + '"'
+
+
+def match_any(terms: List[str]) -> str:
+    """FTS5 query matching documents that contain any of `terms`, ranked by BM25."""
+    return " OR ".join(_fts_phrase([term]) for term in terms)
+
+
+def specific_terms(query: str) -> List[List[str]]:
+    """
+    Specific terms of `query` as lower-cased word lists, or [] if it names none.
+
+    Specific terms are quoted phrases ("Download Brochure") and capitalised
+    or upper-case words past the first (CTA, Download). A query needs one
+    quoted phrase, or two such words next to each other, to count as
+    specific: that is how people refer to on-page labels, while capitalised
+    words apart ("How does Acme compare to Globex?") are usually names.
+    """
+    phrases = [p for p in (WORD.findall((a or b).lower()) for a, b in QUOTED.findall(query)) if p]
+    unquoted = QUOTED.sub(" ", query)
+    words, run, longest_run, end = [], 0, 0, None
+    for match in list(WORD.finditer(unquoted))[1:]:
+        word = match.group()
+        if word[0].isupper() and word.lower() not in STOPWORDS:
+            adjacent = end is not None and not unquoted[end:match.start()].strip()
+            run = run + 1 if adjacent else 1
+            longest_run = max(longest_run, run)
+            words.append(word.lower())
+            end = match.end()
+        else:
+            end = None
+    if not phrases and longest_run < 2:
+        return []
+    return phrases + [[w] for w in dict.fromkeys(words)]
+
+
+def match_phrases(phrases: List[List[str]], operator: str = "AND") -> str:
+    """FTS5 query joining `phrases` (word lists) with `operator`, "AND" or "OR"."""
+    return f" {operator} ".join(_fts_phrase(phrase) for phrase in phrases)
+
+
+def exact_match(query: str) -> Optional[str]:
+    """FTS5 query requiring every specific term of `query` (see `specific_terms`), or None if it names none."""
+    terms = specific_terms(query)
+    return match_phrases(terms) if terms else None
+
+
+def reciprocal_rank_fusion(rankings: List[List[Hashable]], k: int = HYBRID_RRF_K) -> List[Tuple[Hashable, float]]:
+    """Fuses best-first rankings: each item scores the sum of 1 / (k + rank) over the rankings it appears in."""
+    scores: Dict[Hashable, float] = defaultdict(float)
+    for ranking in rankings:
+        for rank, item in enumerate(ranking, start=1):
+            scores[item] += 1.0 / (k + rank)
+    return sorted(scores.items(), key=lambda item: item[1], reverse=True)
@@ -0,0 +1,146 @@
+import hashlib
+import sqlite3
+import time
+from typing import Optional, Tuple
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS entries (
+    input_hash TEXT NOT NULL,
+    prompt_hash TEXT NOT NULL,
+    model TEXT NOT NULL,
+    value TEXT NOT NULL,
+    size INTEGER NOT NULL,
+    created_at REAL NOT NULL,
+    last_used REAL NOT NULL,
+    hits INTEGER NOT NULL DEFAULT 0,
+    PRIMARY KEY (input_hash, prompt_hash, model)
+);
+CREATE INDEX IF NOT EXISTS entries_last_used ON entries (last_used);
+CREATE TABLE IF NOT EXISTS counters (name TEXT PRIMARY KEY, value INTEGER NOT NULL);
+"""
+
+
+def sha256(data) -> str:
+    return hashlib.sha256(data.encode("utf-8") if isinstance(data, str) else data).hexdigest()
+
+
+class MemoCache:
+    """
+    SQLite-backed memo of model answers for (input, prompt, model).
+
+    The input (text or bytes) and the prompt are stored as SHA-256 hashes.
+    Hits and misses are counted for the current session (`hits`, `misses`)
+    and accumulated in the database across runs. `prune` evicts entries
+    created more than `max_age_days` ago, then, with a `max_bytes` limit,
+    the least recently used ones until the stored answers fit.
+
+    Subclasses name tables of their earlier schemas in `legacy_tables`; they
+    are dropped on open.
+    """
+
+    legacy_tables: Tuple[str, ...] = ()
+
+    def __init__(self, path: str, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None):
+        self.path = path
+        self.max_bytes = max_bytes
+        self.max_age_days = max_age_days
+        self.hits = 0
+        self.misses = 0
+        self._db = sqlite3.connect(path)
+        for table in self.legacy_tables:
+            self._db.execute(f"DROP TABLE IF EXISTS {table}")
+        self._db.executescript(SCHEMA)
+
+    @staticmethod
+    def key(data, prompt: str, model: str) -> Tuple[str, str, str]:
+        return sha256(data), sha256(prompt), model
+
+    def _count(self, name: str) -> None:
+        self._db.execute(
+            "INSERT INTO counters (name, value) VALUES (?, 1) ON CONFLICT(name) DO UPDATE SET value = value + 1",
+            (name,),
+        )
+
+    def has(self, data, prompt: str, model: str) -> bool:
+        """Whether an answer is stored, without counting a lookup."""
+        return self._db.execute(
+            "SELECT 1 FROM entries WHERE input_hash = ? AND prompt_hash = ? AND model = ?", self.key(data, prompt, model)
+        ).fetchone() is not None
+
+    def get(self, data, prompt: str, model: str) -> Optional[str]:
+        key = self.key(data, prompt, model)
+        row = self._db.execute(
+            "SELECT value FROM entries WHERE input_hash = ? AND prompt_hash = ? AND model = ?", key
+        ).fetchone()
+        if row is None:
+            self.misses += 1
+            self._count("misses")
+        else:
+            self.hits += 1
+            self._count("hits")
+            self._db.execute(
+                "UPDATE entries SET last_used = ?, hits = hits + 1 WHERE input_hash = ? AND prompt_hash = ? AND model = ?",
+                (time.time(), *key),
+            )
+        self._db.commit()
+        return row[0] if row else None
+
+    def put(self, data, prompt: str, model: str, value: str) -> None:
+        now = time.time()
+        self._db.execute(
+            "INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?, ?, ?, 0)",
+            (*self.key(data, prompt, model), value, len(value.encode("utf-8")), now, now),
+        )
+        self._db.commit()
+
+    def prune(self, max_bytes: Optional[int] = None, max_age_days: Optional[float] = None) -> int:
+        """
+        Evicts entries older than `max_age_days`, then the least recently used
+        ones until the stored answers fit in `max_bytes`. Either limit is
+        skipped when neither the argument nor the cache's setting is given.
+
+        Returns:
+            Number of entries removed
+        """
+        max_bytes = self.max_bytes if max_bytes is None else max_bytes
+        max_age_days = self.max_age_days if max_age_days is None else max_age_days
+        removed = 0
+        if max_age_days is not None:
+            removed += self._db.execute(
+                "DELETE FROM entries WHERE created_at < ?", (time.time() - max_age_days * 86400,)
+            ).rowcount
+
+        total = self._db.execute("SELECT COALESCE(SUM(size), 0) FROM entries").fetchone()[0]
+        if max_bytes is not None and total > max_bytes:
+            evict = []
+            for rowid, size in self._db.execute("SELECT rowid, size FROM entries ORDER BY last_used"):
+                if total <= max_bytes:
+                    break
+                evict.append((rowid,))
+                total -= size
+            self._db.executemany("DELETE FROM entries WHERE rowid = ?", evict)
+            removed += len(evict)
+        self._db.commit()
+        return removed
+
+    def clear(self) -> None:
+        self._db.execute("DELETE FROM entries")
+        self._db.execute("DELETE FROM counters")
+        self._db.commit()
+
+    def stats(self) -> dict:
+        entries, size, oldest, newest = self._db.execute(
+            "SELECT COUNT(*), COALESCE(SUM(size), 0), MIN(created_at), MAX(created_at) FROM entries"
+        ).fetchone()
+        counters = dict(self._db.execute("SELECT name, value FROM counters"))
+        return {
+            "entries": entries,
+            "bytes": size,
+            "oldest": oldest,
+            "newest": newest,
+            "hits": counters.get("hits", 0),
+            "misses": counters.get("misses", 0),
+        }
+
+    def close(self) -> None:
+        self._db.close()
@@ -0,0 +1,84 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional, Sequence, TypeVar, Union
+from .rate_limit import RateLimiter, backoff_delay
+from ..config.setting import (
+    LLM_RATE_LIMITS,
+    REPORT_MAX_CONCURRENCY,
+    REPORT_MAX_RETRIES,
+    REPORT_RETRY_DELAY,
+    REPORT_RETRY_MAX_DELAY,
+)
+
+logger = logging.getLogger('website_critic.parallel_map')
+
+T = TypeVar("T")
+R = TypeVar("R")
+
+_limiters: Dict[str, RateLimiter] = {}
+
+
+def provider_limiter(provider: str) -> RateLimiter:
+    """The process-wide rate limiter of `provider`, so every caller shares one quota."""
+    if provider not in _limiters:
+        limits = LLM_RATE_LIMITS[provider]
+        _limiters[provider] = RateLimiter(limits["rpm"], limits["tpm"])
+    return _limiters[provider]
+
+
+def estimate_text_tokens(text: str) -> int:
+    """Rough prompt size for rate limiting: about four characters per token."""
+    return len(text) // 4 + 1
+
+
+async def map_concurrently(
+    func: Callable[[T], Awaitable[R]],
+    items: Sequence[T],
+    max_concurrency: int = REPORT_MAX_CONCURRENCY,
+    limiter: Optional[RateLimiter] = None,
+    tokens: Callable[[T], Optional[int]] = lambda item: 0,
+    max_retries: int = REPORT_MAX_RETRIES,
+    retry_delay: float = REPORT_RETRY_DELAY,
+    max_retry_delay: float = REPORT_RETRY_MAX_DELAY,
+    on_progress: Optional[Callable[[int, int], None]] = None,
+) -> List[Union[R, BaseException]]:
+    """
+    Applies `func` to every item with at most `max_concurrency` calls in
+    flight, each admitted by `limiter` for `tokens(item)` tokens before it
+    takes a slot, so a call waiting on the rate limit does not hold one. An
+    item whose `tokens(item)` is None sends no request (e.g. it is answered
+    from a cache) and skips the limiter.
+
+    A failed call is retried up to `max_retries` times with jittered backoff.
+    Results come back in input order; an item that still fails is returned as
+    its exception, like `asyncio.gather(..., return_exceptions=True)`.
+    `on_progress(done, total)` is called as each item finishes.
+    """
+    semaphore = asyncio.Semaphore(max_concurrency)
+    done = 0
+
+    async def run(item: T) -> Union[R, BaseException]:
+        nonlocal done
+        for attempt in range(max_retries + 1):
+            estimate = tokens(item) if limiter is not None else None
+            if estimate is not None:
+                await limiter.acquire(estimate)
+            async with semaphore:
+                try:
+                    result = await func(item)
+                except Exception as e:
+                    error = e
+                else:
+                    break
+            if attempt == max_retries:
+                result = error
+                break
+            delay = backoff_delay(attempt, retry_delay, max_retry_delay)
+            logger.warning(f"Call failed ({error}), retrying in {delay:.1f}s")
+            await asyncio.sleep(delay)
+        done += 1
+        if on_progress is not None:
+            on_progress(done, len(items))
+        return result
+
+    return await asyncio.gather(*(run(item) for item in items))
@@ -0,0 +1,140 @@
+import asyncio
+import random
+import time
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Callable, Optional
+
+
+class TokenBucket:
+    """
+    Continuously refilling token bucket.
+
+    Holds at most `capacity` tokens (one minute's worth by default) and gains
+    `rate_per_minute` tokens per minute.
+    """
+
+    def __init__(self, rate_per_minute: float, capacity: Optional[float] = None, clock: Callable[[], float] = time.monotonic):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = capacity if capacity is not None else rate_per_minute
+        self.clock = clock
+        self.tokens = self.capacity
+        self._updated = clock()
+
+    def _refill(self) -> None:
+        now = self.clock()
+        self.tokens = min(self.capacity, self.tokens + (now - self._updated) * self.rate)
+        self._updated = now
+
+    def wait_time(self, amount: float) -> float:
+        """Seconds until `amount` tokens are available; 0 if they are now."""
+        self._refill()
+        amount = min(amount, self.capacity)
+        return max(0.0, (amount - self.tokens) / self.rate)
+
+    def consume(self, amount: float) -> None:
+        self._refill()
+        self.tokens -= min(amount, self.capacity)
+
+
+def backoff_delay(attempt: int, base: float, cap: float) -> float:
+    """Exponential backoff with full jitter: uniform in [0, min(cap, base * 2**attempt)]."""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+class RateLimiter:
+    """
+    Requests-per-minute and tokens-per-minute limits for one API quota.
+
+    Callers wait in `acquire` until both buckets allow the request.
+    """
+
+    def __init__(self, requests_per_minute: float, tokens_per_minute: float, clock: Callable[[], float] = time.monotonic):
+        self.requests = TokenBucket(requests_per_minute, clock=clock)
+        self.tokens = TokenBucket(tokens_per_minute, clock=clock)
+        self.clock = clock
+        self._lock = asyncio.Lock()
+
+    async def acquire(self, tokens: int = 0) -> None:
+        """Waits until one request using about `tokens` tokens may be sent."""
+        async with self._lock:
+            while True:
+                wait = max(self.requests.wait_time(1), self.tokens.wait_time(tokens))
+                if wait <= 0:
+                    self.requests.consume(1)
+                    self.tokens.consume(tokens)
+                    return
+                await asyncio.sleep(wait)
+
+
+class CircuitBreaker:
+    """
+    Stops every caller from sending requests while the provider is failing.
+
+    After `failure_threshold` consecutive failures the circuit opens
+    and `wait` blocks all callers for `cooldown` seconds. Then a single probe
+    request is let through: success closes the circuit, failure reopens it.
+    Callers send requests inside `admit`, which hands the probe to the next
+    caller if the probe ends without either (e.g. it was cancelled).
+    """
+
+    def __init__(self, failure_threshold: int, cooldown: float, clock: Callable[[], float] = time.monotonic):
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.clock = clock
+        self.failures = 0
+        self.opened_at: Optional[float] = None
+        self.times_opened = 0
+        self._probe: Optional[object] = None
+
+    @property
+    def state(self) -> str:
+        if self.opened_at is None:
+            return "closed"
+        return "open" if self.clock() < self.opened_at + self.cooldown else "half-open"
+
+    async def wait(self) -> Optional[object]:
+        """
+        Returns once a request may be sent: a probe token if the caller is the
+        half-open probe, else None. Pass the token to `release` if the probe
+        ends without recording a success or failure.
+        """
+        while True:
+            state = self.state
+            if state == "closed":
+                return None
+            if state == "half-open" and self._probe is None:
+                self._probe = object()
+                return self._probe
+            remaining = self.opened_at + self.cooldown - self.clock()
+            await asyncio.sleep(max(remaining, 0.05))
+
+    def release(self, probe: Optional[object]) -> None:
+        """Gives back an unfinished probe so another caller can send one."""
+        if probe is not None and self._probe is probe:
+            self._probe = None
+
+    @asynccontextmanager
+    async def admit(self) -> AsyncIterator[None]:
+        """`wait`, then `release` the probe on exit however the request ended."""
+        probe = await self.wait()
+        try:
+            yield
+        finally:
+            self.release(probe)
+
+    def record_success(self) -> None:
+        if self.state == "open":
+            return  # A request sent before the circuit opened
+        self.failures = 0
+        self.opened_at = None
+        self._probe = None
+
+    def record_failure(self) -> None:
+        """Counts a failure; opens (or reopens) the circuit at the threshold or when a probe fails."""
+        self.failures += 1
+        probing = self._probe is not None
+        if probing or self.failures >= self.failure_threshold:
+            if self.opened_at is None or probing:
+                self.times_opened += 1
+            self.opened_at = self.clock()
+            self._probe = None
@@ -0,0 +1,17 @@
+from .memo_cache import MemoCache
+from ..config.setting import REPORT_CACHE_PATH, REPORT_CACHE_MAX_AGE_DAYS
+
+
+class ReportCache(MemoCache):
+    """
+    SQLite-backed memo of report LLM calls: segment critiques and group
+    summaries. An entry is keyed by the input text, the prompt template
+    (so editing a prompt acts as a new prompt version) and the model, so a
+    report after a small site change only recomputes the calls whose input
+    changed. Hits and misses are counted for the current session.
+    """
+
+    legacy_tables = ("results",)
+
+    def __init__(self, path: str = REPORT_CACHE_PATH, max_age_days: float = REPORT_CACHE_MAX_AGE_DAYS):
+        super().__init__(path, max_age_days=max_age_days)
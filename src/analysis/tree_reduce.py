@@ -0,0 +1,110 @@
+import hashlib
+import logging
+from typing import Awaitable, Callable, List, Optional
+from .embeddings import count_tokens as tiktoken_counts, truncate_tokens
+from .parallel_map import map_concurrently
+from ..config.setting import REPORT_GROUP_TOKEN_BUDGET, REPORT_GROUP_FAN_IN
+
+logger = logging.getLogger('website_critic.tree_reduce')
+
+SEPARATOR = "\n\n"
+
+
+def is_boundary(key: str, level: int, fan_in: int) -> bool:
+    """Whether a group may end after the text keyed `key`; true for about one key in `fan_in`."""
+    digest = hashlib.sha256(f"{level}:{key}".encode("utf-8")).digest()
+    return int.from_bytes(digest[:8], "big") % fan_in == 0
+
+
+def pack_groups(
+    keys: List[str], counts: List[int], budget: int, level: int = 0, fan_in: int = REPORT_GROUP_FAN_IN
+) -> List[List[int]]:
+    """
+    Splits positions of consecutive texts into groups of at most `budget`
+    tokens. Besides the budget, a group ends after a text whose key is a
+    boundary, so boundaries follow the keys rather than the lengths of
+    earlier texts: a text whose length changes only moves the boundaries up
+    to the next key boundary, and the other groups keep their inputs. A text
+    that does not fit next to the previous ones starts a new group, so a
+    group holds a single text only when a pair would exceed the budget.
+    """
+    groups, current, tokens = [], [], 0
+    for position, (key, count) in enumerate(zip(keys, counts)):
+        if current and tokens + count > budget:
+            groups.append(current)
+            current, tokens = [], 0
+        current.append(position)
+        tokens += count
+        if len(current) >= 2 and is_boundary(key, level, fan_in):
+            groups.append(current)
+            current, tokens = [], 0
+    if current:
+        groups.append(current)
+    return groups
+
+
+async def tree_reduce(
+    texts: List[str],
+    summarize: Callable[[str, int], Awaitable[str]],
+    keys: Optional[List[str]] = None,
+    budget: int = REPORT_GROUP_TOKEN_BUDGET,
+    fan_in: int = REPORT_GROUP_FAN_IN,
+    count_tokens: Callable[[List[str]], List[int]] = tiktoken_counts,
+    truncate: Callable[[str, int], str] = truncate_tokens,
+    tokens: Callable[[str, int], Optional[int]] = lambda text, level: 0,
+    **map_options,
+) -> str:
+    """
+    Summarises `texts` into one text by hierarchical reduction.
+
+    Each level packs the texts into groups that fit `budget` and summarises
+    the groups in parallel (through `map_concurrently`, which takes
+    `map_options`, with `tokens(text, level)` as the limiter's estimate for a
+    joined group); the summaries form the next level, until one group is
+    left. `summarize(text, level)` gets the joined group and the level,
+    starting at 0 for groups of the original texts. The final group goes
+    through `map_concurrently` too, so it gets the same retries and limiter.
+    Latency grows with the number of levels, the logarithm of len(texts), and
+    no call sees more than one group.
+
+    So that every call fits `budget`, `truncate(text, tokens)` cuts original
+    texts longer than `budget` to the budget, and summaries to half of it:
+    any two summaries then share a group, and each level at least halves the
+    number of texts.
+
+    `keys` are stable ids of the texts (their positions by default) that
+    anchor the group boundaries, see `pack_groups`. A summary is keyed by the
+    first text of its group. With summaries memoised by input, a changed text
+    then only recomputes its own branch of the tree.
+
+    Raises:
+        ValueError: If `texts` is empty
+        The error of a group whose summary failed after retries
+    """
+    if not texts:
+        raise ValueError("No texts to summarise")
+    keys = keys if keys is not None else [str(position) for position in range(len(texts))]
+    level = 0
+    while True:
+        limit = budget if level == 0 else budget // 2
+        counts = count_tokens(texts)
+        oversize = [position for position, count in enumerate(counts) if count > limit]
+        if oversize:
+            logger.warning(f"Truncating {len(oversize)} texts to {limit} tokens (level {level})")
+            texts = list(texts)
+            for position in oversize:
+                texts[position] = truncate(texts[position], limit)
+            counts = count_tokens(texts)
+        groups = pack_groups(keys, counts, budget, level, fan_in)
+        if len(groups) > 1:
+            logger.info(f"Summarising {len(texts)} texts in {len(groups)} groups (level {level})")
+        joined = [SEPARATOR.join(texts[position] for position in group) for group in groups]
+        summaries = await map_concurrently(
+            lambda text: summarize(text, level), joined, tokens=lambda text: tokens(text, level), **map_options
+        )
+        for summary in summaries:
+            if isinstance(summary, BaseException):
+                raise summary
+        if len(summaries) == 1:
+            return summaries[0]
+        texts, keys, level = summaries, [keys[group[0]] for group in groups], level + 1
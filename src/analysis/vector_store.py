@@ -1,96 +1,484 @@
 from langchain.docstore.document import Document
-from langchain.text_splitter import RecursiveCharacterTextSplitter
-from langchain_openai import OpenAIEmbeddings
 from langchain_community.vectorstores import FAISS
-import tiktoken
-from ..config.setting import OPENAI_API_KEY
+from ..config.setting import (
+    CHUNK_OVERLAP_TOKENS,
+    EMBEDDING_MAX_TOKENS,
+    FAISS_INDEX_TYPE,
+    HYBRID_CANDIDATES,
+    LEXICAL_FAST_PATH_MAX_HITS,
+    LEXICAL_FAST_PATH_MIN_MARGIN,
+    RESULTS_RECORDS,
+    TOKENIZER_THREADS,
+)
+import json
 import os
-from typing import Dict, List
+import re
+from collections import defaultdict
+from contextlib import ExitStack, contextmanager
+from typing import Any, Dict, Iterator, List, NamedTuple, Optional, Tuple
 from langchain.docstore.document import Document
-from uuid import uuid4
-import faiss
+from langchain_core.callbacks import CallbackManagerForRetrieverRun
+from langchain_core.embeddings import Embeddings
+from langchain_core.retrievers import BaseRetriever
+import hashlib
+import heapq
+import shutil
+import numpy as np
+from .embeddings import CachedEmbeddings, get_tokenizer
+from .disk_store import (
+    DOCSTORE_FILE,
+    INDEX_FILE,
+    INVLISTS_FILE,
+    LEGACY_DOCSTORE_FILE,
+    load_store,
+    save_store,
+    store_exists,
+)
+from .lexical import match_any, match_phrases, query_terms, reciprocal_rank_fusion, specific_terms
+from .faiss_index import build_index, choose_index_type, index_type_of, supports_removal
 from langchain_community.docstore.in_memory import InMemoryDocstore
-import re
 
-def create_vector_store(documents, persist_dir: str) -> FAISS:
+class IndexUpdate(NamedTuple):
+    added: int
+    removed: int
+    unchanged: int
+
+
+def document_id(doc: Document) -> str:
+    """Stable id of a document: its website, segment and a hash of its content."""
+    content_hash = hashlib.sha256(doc.page_content.encode("utf-8")).hexdigest()
+    key = "/".join([
+        doc.metadata.get("category", ""),
+        doc.metadata.get("website", ""),
+        str(doc.metadata.get("segment", doc.metadata.get("segment_index", ""))),
+        content_hash,
+    ])
+    return hashlib.sha256(key.encode("utf-8")).hexdigest()[:32]
+
+
+def update_vector_store(
+    documents: List[Document],
+    persist_dir: str,
+    embeddings: Optional[Embeddings] = None,
+    index_type: str = FAISS_INDEX_TYPE,
+) -> Tuple[Optional[FAISS], IndexUpdate]:
     """
-    Creates and persists a FAISS vector store from text chunks.
+    Brings the FAISS store in `persist_dir` in line with `documents`.
+
+    Documents are identified by `document_id`, so only new or changed ones
+    are embedded; entries whose document is gone (a removed segment or the
+    old version of a changed one) are deleted. The saved store is updated in
+    place, or created on the first run.
+
+    The index is rebuilt (from cached embeddings) when `index_type` resolves to
+    a different type for the new corpus size, or when entries must be removed
+    from an index that cannot delete in place.
+
+    Returns:
+        The store (None if there is nothing to index) and what changed
     """
-    embeddings = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
-    uuids = [str(uuid4()) for _ in range(len(documents))]
+    embeddings = embeddings or CachedEmbeddings()
+    wanted = {document_id(doc): doc for doc in documents}
 
-    index = faiss.IndexFlatL2(len(embeddings.embed_query("hello world")))
+    store = load_store(persist_dir, embeddings, writable=True)
+    existing = set(store.index_to_docstore_id.values()) if store is not None else set()
 
-    vector_store = FAISS(
-        embedding_function=embeddings,
-        index=index,
-        docstore=InMemoryDocstore(),
-        index_to_docstore_id={},
+    stale = [doc_id for doc_id in existing if doc_id not in wanted]
+    new_ids = [doc_id for doc_id in wanted if doc_id not in existing]
+    update = IndexUpdate(added=len(new_ids), removed=len(stale), unchanged=len(existing) - len(stale))
+    desired = choose_index_type(len(wanted), index_type) if wanted else None
+    rebuild = store is not None and bool(wanted) and (
+        index_type_of(store.index) != desired or (stale and not supports_removal(store.index))
     )
-    vector_store.add_documents(documents=documents, ids=uuids)
-    vector_store.save_local(persist_dir)
-    return vector_store
+    if not stale and not new_ids and not rebuild:
+        return store, update
 
+    if rebuild:
+        store, new_ids = None, list(wanted)
+    elif stale:
+        store.delete(stale)
+    if new_ids:
+        texts = [wanted[doc_id].page_content for doc_id in new_ids]
+        vectors = embeddings.embed_documents(texts)
+        if store is None:
+            # The dimension comes from the first real embedding, not a probe request
+            store = FAISS(
+                embedding_function=embeddings,
+                index=build_index(np.array(vectors, dtype=np.float32), desired),
+                docstore=InMemoryDocstore(),
+                index_to_docstore_id={},
+            )
+        store.add_embeddings(
+            text_embeddings=list(zip(texts, vectors)),
+            metadatas=[wanted[doc_id].metadata for doc_id in new_ids],
+            ids=new_ids,
+        )
+    save_store(store, persist_dir)
+    return store, update
 
-def read_analysis_file(file_path: str, website: str) -> str:
-    """Reads the entire text file content."""
-    with open(file_path, "r", encoding="utf-8") as f:
-        return f.read()
 
-def split_into_segments(text: str) -> List[str]:
+def create_vector_store(documents, persist_dir: str, embeddings: Optional[Embeddings] = None) -> FAISS:
     """
-    Splits the text file into segments based on the segment header.
-    Expected header format: "Segment" followed by some identifier and colon.
-    
-    Returns a list of segment texts.
+    Creates or incrementally updates the persisted FAISS vector store.
     """
-    # Remove header info before the segments begin.
-    # Assuming the first line(s) before a line starting with "Segment" is header.
-    pattern = r"(?m)^Segment\s.*?:"
-    segments = re.split(pattern, text)
-    
-    # The first chunk is header info, so remove it if empty or not a segment.
-    if segments and segments[0].strip().startswith("Folder:"):
-        segments = segments[1:]
-    
-    # Re-add the header line to each segment if desired (optional)
-    # If you want to preserve the segment header, you can instead use re.finditer.
-    # For simplicity, we assume each segment chunk now is the complete segment text.
-    return [seg.strip() for seg in segments if seg.strip()]
+    return update_vector_store(documents, persist_dir, embeddings)[0]
 
-def get_all_analyses(base_dirs: Dict[str, str]) -> List[Document]:
-    """Read analyses from all results.txt files and create one document per segment."""
-    all_documents = []
-    
+
+SECTION_HEADING = re.compile(r"^[^\w\n]*(Segment Analysis|Critique)\b", re.MULTILINE)
+
+
+def section_spans(text: str) -> List[Tuple[int, int]]:
+    """Character spans of `text` starting at each "Segment Analysis:" / "Critique:" heading."""
+    starts = sorted({0} | {match.start() for match in SECTION_HEADING.finditer(text)})
+    return [(start, end) for start, end in zip(starts, starts[1:] + [len(text)]) if text[start:end].strip()]
+
+
+def _token_windows(tokens: List[int], offsets: List[int], end: int, max_tokens: int, overlap: int) -> List[Tuple[int, int]]:
+    """Character spans of windows of at most `max_tokens` tokens, consecutive windows sharing `overlap` tokens."""
+    step = max(1, max_tokens - overlap)
+    windows = []
+    for first in range(0, len(tokens), step):
+        last = min(first + max_tokens, len(tokens))
+        windows.append((offsets[first], offsets[last] if last < len(tokens) else end))
+        if last == len(tokens):
+            break
+    return windows
+
+
+def chunk_documents(
+    documents: List[Document],
+    max_tokens: int = EMBEDDING_MAX_TOKENS,
+    overlap: int = CHUNK_OVERLAP_TOKENS,
+    encoding=None,
+) -> List[Document]:
+    """
+    Splits documents longer than `max_tokens` so every chunk can be embedded.
+
+    The corpus is tokenised in one batched call. Oversized documents are cut
+    at their section headings and consecutive sections are packed back
+    together up to `max_tokens`; a single section that is still too long is
+    cut into token windows overlapping by `overlap` tokens. Every returned
+    document carries `chunk_index`, `chunk_count`, `chunk_start` and
+    `chunk_end` (character offsets into the original analysis).
+    """
+    encoding = encoding or get_tokenizer()
+    counts = [len(tokens) for tokens in encoding.encode_ordinary_batch(
+        [doc.page_content for doc in documents], num_threads=TOKENIZER_THREADS
+    )]
+
+    oversized = [doc for doc, count in zip(documents, counts) if count > max_tokens]
+    spans = {id(doc): section_spans(doc.page_content) for doc in oversized}
+    section_texts = [doc.page_content[start:end] for doc in oversized for start, end in spans[id(doc)]]
+    section_tokens = iter(encoding.encode_ordinary_batch(section_texts, num_threads=TOKENIZER_THREADS))
+
+    chunk_spans = {}
+    for doc in oversized:
+        pieces, current, current_tokens = [], None, 0
+        for start, end in spans[id(doc)]:
+            tokens = next(section_tokens)
+            if len(tokens) > max_tokens:
+                if current:
+                    pieces.append(current)
+                    current, current_tokens = None, 0
+                _, offsets = encoding.decode_with_offsets(tokens)
+                pieces.extend(
+                    (start + window_start, start + window_end)
+                    for window_start, window_end in _token_windows(tokens, offsets, end - start, max_tokens, overlap)
+                )
+            elif current and current_tokens + len(tokens) <= max_tokens:
+                current, current_tokens = (current[0], end), current_tokens + len(tokens)
+            else:
+                if current:
+                    pieces.append(current)
+                current, current_tokens = (start, end), len(tokens)
+        if current:
+            pieces.append(current)
+        chunk_spans[id(doc)] = pieces
+
+    chunks = []
+    for doc in documents:
+        pieces = chunk_spans.get(id(doc), [(0, len(doc.page_content))])
+        for index, (start, end) in enumerate(pieces):
+            chunks.append(Document(page_content=doc.page_content[start:end], metadata={
+                **doc.metadata, "chunk_index": index, "chunk_count": len(pieces), "chunk_start": start, "chunk_end": end,
+            }))
+    return chunks
+
+
+def chunk_text(text: str, max_tokens: int = EMBEDDING_MAX_TOKENS, overlap: int = CHUNK_OVERLAP_TOKENS, encoding=None) -> List[str]:
+    """Splits `text` into pieces of at most `max_tokens` tokens, like `chunk_documents`."""
+    return [doc.page_content for doc in chunk_documents([Document(page_content=text)], max_tokens, overlap, encoding)]
+
+
+Shard = Tuple[str, str]  # (category, website)
+
+
+def shard_of(doc: Document) -> Shard:
+    return doc.metadata.get("category", ""), doc.metadata.get("website", "")
+
+
+def shard_dir(persist_dir: str, shard: Shard) -> str:
+    return os.path.join(persist_dir, *shard)
+
+
+def list_shards(persist_dir: str) -> List[Shard]:
+    """Shards saved under `persist_dir`, as (category, website) pairs."""
+    if not os.path.isdir(persist_dir):
+        return []
+    return sorted(
+        (category, website)
+        for category in os.listdir(persist_dir)
+        if os.path.isdir(os.path.join(persist_dir, category))
+        for website in os.listdir(os.path.join(persist_dir, category))
+        if store_exists(os.path.join(persist_dir, category, website))
+    )
+
+
+def update_sharded_store(
+    documents: List[Document],
+    persist_dir: str,
+    embeddings: Optional[Embeddings] = None,
+    index_type: str = FAISS_INDEX_TYPE,
+) -> Dict[Shard, IndexUpdate]:
+    """
+    Brings the per-site shards under `persist_dir` in line with `documents`.
+
+    Each (category, website) pair has its own store in
+    `persist_dir/<category>/<website>`, updated by `update_vector_store`, so
+    a change on one site leaves the other shards untouched. Shards of sites
+    without documents are removed, as is an unsharded store saved by older
+    versions at the top of `persist_dir`.
+
+    Returns:
+        What changed in each shard
+    """
+    embeddings = embeddings or CachedEmbeddings()
+    groups: Dict[Shard, List[Document]] = defaultdict(list)
+    for doc in documents:
+        groups[shard_of(doc)].append(doc)
+
+    for name in (INDEX_FILE, INVLISTS_FILE, DOCSTORE_FILE, LEGACY_DOCSTORE_FILE):
+        if os.path.exists(os.path.join(persist_dir, name)):
+            os.remove(os.path.join(persist_dir, name))
+
+    updates = {}
+    for shard in list_shards(persist_dir):
+        if shard not in groups:
+            removed = load_store(shard_dir(persist_dir, shard), embeddings).index.ntotal
+            shutil.rmtree(shard_dir(persist_dir, shard))
+            updates[shard] = IndexUpdate(added=0, removed=removed, unchanged=0)
+    for shard, shard_documents in groups.items():
+        _, updates[shard] = update_vector_store(shard_documents, shard_dir(persist_dir, shard), embeddings, index_type)
+    return updates
+
+
+class ShardedStore:
+    """
+    Read-only view of the shards under `persist_dir`. Shards are opened on
+    first use; a search embeds the query once, searches the selected shards
+    and merges their hits by distance. Each shard's docstore also carries a
+    BM25 index for lexical and hybrid search.
+    """
+
+    def __init__(self, persist_dir: str, embeddings: Embeddings):
+        self.persist_dir = persist_dir
+        self.embeddings = embeddings
+        self.shards = list_shards(persist_dir)
+        self.fast_path_queries = 0
+        self._stores: Dict[Shard, FAISS] = {}
+
+    def store(self, shard: Shard) -> FAISS:
+        if shard not in self._stores:
+            self._stores[shard] = load_store(shard_dir(self.persist_dir, shard), self.embeddings)
+        return self._stores[shard]
+
+    @contextmanager
+    def _snapshot(self, shards: Optional[List[Shard]]) -> Iterator[List[Shard]]:
+        """
+        Holds a read snapshot of each shard in `shards` (all by default) for
+        one query. A shard saved again since it was opened is re-opened, so
+        its index and docstore stay of one generation; between queries no
+        snapshot is held and the writer can checkpoint the WAL.
+        """
+        shards = self.shards if shards is None else shards
+        while True:
+            with ExitStack() as stack:
+                stale = []
+                for shard in shards:
+                    docstore = self.store(shard).docstore
+                    if stack.enter_context(docstore.snapshot()) != docstore.index_generation:
+                        stale.append(shard)
+                if not stale:
+                    yield shards
+                    return
+            for shard in stale:
+                self._stores.pop(shard).docstore.close()
+
+    def select(self, categories: Optional[List[str]] = None, websites: Optional[List[str]] = None) -> List[Shard]:
+        return [
+            (category, website) for category, website in self.shards
+            if (not categories or category in categories) and (not websites or website in websites)
+        ]
+
+    def mentioned_shards(self, text: str) -> List[Shard]:
+        """
+        Shards whose website is named in `text`, by domain or by name without
+        the TLD; names shorter than three characters are too ambiguous to count.
+        """
+        return [
+            (category, website) for category, website in self.shards
+            if any(
+                re.search(rf"\b{re.escape(name)}\b", text, re.IGNORECASE)
+                for name in {website, website.rsplit(".", 1)[0]} if len(name) >= 3
+            )
+        ]
+
+    def search_by_vector(self, vector: List[float], k: int, shards: Optional[List[Shard]] = None) -> List[Tuple[Document, float]]:
+        with self._snapshot(shards) as shards:
+            hits = (
+                hit
+                for shard in shards
+                for hit in self.store(shard).similarity_search_with_score_by_vector(vector, k)
+            )
+            return heapq.nsmallest(k, hits, key=lambda hit: hit[1])
+
+    def search(self, query: str, k: int = 4, shards: Optional[List[Shard]] = None) -> List[Document]:
+        return [doc for doc, _ in self.search_by_vector(self.embeddings.embed_query(query), k, shards)]
+
+    def lexical_search(self, match: str, k: int, shards: Optional[List[Shard]] = None) -> List[Tuple[Document, float]]:
+        """
+        Hits of the FTS5 query `match`, best first; no embedding needed. Each
+        shard has its own BM25 statistics, so shard rankings are fused by
+        reciprocal rank rather than by score; the scores returned are fused.
+        """
+        docstores, rankings = {}, []
+        with self._snapshot(shards) as shards:
+            for shard in shards:
+                docstore = self.store(shard).docstore
+                ranking = [doc_id for doc_id, _ in docstore.lexical_search(match, k)]
+                docstores.update((doc_id, docstore) for doc_id in ranking)
+                rankings.append(ranking)
+            return [(docstores[doc_id].search(doc_id), score) for doc_id, score in reciprocal_rank_fusion(rankings)[:k]]
+
+    def strong_matches(self, query: str, shards: Optional[List[Shard]] = None) -> Optional[List[Document]]:
+        """
+        The segments containing every specific term of `query` (see
+        `specific_terms`), best first, if the match is strong: at most
+        LEXICAL_FAST_PATH_MAX_HITS of them, each scoring at least
+        LEXICAL_FAST_PATH_MIN_MARGIN times the BM25 score of the best segment
+        in its shard that contains only some of the terms. Otherwise None.
+        """
+        terms = specific_terms(query)
+        if not terms:
+            return None
+        limit = LEXICAL_FAST_PATH_MAX_HITS + 1
+        docstores, rankings = {}, []
+        with self._snapshot(shards) as shards:
+            for shard in shards:
+                docstore = self.store(shard).docstore
+                matched = {doc_id for doc_id, _ in docstore.lexical_search(match_phrases(terms, "AND"), limit)}
+                if not matched:
+                    continue
+                if len(matched) > LEXICAL_FAST_PATH_MAX_HITS:
+                    return None
+                # Scores of one query within one shard are comparable. Unless a partial match
+                # outranks a full one, the best partial match is among the top len(matched) + 1
+                ranked = docstore.lexical_search(match_phrases(terms, "OR"), len(matched) + 1)
+                scores = dict(ranked)
+                partial = [score for doc_id, score in ranked if doc_id not in matched]
+                if not matched <= scores.keys() or (
+                    partial and min(scores[doc_id] for doc_id in matched) < LEXICAL_FAST_PATH_MIN_MARGIN * partial[0]
+                ):
+                    return None
+                ranking = [doc_id for doc_id, _ in ranked if doc_id in matched]
+                docstores.update((doc_id, docstore) for doc_id in ranking)
+                rankings.append(ranking)
+            if not 0 < len(docstores) <= LEXICAL_FAST_PATH_MAX_HITS:
+                return None
+            return [docstores[doc_id].search(doc_id) for doc_id, _ in reciprocal_rank_fusion(rankings)]
+
+    def hybrid_search(self, query: str, k: int = 4, shards: Optional[List[Shard]] = None) -> List[Document]:
+        """
+        Answers from BM25 alone when `query` names specific terms that few
+        segments contain and that clearly outscore partial matches (see
+        `strong_matches`), without embedding it. Otherwise fuses the BM25 and
+        vector rankings by reciprocal rank.
+        """
+        # One snapshot for the whole query, so the lexical and vector rankings see the same generation
+        with self._snapshot(shards) as shards:
+            strong = self.strong_matches(query, shards)
+            if strong is not None:
+                self.fast_path_queries += 1
+                return strong[:k]
+
+            candidates = max(k, HYBRID_CANDIDATES)
+            terms = query_terms(query)
+            lexical = self.lexical_search(match_any(terms), candidates, shards) if terms else []
+            vector = self.search_by_vector(self.embeddings.embed_query(query), candidates, shards)
+        docs = {doc.id: doc for doc, _ in lexical + vector}
+        fused = reciprocal_rank_fusion([[doc.id for doc, _ in lexical], [doc.id for doc, _ in vector]])
+        return [docs[doc_id] for doc_id, _ in fused[:k]]
+
+    def as_retriever(
+        self, k: int = 4, shards: Optional[List[Shard]] = None, route_by_mention: bool = True, hybrid: bool = True
+    ) -> "ShardedRetriever":
+        return ShardedRetriever(store=self, k=k, shards=shards, route_by_mention=route_by_mention, hybrid=hybrid)
+
+
+class ShardedRetriever(BaseRetriever):
+    """
+    Retriever over a `ShardedStore`, hybrid (BM25 + vector) by default.
+    Without explicit `shards`, a question that names tracked sites only
+    searches those sites' shards.
+    """
+
+    store: Any
+    k: int = 4
+    shards: Optional[List[Shard]] = None
+    route_by_mention: bool = True
+    hybrid: bool = True
+
+    def _get_relevant_documents(self, query: str, *, run_manager: CallbackManagerForRetrieverRun) -> List[Document]:
+        shards = self.shards
+        if shards is None and self.route_by_mention:
+            shards = self.store.mentioned_shards(query) or None
+        search = self.store.hybrid_search if self.hybrid else self.store.search
+        return search(query, self.k, shards)
+
+
+def iter_analyses(base_dirs: Dict[str, str]) -> Iterator[Document]:
+    """
+    Streams one Document per successfully analysed segment from every
+    website's results.jsonl, one record at a time.
+    """
     for category, base_dir in base_dirs.items():
         if not os.path.exists(base_dir):
             continue
             
-        for website_dir in os.listdir(base_dir):
-            website_path = os.path.join(base_dir, website_dir)
-            if not os.path.isdir(website_path):
+        for website_dir in sorted(os.listdir(base_dir)):
+            records_file = os.path.join(base_dir, website_dir, RESULTS_RECORDS)
+            if not os.path.exists(records_file):
                 continue
                 
-            results_file = os.path.join(website_path, "results.txt")
-            if os.path.exists(results_file):
-                content = read_analysis_file(results_file, website_dir)
-                
-                # Split the content into segments using the segment headers.
-                segments = split_into_segments(content)
-                
-                # Create one Document per segment.
-                for i, seg_text in enumerate(segments):
-                    doc = Document(
-                        page_content=seg_text,
+            with open(records_file, "r", encoding="utf-8") as f:
+                for line in f:
+                    record = json.loads(line)
+                    if record["error"] is not None:
+                        continue
+                    yield Document(
+                        page_content=record["analysis"],
                         metadata={
                             "website": website_dir,
                             "category": category,
-                            "source": results_file,
-                            "segment_index": i + 1
+                            "source": records_file,
+                            "segment_index": record["segment_id"],
+                            "segment": record["segment"],
+                            "image_hash": record["image_hash"],
+                            "processed_at": record["processed_at"],
+                            "duplicate_of": record["duplicate_of"],
                         }
                     )
-                    all_documents.append(doc)
 
-
-    
-    return all_documents
+def get_all_analyses(base_dirs: Dict[str, str]) -> List[Document]:
+    """Read analyses from all results.jsonl files, one document per segment."""
+    return list(iter_analyses(base_dirs))
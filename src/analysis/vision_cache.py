@@ -0,0 +1,73 @@
+"""
+Persistent cache of vision analyses.
+
+Entries are keyed by the SHA-256 of the uploaded image bytes, the SHA-256 of
+the rendered prompt and the model name, so a segment is only sent to the
+model again when its pixels, the prompt or the model change. The rendered
+prompt names the segment, so identical pixels at another segment number do
+not share an answer that labels the wrong segment.
+
+Usage:
+    python -m src.analysis.vision_cache stats
+    python -m src.analysis.vision_cache prune [--max-mb 200] [--max-age-days 30]
+    python -m src.analysis.vision_cache clear
+"""
+import argparse
+import time
+from .memo_cache import MemoCache
+from ..config.setting import VISION_CACHE_PATH, VISION_CACHE_MAX_MB, VISION_CACHE_MAX_AGE_DAYS
+
+
+class VisionCache(MemoCache):
+    """
+    SQLite-backed store of model answers for (image, rendered prompt, model).
+
+    Hits and misses are counted for the current session (`hits`, `misses`)
+    and accumulated in the database across runs. `prune` applies age-based
+    and then size-based (least recently used first) eviction.
+    """
+
+    legacy_tables = ("analyses",)
+
+    def __init__(
+        self,
+        path: str = VISION_CACHE_PATH,
+        max_bytes: int = VISION_CACHE_MAX_MB * 1024 * 1024,
+        max_age_days: float = VISION_CACHE_MAX_AGE_DAYS,
+    ):
+        super().__init__(path, max_bytes, max_age_days)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--path", default=VISION_CACHE_PATH)
+    commands = parser.add_subparsers(dest="command", required=True)
+    commands.add_parser("stats", help="Show entries, size and lifetime hit rate")
+    prune = commands.add_parser("prune", help="Evict old and least recently used entries")
+    prune.add_argument("--max-mb", type=float, default=VISION_CACHE_MAX_MB)
+    prune.add_argument("--max-age-days", type=float, default=VISION_CACHE_MAX_AGE_DAYS)
+    commands.add_parser("clear", help="Remove every entry and reset the counters")
+    args = parser.parse_args()
+
+    cache = VisionCache(args.path)
+    if args.command == "prune":
+        removed = cache.prune(int(args.max_mb * 1024 * 1024), args.max_age_days)
+        print(f"Removed {removed} entries")
+    elif args.command == "clear":
+        cache.clear()
+        print("Cache cleared")
+
+    stats = cache.stats()
+    lookups = stats["hits"] + stats["misses"]
+    print(f"Entries: {stats['entries']}")
+    print(f"Size: {stats['bytes'] / 1024:.1f} KB")
+    if stats["entries"]:
+        print(f"Oldest: {time.strftime('%Y-%m-%d %H:%M', time.localtime(stats['oldest']))}")
+        print(f"Newest: {time.strftime('%Y-%m-%d %H:%M', time.localtime(stats['newest']))}")
+    print(f"Hits: {stats['hits']}, misses: {stats['misses']}"
+          + (f" ({stats['hits'] / lookups:.0%} hit rate)" if lookups else ""))
+    cache.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -1,18 +1,21 @@
 import asyncio
+from functools import lru_cache
 from typing import Optional, List
 from langchain_community.vectorstores import FAISS
 from .analysis.chat import create_chat_chain
 from .main import setup_logging
-from langchain_openai import OpenAIEmbeddings
+from .analysis.embeddings import CachedEmbeddings
+from .analysis.parallel_map import estimate_text_tokens, map_concurrently, provider_limiter
+from .analysis.report_cache import ReportCache
+from .analysis.tree_reduce import tree_reduce
 from .config.setting import OPENAI_API_KEY, GROQ_API_KEY
 
-from .analysis.vector_store import get_all_analyses
+from .analysis.vector_store import ShardedStore, get_all_analyses
 
 # Additional imports for our analysis chains
 from langchain.llms import OpenAI
 from langchain.chains import LLMChain
 from langchain.prompts import PromptTemplate
-from langchain.chains.summarize import load_summarize_chain
 from langchain.docstore.document import Document
 
 # Update imports
@@ -31,14 +34,22 @@ import re
 from datetime import datetime
 
 logger = setup_logging()
-embeddings = OpenAIEmbeddings(api_key=OPENAI_API_KEY)
 
-def load_vector_store(store_path: str = "combined_vectorstore") -> Optional[FAISS]:
-    """Load the existing vector store."""
+
+@lru_cache(maxsize=None)
+def get_embeddings() -> CachedEmbeddings:
+    """The embedding service, created on first use so importing this module opens no cache file."""
+    return CachedEmbeddings()  # Repeated questions reuse cached query vectors
+
+def load_vector_store(store_path: str = "combined_vectorstore") -> Optional[ShardedStore]:
+    """Load the existing per-site vector store shards."""
     try:
         logger.info(f"Loading vector store from {store_path}")
-        vector_store = FAISS.load_local(store_path, embeddings, allow_dangerous_deserialization=True)
-        logger.info("Vector store loaded successfully")
+        vector_store = ShardedStore(store_path, get_embeddings())
+        if not vector_store.shards:
+            logger.error(f"No vector store found at {store_path}")
+            return None
+        logger.info(f"Vector store loaded successfully ({len(vector_store.shards)} shards)")
         return vector_store
     except Exception as e:
         logger.error(f"Error loading vector store: {e}")
@@ -49,7 +60,7 @@ async def generate_comprehensive_report():
     """
     Generate a comprehensive report by:
     1. Running an individual segment analysis on each segment (map step)
-    2. Summarizing the combined analyses using a refine-style summarization chain (reduce step)
+    2. Summarizing the analyses by a token-budgeted tree reduction (reduce step)
     3. Printing the final comprehensive report
     """
     # Instead of using vector store retrieval, read directly from results file
@@ -76,28 +87,35 @@ async def generate_comprehensive_report():
     os.makedirs(segments_dir, exist_ok=True)
     logger.debug(f"Created or verified raw_segments directory at: {segments_dir}")
 
-    # Generate filename with timestamp for raw segments
-    timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
-    segments_filename = f"raw_segments_{timestamp}.txt"
-    segments_path = os.path.join(segments_dir, segments_filename)
-    logger.debug(f"Writing segments to: {segments_path}")
-
-    # Write raw segments to file with better error handling
-    try:
-        with open(segments_path, 'w', encoding='utf-8') as f:
-            f.write("=== RAW SEGMENTS FROM RESULTS FILE ===\n\n")
-            for idx, doc in enumerate(mygl_segments, start=1):
-                f.write(f"--- Segment {idx} ---\n")
-                f.write(f"Metadata: {doc.metadata}\n")
-                f.write("Content:\n")
-                f.write(doc.page_content)
-                f.write("\n\n" + "="*80 + "\n\n")
-        logger.info(f"Successfully saved {len(mygl_segments)} segments to: {segments_path}")
-        print(f"\nRaw segments saved to: {segments_path}")
-    except Exception as e:
-        logger.error(f"Error saving raw segments: {str(e)}", exc_info=True)
-        print(f"Error saving raw segments: {str(e)}")
-        return
+    dump = "=== RAW SEGMENTS FROM RESULTS FILE ===\n\n" + "".join(
+        f"--- Segment {idx} ---\nMetadata: {doc.metadata}\nContent:\n{doc.page_content}\n\n" + "="*80 + "\n\n"
+        for idx, doc in enumerate(mygl_segments, start=1)
+    )
+    previous_dumps = sorted(name for name in os.listdir(segments_dir) if name.startswith("raw_segments_"))
+    latest_dump = None
+    if previous_dumps:
+        with open(os.path.join(segments_dir, previous_dumps[-1]), 'r', encoding='utf-8') as f:
+            latest_dump = f.read()
+
+    if dump == latest_dump:
+        logger.info(f"Segments unchanged since {previous_dumps[-1]}, not writing a new dump")
+    else:
+        # Generate filename with timestamp for raw segments
+        timestamp = datetime.now().strftime('%Y%m%d_%H%M%S')
+        segments_filename = f"raw_segments_{timestamp}.txt"
+        segments_path = os.path.join(segments_dir, segments_filename)
+        logger.debug(f"Writing segments to: {segments_path}")
+
+        # Write raw segments to file with better error handling
+        try:
+            with open(segments_path, 'w', encoding='utf-8') as f:
+                f.write(dump)
+            logger.info(f"Successfully saved {len(mygl_segments)} segments to: {segments_path}")
+            print(f"\nRaw segments saved to: {segments_path}")
+        except Exception as e:
+            logger.error(f"Error saving raw segments: {str(e)}", exc_info=True)
+            print(f"Error saving raw segments: {str(e)}")
+            return
 
     # -----------------------------
     # (A) Individual Segment Analysis (Map Step)
@@ -164,15 +182,6 @@ Improvement_suggestions :
         | llm
     )
 
-    segment_analyses = []
-    print("Analyzing each segment individually...")
-    for idx, doc in enumerate(mygl_segments, start=1):
-        print(f"Analyzing segment {idx}...")
-        # Update deprecated run method
-        response = await segment_analysis_chain.ainvoke({"text": doc.page_content})
-        analysis_text = f"--- Analysis for Segment {idx} ---\n{response.content}"
-        segment_analyses.append(analysis_text)
-
     # -----------------------------
     # (B) Summarization Chain (Reduce Step)
     # -----------------------------
@@ -212,10 +221,10 @@ Emotional Journey: The content fails to evoke strong emotional responses. The ge
 
     prompt = PromptTemplate.from_template(prompt_template)
 
-    refine_template = (
-        "You are a world renowed UX expert, you have helped many companies improve their website's user experience. You are tasked with refining a preliminary comprehensive critique report. "
-        "Below is an existing summary which addresses various aspects of a website's user experience. "
-        "Your goal is to produce a final summary that preserves and clearly presents all the following details:\n\n"
+    combine_template = (
+        "You are a world renowed UX expert, you have helped many companies improve their website's user experience. You are tasked with merging preliminary critique reports. "
+        "Below are several partial reports, each covering a different part of the same website. "
+        "Your goal is to produce one report that preserves and clearly presents all the following details:\n\n"
         "1. Navigation Flow:\n"
         "   - A logical journey from awareness to conversion\n"
         "   - Internal linking strategy and breadcrumb consistency\n\n"
@@ -230,37 +239,76 @@ Emotional Journey: The content fails to evoke strong emotional responses. The ge
         "5. Emotional Journey:\n"
         "   - Use of emotional triggers (fear, FOMO, aspiration)\n"
         "   - Storytelling and cognitive load\n\n"
-        "Existing summary:\n"
-        "{existing_answer}\n\n"
-        "Additional context:\n"
+        "Partial reports:\n"
         "{text}\n\n"
-        "Based on the additional context provided, refine the original summary accordingly. "
-        "Ensure that your final summary thoroughly covers all the items listed above. "
-        "If the additional context does not add value, simply return the original summary."
+        "Merge the partial reports into a single report with the five sections above. "
+        "Keep every specific point and the exact content it refers to, and drop only repetitions."
     )
-    refine_prompt = PromptTemplate.from_template(refine_template)
-
-    # Update the summarize chain creation
-    # use resoning LLM for this. 
-    summarize_chain = load_summarize_chain(
-        llm=llm,
-        chain_type="refine",
-        question_prompt=prompt,
-        refine_prompt=refine_prompt,
-        return_intermediate_steps=True,
-        input_key="input_documents",
-        output_key="output_text",
-        verbose=True
-    )
-
-    # Convert individual segment analyses to Document objects for summarization
-    split_docs = [Document(page_content=analysis) for analysis in segment_analyses]
+    combine_prompt = PromptTemplate.from_template(combine_template)
+    critique_chain = prompt | llm
+    combine_chain = combine_prompt | llm
+
+    # Critiques and group summaries are memoised by input text, prompt and model,
+    # so only the calls whose input changed since the last report reach the API
+    report_cache = ReportCache()
+    logger.debug(f"Pruned {report_cache.prune()} stale report cache entries")
+    limiter = provider_limiter("openai")
+
+    async def memoized(chain, template: str, text: str) -> str:
+        cached = report_cache.get(text, template, llm.model_name)
+        if cached is not None:
+            return cached
+        result = (await chain.ainvoke({"text": text})).content
+        report_cache.put(text, template, llm.model_name, result)
+        return result
+
+    def request_tokens(template: str, text: str) -> Optional[int]:
+        # Acquired by map_concurrently before a slot is taken; cached calls send no request
+        if report_cache.has(text, template, llm.model_name):
+            return None
+        return estimate_text_tokens(template + text)
+
+    def report_progress(done: int, total: int) -> None:
+        print(f"Analyzed {done}/{total} segments")
+
+    async def summarize(text: str, level: int) -> str:
+        # The first level reads segment analyses, later levels merge partial reports
+        if level == 0:
+            return await memoized(critique_chain, prompt_template, text)
+        return await memoized(combine_chain, combine_template, text)
 
-    # # Update to use ainvoke
-    summary_result = await summarize_chain.ainvoke(
-        {"input_documents": split_docs}
-    )
-    overall_report = summary_result["output_text"]
+    try:
+        print("Analyzing segments...")
+        responses = await map_concurrently(
+            lambda doc: memoized(segment_analysis_chain, segment_analysis_prompt.template, doc.page_content),
+            mygl_segments,
+            limiter=limiter,
+            tokens=lambda doc: request_tokens(segment_analysis_prompt.template, doc.page_content),
+            on_progress=report_progress,
+        )
+        segment_analyses, segment_keys = [], []
+        for doc, response in zip(mygl_segments, responses):
+            segment = f"{doc.metadata['website']} segment {doc.metadata['segment_index']}"
+            if isinstance(response, BaseException):
+                logger.error(f"Analysis of {segment} failed: {response}")
+                continue
+            # Labelled by website and segment number, so one added segment leaves the other groups' inputs unchanged
+            segment_analyses.append(f"--- Analysis for {segment} ---\n{response}")
+            segment_keys.append(f"{doc.metadata['website']}/{doc.metadata['segment_index']}")
+
+        if not segment_analyses:
+            logger.error("No segment could be analysed, not generating a report")
+            return
+
+        # Groups are summarised in parallel and merged level by level, instead of one refine call per segment.
+        # Group boundaries are keyed on the segments, so a recomputed critique only invalidates its own branch
+        overall_report = await tree_reduce(
+            segment_analyses, summarize, keys=segment_keys, limiter=limiter,
+            tokens=lambda text, level: request_tokens(prompt_template if level == 0 else combine_template, text),
+        )
+        logger.info(f"Report cache: {report_cache.hits} hits, {report_cache.misses} misses")
+    finally:
+        report_cache.close()
 
     # Combine individual analyses and overall summary into one comprehensive report
     final_report = "\n\n".join([
@@ -301,11 +349,14 @@ async def chat_loop():
         logger.error("Failed to load vector store. Please run scrape.py first.")
         return
 
-    retriever = vector_store.as_retriever(search_kwargs={"k": 2})
+    # Hybrid BM25 + vector retrieval; questions naming a tracked site only search that site's shard,
+    # and exact-label questions are answered from BM25 without an embedding call
+    retriever = vector_store.as_retriever(k=2)
     chat_chain = create_chat_chain(retriever)
     
     logger.info("Starting chat session. Type 'quit' to exit or 'report' for comprehensive report.")
     print("\nChat session started. Type 'quit' to exit or 'report' for comprehensive report.")
+    print("Sites: " + ", ".join(f"{website} ({category})" for category, website in vector_store.shards))
     
     while True:
         question = input("\nYour question: ").strip()
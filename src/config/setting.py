@@ -7,6 +7,132 @@ GEMINI_API_KEY = os.getenv("GEMINI_API_KEY")
 OPENAI_API_KEY = os.getenv("OPENAI_API_KEY")
 GROQ_API_KEY = os.getenv("GROQ_API_KEY")
 
+GEMINI_MODEL = "gemini-2.0-flash"
+
 # Segmentation settings
 SEGMENT_HEIGHT = 2000
-SEGMENT_OVERLAP = 50
\ No newline at end of file
+SEGMENT_OVERLAP = 50
+STREAM_SEGMENTS = True  # Capture segment-sized tiles instead of one full-page screenshot
+# A segment is skipped when both measures fall below these thresholds
+SEGMENT_MIN_ENTROPY = 0.05  # Bits, entropy of the segment's grey-level histogram
+SEGMENT_MIN_ACTIVE_ROWS = 0.005  # Fraction of rows with visible horizontal content
+SEGMENT_MODE = "fixed"  # "fixed" or "content" (cut at whitespace gutters; disables streaming)
+SEGMENT_SNAP_TOLERANCE = 400  # Max rows a content cut may move from the fixed boundary
+SEGMENT_MIN_HEIGHT = 500  # Shorter leftover strips are merged into their neighbour
+BAND_HEIGHT = 512  # Rows decoded at a time when segmenting a saved screenshot
+MAX_SCREENSHOT_PIXELS = 150_000_000  # Pixel budget for one screenshot (~600 MB as RGBA)
+OVERSIZE_POLICY = "downsample"  # Over budget: "downsample" or "truncate", with a warning
+
+# Browser pool settings
+BROWSER_POOL_SIZE = 2  # Number of Chromium instances kept alive for a run
+MAX_CONCURRENT_PAGES = 4  # Pages open at once across the whole pool
+MAX_PAGES_PER_BROWSER = 50  # Recycle a browser after serving this many pages
+
+# Page readiness settings
+READINESS_STRATEGY = "adaptive"  # "fixed", "adaptive" or "none"
+READINESS_QUIET_MS = 300  # Network and DOM must be idle this long to count as settled
+READINESS_STEP_TIMEOUT_MS = 3000  # Max wait for the page to settle after one scroll step
+READINESS_DEADLINE_MS = 30000  # Hard cap on the whole scroll-and-settle phase
+
+# Network settings for captures
+BLOCKED_RESOURCE_TYPES = ["media", "font"]  # Playwright resource types to abort
+BLOCKED_DOMAINS = [
+    "google-analytics.com",
+    "googletagmanager.com",
+    "doubleclick.net",
+    "facebook.net",
+    "hotjar.com",
+    "clarity.ms",
+    "intercom.io",
+    "intercomcdn.com",
+    "tawk.to",
+    "zopim.com",
+    "youtube.com",
+    "vimeo.com",
+]
+HAR_MODE = None  # None, "record", "replay" or "auto" (replay when an archive exists)
+HAR_DIR = "har_archives"
+
+# Change detection: per-URL DOM and segment fingerprints from the last run
+FINGERPRINT_STORE = "fingerprints.json"
+
+# Perceptual-hash deduplication of segments
+PHASH_INDEX_PATH = "phash_index.json"
+PHASH_SIZE = 16  # dHash grid size; hashes have PHASH_SIZE**2 bits
+PHASH_THRESHOLD = 8  # Max differing bits for two segments to be compared as duplicate candidates
+PHASH_CONFIRM_TILE = 16  # Candidates are compared pixel by pixel in tiles of this many pixels square
+PHASH_CONFIRM_TOLERANCE = 6.0  # Max mean grey-level difference within any tile; one changed word exceeds it
+
+# Segment upload encoding, per vision model. Gemini tiles images into 768 px
+# crops, so pixels beyond a 1536 px long edge mostly add tokens and bytes.
+IMAGE_ENCODINGS = {
+    "default": {"max_edge": 1536, "format": "PNG", "quality": None},
+    "gemini-2.0-flash": {"max_edge": 1536, "format": "WEBP", "quality": 85},
+}
+ENCODE_WORKERS = 4  # Processes used to encode a folder's segments
+
+# Gemini request limits, shared by every site in a run
+GEMINI_MAX_CONCURRENCY = 8  # Vision requests in flight at once
+GEMINI_RPM = 2000  # Requests per minute allowed by the project's quota
+GEMINI_TPM = 4_000_000  # Input tokens per minute allowed by the project's quota
+GEMINI_MAX_RETRIES = 5  # Retries of a request that failed with a retryable error
+GEMINI_RETRY_DELAY = 2.0  # Backoff base in seconds; doubles on each attempt
+
+# Persistent cache of vision analyses, keyed by image bytes, rendered prompt and model
+VISION_CACHE_PATH = "vision_cache.sqlite"
+VISION_CACHE_MAX_MB = 200  # Least recently used analyses are evicted beyond this
+VISION_CACHE_MAX_AGE_DAYS = 30  # Analyses older than this are evicted
+
+# Multi-segment requests: several segments share one prompt and one request
+GEMINI_BATCH_SIZE = 4  # Segments per request; 1 sends every segment on its own
+GEMINI_BATCH_TOKEN_BUDGET = 5000  # Max image tokens per batched request
+
+# Resilience of segment analysis
+GEMINI_RETRY_MAX_DELAY = 60.0  # Cap on one backoff delay; delays are jittered below it
+GEMINI_BREAKER_THRESHOLD = 5  # Consecutive retryable failures (429, 5xx, timeouts) that open the circuit
+GEMINI_BREAKER_COOLDOWN = 30.0  # Seconds every worker pauses while the circuit is open
+ANALYSIS_JOURNAL = "analysis_journal.jsonl"  # Per-folder checkpoint of finished analyses
+RESULTS_RECORDS = "results.jsonl"  # Per-folder analysis records; results.txt is rendered from them
+
+# Embedding service used for indexing and chat queries
+EMBEDDING_MODEL = "text-embedding-ada-002"
+EMBEDDING_CACHE_PATH = "embedding_cache.sqlite"  # Vectors keyed by model and text hash
+EMBEDDING_BATCH_SIZE = 512  # Texts per request; the API accepts up to 2048
+EMBEDDING_BATCH_TOKENS = 250_000  # Tokens per request; the API accepts up to 300k
+EMBEDDING_MAX_CONCURRENCY = 4  # Embedding requests in flight at once
+
+# FAISS index selection. "auto" picks by corpus size; or one of "flat", "ivf_flat", "hnsw", "ivf_pq"
+FAISS_INDEX_TYPE = "auto"
+FAISS_FLAT_MAX_VECTORS = 20_000  # Below this, exact brute-force search is fast enough
+FAISS_PQ_MIN_VECTORS = 500_000  # From this size, vectors are compressed with product quantization
+FAISS_IVF_NPROBE = 16  # Inverted lists scanned per query by IVF indexes
+FAISS_HNSW_M = 32  # Graph neighbours per vector in HNSW indexes
+FAISS_HNSW_EF_CONSTRUCTION = 200  # Candidate list size while inserting into an HNSW graph
+FAISS_HNSW_EF_SEARCH = 128  # Candidate list size of an HNSW search
+
+# Hybrid retrieval: BM25 over the docstore fused with vector search
+HYBRID_CANDIDATES = 20  # Hits taken from each of the lexical and vector rankings before fusion
+HYBRID_RRF_K = 60  # Reciprocal rank fusion constant; larger values flatten the rank weighting
+LEXICAL_FAST_PATH_MAX_HITS = 5  # An exact-term query matching at most this many segments skips the embedding call
+LEXICAL_FAST_PATH_MIN_MARGIN = 1.5  # ...and only if each match scores this many times the best BM25 score of a partial match
+
+# Chunking of analyses before embedding
+EMBEDDING_MAX_TOKENS = 8191  # Longest input the embedding model accepts
+CHUNK_OVERLAP_TOKENS = 200  # Tokens repeated between consecutive windows of an oversized section
+TOKENIZER_THREADS = 8  # Threads used by batched tokenisation
+
+# LLM calls of report generation, per provider
+REPORT_MAX_CONCURRENCY = 6  # Segment critiques in flight at once
+LLM_RATE_LIMITS = {  # Requests and tokens per minute allowed by each provider's quota
+    "openai": {"rpm": 3500, "tpm": 160_000},
+    "groq": {"rpm": 30, "tpm": 6_000},
+}
+REPORT_MAX_RETRIES = 3  # Retries of a failed segment critique
+REPORT_RETRY_DELAY = 2.0  # Backoff base in seconds; doubles on each attempt
+REPORT_RETRY_MAX_DELAY = 60.0  # Cap on one backoff delay
+REPORT_GROUP_TOKEN_BUDGET = 10_000  # Max input tokens per summarisation call; leaves room for the prompt and answer in a 16k context
+REPORT_GROUP_FAN_IN = 8  # Average texts per summarisation group when the token budget allows
+
+# Memoised report steps, keyed by input text, prompt template and model
+REPORT_CACHE_PATH = "report_cache.sqlite"
+REPORT_CACHE_MAX_AGE_DAYS = 30  # Entries older than this are evicted
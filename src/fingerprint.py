@@ -0,0 +1,82 @@
+import hashlib
+import json
+import os
+import re
+from datetime import datetime
+from typing import Dict, List, Optional
+from PIL import Image
+from playwright.async_api import Page
+from .config.setting import FINGERPRINT_STORE
+from .image_processing.dedup import pixel_digest
+
+# Visible text plus the media the page references; layout-only changes are ignored.
+DOM_SNAPSHOT_SCRIPT = """
+    () => ({
+        text: document.body ? document.body.innerText : "",
+        media: Array.from(document.querySelectorAll("img, source, video"))
+            .map(el => el.currentSrc || el.src || el.getAttribute("srcset") || el.poster || "")
+            .filter(Boolean)
+    })
+"""
+
+
+def normalise_text(text: str) -> str:
+    """Collapses whitespace and drops zero-width characters so re-renders hash identically."""
+    text = re.sub(r"[\u200b-\u200d\ufeff]", "", text)
+    return re.sub(r"\s+", " ", text).strip()
+
+
+async def dom_fingerprint(page: Page) -> str:
+    """Returns a SHA-256 of the page's normalised text and media sources."""
+    snapshot = await page.evaluate(DOM_SNAPSHOT_SCRIPT)
+    payload = normalise_text(snapshot["text"]) + "\n" + "\n".join(sorted(set(snapshot["media"])))
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+def pixel_fingerprint(image_path: str) -> str:
+    """Returns a SHA-256 of the decoded pixels, independent of PNG encoder settings."""
+    with Image.open(image_path) as img:
+        return pixel_digest(img)
+
+
+def segment_fingerprints(segment_paths: List[str], digests: Optional[Dict[str, str]] = None) -> Dict[str, str]:
+    """
+    Maps each segment filename to its pixel fingerprint, taken from `digests`
+    (by path, e.g. filled during segmentation) when present there.
+    """
+    digests = digests or {}
+    return {os.path.basename(path): digests.get(path) or pixel_fingerprint(path) for path in segment_paths}
+
+
+class FingerprintStore:
+    """
+    Per-URL record of what the last successful run saw.
+
+    Each entry holds the DOM fingerprint and the pixel fingerprint of every
+    segment, so a later run can tell which stages have unchanged inputs.
+    The store is a single JSON file.
+    """
+
+    def __init__(self, path: str = FINGERPRINT_STORE):
+        self.path = path
+        self._entries: Dict[str, dict] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                self._entries = json.load(f)
+
+    def get(self, url: str) -> dict:
+        return self._entries.get(url, {})
+
+    def update(self, url: str, dom_hash: str, segments: Dict[str, str]) -> None:
+        self._entries[url] = {
+            "dom_hash": dom_hash,
+            "segments": segments,
+            "updated_at": datetime.utcnow().isoformat() + "Z",
+        }
+        self.save()
+
+    def save(self) -> None:
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
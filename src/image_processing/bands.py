@@ -0,0 +1,280 @@
+import io
+import logging
+import math
+import struct
+import zlib
+from collections import deque
+from contextlib import contextmanager
+from typing import Callable, Iterable, Iterator, List, NamedTuple, Optional, Tuple
+from PIL import Image
+from ..config.setting import BAND_HEIGHT, MAX_SCREENSHOT_PIXELS, OVERSIZE_POLICY
+
+logger = logging.getLogger('website_critic.segmentation')
+
+PNG_SIGNATURE = b"\x89PNG\r\n\x1a\n"
+PNG_CHANNELS = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}  # Colour type -> samples per pixel
+OVERSIZE_POLICIES = ("downsample", "truncate")
+READ_SIZE = 1 << 20  # Bytes of a (possibly huge) IDAT chunk read at a time
+
+
+class PngHeader(NamedTuple):
+    width: int
+    height: int
+    bit_depth: int
+    color_type: int
+    interlace: int
+
+    @property
+    def streamable(self) -> bool:
+        """Band decoding supports the non-interlaced 8-bit PNGs Chromium writes."""
+        return self.bit_depth == 8 and self.interlace == 0 and self.color_type in PNG_CHANNELS
+
+    @property
+    def row_bytes(self) -> int:
+        """Bytes per filtered scanline, including the leading filter-type byte."""
+        return 1 + self.width * PNG_CHANNELS[self.color_type]
+
+
+def read_png_header(path: str) -> Optional[PngHeader]:
+    """Returns the IHDR fields of a PNG file, or None if the file is not a PNG."""
+    with open(path, "rb") as f:
+        if f.read(8) != PNG_SIGNATURE:
+            return None
+        length, chunk_type = struct.unpack(">I4s", f.read(8))
+        if chunk_type != b"IHDR":
+            return None
+        width, height, bit_depth, color_type, _, _, interlace = struct.unpack(">IIBBBBB", f.read(13))
+    return PngHeader(width, height, bit_depth, color_type, interlace)
+
+
+def _chunk(chunk_type: bytes, data: bytes) -> bytes:
+    return struct.pack(">I", len(data)) + chunk_type + data + struct.pack(">I", zlib.crc32(chunk_type + data))
+
+
+def _decode_rows(header: PngHeader, extra_chunks: List[bytes], filtered: bytes, previous_row: Optional[bytes]) -> Image.Image:
+    """
+    Lets Pillow unfilter a run of scanlines by wrapping them in a small PNG.
+
+    PNG filters may reference the scanline above, so the previous band's last
+    row is prepended unfiltered (filter type 0) and cropped off afterwards.
+    """
+    raw = filtered if previous_row is None else b"\x00" + previous_row + filtered
+    rows = len(raw) // header.row_bytes
+    ihdr = struct.pack(">IIBBBBB", header.width, rows, header.bit_depth, header.color_type, 0, 0, 0)
+    png = (
+        PNG_SIGNATURE
+        + _chunk(b"IHDR", ihdr)
+        + b"".join(extra_chunks)
+        + _chunk(b"IDAT", zlib.compress(raw, 0))
+        + _chunk(b"IEND", b"")
+    )
+    band = Image.open(io.BytesIO(png))
+    band.load()
+    return band
+
+
+def iter_png_bands(path: str, band_height: int = BAND_HEIGHT) -> Iterator[Tuple[int, Image.Image]]:
+    """
+    Decodes a PNG from top to bottom in bands of `band_height` rows.
+
+    The compressed stream is inflated incrementally, so memory is bounded by
+    one band regardless of the image height. Only streamable PNGs (see
+    `PngHeader.streamable`) are supported.
+
+    Yields:
+        (top_row, band_image) tuples
+    """
+    with open(path, "rb") as f:
+        if f.read(8) != PNG_SIGNATURE:
+            raise ValueError(f"Not a PNG file: {path}")
+
+        header = None
+        extra_chunks = []
+        inflater = zlib.decompressobj()
+        pending = bytearray()
+        previous_row = None
+        top = 0
+
+        def flush(final: bool) -> Iterator[Tuple[int, Image.Image]]:
+            nonlocal pending, previous_row, top
+            band_bytes = band_height * header.row_bytes
+            while top < header.height and (len(pending) >= band_bytes or (final and pending)):
+                rows = min(band_height, header.height - top, len(pending) // header.row_bytes)
+                if rows == 0:
+                    return
+                filtered = bytes(pending[:rows * header.row_bytes])
+                del pending[:rows * header.row_bytes]
+                band = _decode_rows(header, extra_chunks, filtered, previous_row)
+                last_row = band.crop((0, band.height - 1, band.width, band.height)).tobytes()
+                if previous_row is not None:
+                    band = band.crop((0, 1, band.width, band.height))
+                previous_row = last_row
+                yield top, band
+                top += rows
+
+        while True:
+            chunk_header = f.read(8)
+            if len(chunk_header) < 8:
+                break
+            length, chunk_type = struct.unpack(">I4s", chunk_header)
+            if chunk_type == b"IDAT":
+                remaining = length
+                while remaining:
+                    data = f.read(min(READ_SIZE, remaining))
+                    remaining -= len(data)
+                    pending += inflater.decompress(data)
+                    yield from flush(final=False)
+            else:
+                data = f.read(length)
+                if chunk_type == b"IHDR":
+                    header = PngHeader(*struct.unpack(">IIBBBBB", data)[:4], data[12])
+                    if not header.streamable:
+                        raise ValueError(f"PNG cannot be band-decoded: {header}")
+                elif chunk_type in (b"PLTE", b"tRNS"):
+                    extra_chunks.append(_chunk(chunk_type, data))
+            f.read(4)  # CRC
+            if chunk_type == b"IEND":
+                break
+
+        pending += inflater.flush()
+        yield from flush(final=True)
+
+
+@contextmanager
+def _pillow_pixel_limit(limit: Optional[int]):
+    """Temporarily replaces Pillow's decompression-bomb limit; our own budget applies instead."""
+    previous = Image.MAX_IMAGE_PIXELS
+    Image.MAX_IMAGE_PIXELS = limit
+    try:
+        yield
+    finally:
+        Image.MAX_IMAGE_PIXELS = previous
+
+
+class BandSource:
+    """
+    Row bands of a screenshot, with an explicit pixel budget.
+
+    Streamable PNGs are decoded band by band (see `iter_png_bands`); any other
+    image is decoded whole and then sliced. Images over `max_pixels` are either
+    downsampled by the smallest integer factor that fits, or truncated to the
+    rows that fit, with a warning instead of an error.
+
+    `width` and `height` are the dimensions after the budget is applied.
+    """
+
+    def __init__(
+        self,
+        path: str,
+        band_height: int = BAND_HEIGHT,
+        max_pixels: int = MAX_SCREENSHOT_PIXELS,
+        oversize: str = OVERSIZE_POLICY,
+    ):
+        if oversize not in OVERSIZE_POLICIES:
+            raise ValueError(f"Unknown oversize policy '{oversize}', expected one of {OVERSIZE_POLICIES}")
+        self.path = path
+        self.header = read_png_header(path)
+        self.streamable = self.header is not None and self.header.streamable
+        if self.header is not None:
+            width, height = self.header.width, self.header.height
+        else:
+            with _pillow_pixel_limit(None), Image.open(path) as img:
+                width, height = img.size
+
+        self.scale = 1
+        self.source_rows = height
+        if width * height > max_pixels:
+            if oversize == "truncate":
+                self.source_rows = max(1, max_pixels // width)
+                logger.warning(
+                    f"{path} is {width}x{height} px, over the {max_pixels} px budget; "
+                    f"truncating to the first {self.source_rows} rows"
+                )
+            else:
+                self.scale = math.ceil(math.sqrt(width * height / max_pixels))
+                logger.warning(
+                    f"{path} is {width}x{height} px, over the {max_pixels} px budget; "
+                    f"downsampling by {self.scale}x"
+                )
+
+        # Bands must be a multiple of the scale so downsampling has no seams
+        self.band_height = math.ceil(band_height / self.scale) * self.scale
+        self.width = math.ceil(width / self.scale)
+        self.height = math.ceil(self.source_rows / self.scale)
+
+    def _whole_image_bands(self) -> Iterator[Tuple[int, Image.Image]]:
+        with _pillow_pixel_limit(None), Image.open(self.path) as img:
+            img.load()
+            for top in range(0, min(img.height, self.source_rows), self.band_height):
+                yield top, img.crop((0, top, img.width, min(top + self.band_height, img.height)))
+
+    def __iter__(self) -> Iterator[Tuple[int, Image.Image]]:
+        bands = iter_png_bands(self.path, self.band_height) if self.streamable else self._whole_image_bands()
+        for top, band in bands:
+            if top >= self.source_rows:
+                break
+            if top + band.height > self.source_rows:
+                band = band.crop((0, 0, band.width, self.source_rows - top))
+            if band.mode not in ("RGB", "RGBA", "L"):
+                band = band.convert("RGBA")
+            if self.scale > 1:
+                band = band.reduce(self.scale)
+            yield top // self.scale, band
+
+
+def iter_strips(
+    bands: Iterable[Tuple[int, Image.Image]],
+    cuts: List[Tuple[int, int]],
+    on_band: Optional[Callable[[Image.Image], None]] = None,
+    keep: Optional[Callable[[int, int], bool]] = None,
+) -> Iterator[Tuple[int, int, int, Image.Image]]:
+    """
+    Assembles (possibly overlapping) strips from a stream of row bands.
+
+    Only the bands a strip touches are kept in memory. `cuts` must be ordered
+    by top and bottom.
+
+    Args:
+        bands: (top_row, band_image) tuples in row order
+        cuts: (top, bottom) rows of each strip
+        on_band: Called with every band as it is read
+        keep: Called with (top, bottom) once those rows have been read;
+              strips it rejects are not assembled
+
+    Yields:
+        (strip_index, top, bottom, strip_image), with 1-based indices
+    """
+    band_iter = iter(bands)
+    window = deque()
+    rows_read = 0
+    exhausted = False
+
+    for index, (top, bottom) in enumerate(cuts, start=1):
+        while rows_read < bottom and not exhausted:
+            try:
+                band_top, band = next(band_iter)
+            except StopIteration:
+                exhausted = True
+                break
+            if on_band is not None:
+                on_band(band)
+            window.append((band_top, band))
+            rows_read = band_top + band.height
+
+        while window and window[0][0] + window[0][1].height <= top:
+            window.popleft()
+
+        bottom = min(bottom, rows_read)
+        if bottom <= top or not window:
+            continue
+        if keep is not None and not keep(top, bottom):
+            continue
+
+        first = window[0][1]
+        strip = Image.new(first.mode, (first.width, bottom - top))
+        for band_top, band in window:
+            if band_top >= bottom:
+                break
+            piece = band.crop((0, max(top - band_top, 0), band.width, min(bottom - band_top, band.height)))
+            strip.paste(piece, (0, max(band_top - top, 0)))
+        yield index, top, bottom, strip
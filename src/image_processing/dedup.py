@@ -0,0 +1,221 @@
+import hashlib
+import json
+import os
+from typing import Dict, List, Optional, Set, Tuple
+import numpy as np
+from PIL import Image
+from ..config.setting import (
+    PHASH_INDEX_PATH,
+    PHASH_SIZE,
+    PHASH_THRESHOLD,
+    PHASH_CONFIRM_TILE,
+    PHASH_CONFIRM_TOLERANCE,
+)
+
+
+# Screenshots are mostly flat colour; a small dead zone keeps equal-looking
+# neighbours from flipping bits on rounding noise.
+DHASH_MARGIN = 2
+
+
+def dhash(img: Image.Image, hash_size: int = PHASH_SIZE) -> int:
+    """
+    Difference hash: compares horizontally adjacent pixels of a tiny greyscale
+    thumbnail. Near-identical images differ in only a few of the hash_size**2 bits.
+    """
+    thumbnail = img.convert("L").resize((hash_size + 1, hash_size), Image.Resampling.LANCZOS)
+    pixels = list(thumbnail.getdata())
+    bits = 0
+    for row in range(hash_size):
+        offset = row * (hash_size + 1)
+        for col in range(hash_size):
+            bits = (bits << 1) | (pixels[offset + col] > pixels[offset + col + 1] + DHASH_MARGIN)
+    return bits
+
+
+def hamming(a: int, b: int) -> int:
+    return bin(a ^ b).count("1")
+
+
+def pixel_digest(img: Image.Image) -> str:
+    """SHA-256 of the decoded pixels, independent of PNG encoder settings."""
+    digest = hashlib.sha256(f"{img.mode}:{img.width}x{img.height}:".encode("utf-8"))
+    digest.update(img.tobytes())
+    return digest.hexdigest()
+
+
+def same_content(
+    a: Image.Image, b: Image.Image, tile: int = PHASH_CONFIRM_TILE, tolerance: float = PHASH_CONFIRM_TOLERANCE
+) -> bool:
+    """
+    Whether two images show the same content at full resolution: equal sizes
+    and no tile whose mean grey-level difference exceeds `tolerance`. Sparse
+    noise is spread over a tile and passes; changed text is concentrated in a
+    few tiles and does not.
+    """
+    if a.size != b.size:
+        return False
+    diff = np.abs(np.asarray(a.convert("L"), dtype=np.int16) - np.asarray(b.convert("L"), dtype=np.int16))
+    height, width = diff.shape
+    padded = np.zeros((-(-height // tile) * tile, -(-width // tile) * tile), dtype=np.float32)
+    padded[:height, :width] = diff
+    tiles = padded.reshape(padded.shape[0] // tile, tile, padded.shape[1] // tile, tile).mean(axis=(1, 3))
+    return bool(tiles.max() <= tolerance)
+
+
+class PerceptualHashIndex:
+    """
+    Persistent index of segment perceptual hashes and the analyses made for them.
+
+    Segments are registered during segmentation. An earlier, non-duplicate
+    segment whose hash is within `threshold` bits is only a candidate: the
+    new segment becomes its duplicate, across pages, sites and runs, once
+    `same_content` confirms the two at full resolution, and then reuses its
+    analysis instead of being sent to the vision model again. Candidates are
+    looked up in hash bands (see `_bands`) rather than by scanning the index.
+    A segment re-registered at the same path keeps its previous analysis only
+    if its pixels are unchanged. When a canonical segment's pixels change,
+    the duplicates pointing at it are unlinked.
+
+    The index is a single JSON file mapping segment path to
+    {"hash", "pixels", "duplicate_of", "analysis"}. Entries whose file no
+    longer exists are dropped on save.
+    """
+
+    def __init__(self, path: str = PHASH_INDEX_PATH, threshold: int = PHASH_THRESHOLD):
+        self.path = path
+        self.threshold = threshold
+        self._entries: Dict[str, dict] = {}
+        self._buckets: Dict[Tuple[int, int], Set[str]] = {}
+        if os.path.exists(path):
+            with open(path, "r", encoding="utf-8") as f:
+                # Entries without a pixel digest predate confirmation and cannot be trusted for reuse
+                self._entries = {key: entry for key, entry in json.load(f).items() if "pixels" in entry}
+        for key, entry in self._entries.items():
+            if entry["duplicate_of"] not in self._entries:
+                entry["duplicate_of"] = None
+            if entry["duplicate_of"] is None:
+                self._bucket_add(key, int(entry["hash"], 16))
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def _bands(self, value: int) -> List[Tuple[int, int]]:
+        """
+        Splits a hash into threshold + 1 bands. Two hashes within `threshold`
+        bits differ in at most `threshold` bands, so they share at least one.
+        """
+        bits = PHASH_SIZE * PHASH_SIZE
+        count = self.threshold + 1
+        bounds = [bits * band // count for band in range(count + 1)]
+        return [
+            (band, (value >> bounds[band]) & ((1 << (bounds[band + 1] - bounds[band])) - 1))
+            for band in range(count)
+        ]
+
+    def _bucket_add(self, key: str, value: int) -> None:
+        for band in self._bands(value):
+            self._buckets.setdefault(band, set()).add(key)
+
+    def _bucket_remove(self, key: str, value: int) -> None:
+        for band in self._bands(value):
+            self._buckets.get(band, set()).discard(key)
+
+    def add(self, segment_path: str, img: Optional[Image.Image] = None, pixels: Optional[str] = None) -> Optional[str]:
+        """
+        Registers a segment and returns the path of the segment it duplicates, if any.
+
+        Args:
+            segment_path: Saved segment file
+            img: Already-decoded segment, to avoid reading the file again
+            pixels: `pixel_digest` of the segment, if already computed
+        """
+        key = os.path.normpath(segment_path)
+        if img is None:
+            with Image.open(segment_path) as opened:
+                opened.load()
+                return self.add(segment_path, opened, pixels)
+        value = dhash(img)
+        pixels = pixels or pixel_digest(img)
+
+        previous = self._entries.get(key)
+        analysis = None
+        if previous:
+            if previous["pixels"] == pixels:
+                analysis = previous.get("analysis")
+            if previous["duplicate_of"] is None:
+                self._bucket_remove(key, int(previous["hash"], 16))
+
+        duplicate_of = self._nearest(img, value, exclude=key)
+        self._entries[key] = {"hash": format(value, "x"), "pixels": pixels, "duplicate_of": duplicate_of, "analysis": analysis}
+        if duplicate_of is None:
+            self._bucket_add(key, value)
+        if previous:
+            # Duplicates of this segment follow it only while its pixels are unchanged
+            for other, entry in self._entries.items():
+                if entry["duplicate_of"] != key:
+                    continue
+                if previous["pixels"] == pixels:
+                    entry["duplicate_of"] = duplicate_of or key
+                else:
+                    entry["duplicate_of"] = None
+                    self._bucket_add(other, int(entry["hash"], 16))
+        return duplicate_of
+
+    def _nearest(self, img: Image.Image, value: int, exclude: str) -> Optional[str]:
+        candidates = set()
+        for band in self._bands(value):
+            candidates |= self._buckets.get(band, set())
+        candidates.discard(exclude)
+        distances = {key: hamming(int(self._entries[key]["hash"], 16), value) for key in candidates}
+        for key in sorted(candidates, key=lambda key: (distances[key], key)):
+            if distances[key] <= self.threshold and self._confirm(key, img):
+                return key
+        return None
+
+    def _confirm(self, key: str, img: Image.Image) -> bool:
+        """Compares `img` with the canonical segment's file, if it still holds the registered pixels."""
+        if not os.path.exists(key):
+            return False
+        with Image.open(key) as canonical:
+            canonical.load()
+            if pixel_digest(canonical) != self._entries[key]["pixels"]:
+                return False
+            return same_content(canonical, img)
+
+    def duplicate_of(self, segment_path: str) -> Optional[str]:
+        entry = self._entries.get(os.path.normpath(segment_path))
+        return entry["duplicate_of"] if entry else None
+
+    def analysis_for(self, segment_path: str) -> Optional[str]:
+        """Returns a reusable analysis: the segment's own, else the one of the segment it duplicates."""
+        entry = self._entries.get(os.path.normpath(segment_path))
+        if not entry:
+            return None
+        if entry.get("analysis"):
+            return entry["analysis"]
+        if entry["duplicate_of"]:
+            canonical = self._entries.get(entry["duplicate_of"])
+            if canonical:
+                return canonical.get("analysis")
+        return None
+
+    def record_analysis(self, segment_path: str, analysis: str) -> None:
+        entry = self._entries.get(os.path.normpath(segment_path))
+        if entry is not None:
+            entry["analysis"] = analysis
+
+    def save(self) -> None:
+        for key in [key for key in self._entries if not os.path.exists(key)]:
+            entry = self._entries.pop(key)
+            if entry["duplicate_of"] is None:
+                self._bucket_remove(key, int(entry["hash"], 16))
+        for key, entry in self._entries.items():
+            if entry["duplicate_of"] is not None and entry["duplicate_of"] not in self._entries:
+                entry["duplicate_of"] = None
+                self._bucket_add(key, int(entry["hash"], 16))
+
+        tmp_path = self.path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(self._entries, f)
+        os.replace(tmp_path, self.path)
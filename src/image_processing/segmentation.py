@@ -1,49 +1,317 @@
 from PIL import Image
+from io import BytesIO
+from typing import AsyncIterable, Dict, List, Optional, Tuple
+import numpy as np
 import os
+from .bands import BandSource, iter_strips
+from .dedup import PerceptualHashIndex, pixel_digest
+from ..config.setting import (
+    SEGMENT_MIN_ENTROPY,
+    SEGMENT_MIN_ACTIVE_ROWS,
+    SEGMENT_MODE,
+    SEGMENT_SNAP_TOLERANCE,
+    SEGMENT_MIN_HEIGHT,
+)
 
-def segment_image(image_path: str, segment_height: int, overlap: int, output_folder: str, output_prefix: str = "segment_") -> list:
+SEGMENT_MODES = ("fixed", "content")
+
+HISTOGRAM_BINS = 16  # Grey levels are quantised to 16 bins for entropy
+ROW_ACTIVITY_STD = 2.0  # A row with a grey-level std above this has visible content
+STATS_CHUNK_ROWS = 512  # Rows processed per vectorised step, bounds temporary memory
+
+class RowStatistics:
+    """
+    Per-row activity measures for an image, computed once with NumPy.
+
+    Each row gets a quantised grey-level histogram, an entropy and a standard
+    deviation. Prefix sums over those arrays make any strip query O(1), so
+    deciding which segments carry information costs one pass over the pixels
+    no matter how many strips are tested.
+    """
+
+    def __init__(self):
+        self._rows = 0
+        # Buffers grow by doubling, so adding rows band by band costs linear time
+        self._histograms = np.zeros((0, HISTOGRAM_BINS), np.int64)
+        self._stds = np.zeros(0, np.float32)
+        self._histogram_prefix = np.zeros((1, HISTOGRAM_BINS), np.int64)
+        self._active_prefix = np.zeros(1, np.int64)
+
+    @classmethod
+    def from_image(cls, img: Image.Image) -> "RowStatistics":
+        stats = cls()
+        stats.add_rows(np.asarray(img.convert("L")))
+        return stats
+
+    def add_rows(self, gray: np.ndarray) -> None:
+        """Appends statistics for a (rows, width) uint8 greyscale array."""
+        levels = np.arange(256, dtype=np.float64)
+        for start in range(0, gray.shape[0], STATS_CHUNK_ROWS):
+            chunk = gray[start:start + STATS_CHUNK_ROWS]
+            rows = chunk.shape[0]
+            # One bincount gives an exact 256-level histogram for every row in the chunk
+            flat_index = (np.arange(rows, dtype=np.int64)[:, None] * 256 + chunk).ravel()
+            histogram = np.bincount(flat_index, minlength=rows * 256).reshape(rows, 256)
+            width = max(1, chunk.shape[1])
+            mean = histogram @ levels / width
+            variance = np.maximum(histogram @ (levels * levels) / width - mean * mean, 0)
+            self._append(histogram.reshape(rows, HISTOGRAM_BINS, -1).sum(axis=2), np.sqrt(variance).astype(np.float32))
+
+    def _append(self, histograms: np.ndarray, stds: np.ndarray) -> None:
+        top, bottom = self._rows, self._rows + len(stds)
+        self._histograms = _reserve(self._histograms, bottom)
+        self._stds = _reserve(self._stds, bottom)
+        self._histogram_prefix = _reserve(self._histogram_prefix, bottom + 1)
+        self._active_prefix = _reserve(self._active_prefix, bottom + 1)
+        self._histograms[top:bottom] = histograms
+        self._stds[top:bottom] = stds
+        self._histogram_prefix[top + 1:bottom + 1] = self._histogram_prefix[top] + np.cumsum(histograms, axis=0)
+        self._active_prefix[top + 1:bottom + 1] = self._active_prefix[top] + np.cumsum(stds > ROW_ACTIVITY_STD)
+        self._rows = bottom
+
+    @property
+    def height(self) -> int:
+        return self._rows
+
+    @property
+    def row_std(self) -> np.ndarray:
+        return self._stds[:self._rows]
+
+    @property
+    def row_entropy(self) -> np.ndarray:
+        return _entropy(self._histograms[:self._rows])
+
+    def strip_entropy(self, top: int, bottom: int) -> float:
+        """Entropy in bits of the grey-level histogram of rows [top, bottom)."""
+        return float(_entropy(self._histogram_prefix[bottom] - self._histogram_prefix[top]))
+
+    def active_fraction(self, top: int, bottom: int) -> float:
+        """Fraction of rows in [top, bottom) that have visible horizontal content."""
+        return float(self._active_prefix[bottom] - self._active_prefix[top]) / max(1, bottom - top)
+
+    def is_low_information(
+        self,
+        top: int,
+        bottom: int,
+        min_entropy: float = SEGMENT_MIN_ENTROPY,
+        min_active_rows: float = SEGMENT_MIN_ACTIVE_ROWS,
+    ) -> bool:
+        """
+        True for strips not worth analysing: plain or near-uniform backgrounds
+        and strips whose only content is a thin divider line.
+        """
+        return self.strip_entropy(top, bottom) < min_entropy and self.active_fraction(top, bottom) < min_active_rows
+
+def _reserve(buffer: np.ndarray, length: int) -> np.ndarray:
+    """Returns `buffer`, or a copy at least twice as long, with room for `length` rows."""
+    if len(buffer) >= length:
+        return buffer
+    grown = np.zeros((max(length, 2 * len(buffer)),) + buffer.shape[1:], buffer.dtype)
+    grown[:len(buffer)] = buffer
+    return grown
+
+def _entropy(histogram: np.ndarray) -> np.ndarray:
+    """Shannon entropy in bits along the last axis of a histogram array."""
+    counts = histogram.astype(np.float64)
+    totals = counts.sum(axis=-1, keepdims=True)
+    p = np.divide(counts, totals, out=np.zeros_like(counts), where=totals > 0)
+    logs = np.log2(p, out=np.zeros_like(p), where=p > 0)
+    return -(p * logs).sum(axis=-1)
+
+def is_low_information(segment: Image.Image) -> bool:
+    """Returns True if a standalone segment image carries too little information to analyse."""
+    return RowStatistics.from_image(segment).is_low_information(0, segment.height)
+
+def fixed_cuts(height: int, segment_height: int, overlap: int) -> List[Tuple[int, int]]:
+    """Returns (top, bottom) rows of fixed-height strips that overlap by `overlap` pixels."""
+    cuts = []
+    y = 0
+    while y < height:
+        bottom = min(y + segment_height, height)
+        cuts.append((y, bottom))
+        if bottom == height:
+            break
+        y = y + segment_height - overlap
+    return cuts
+
+def content_cuts(
+    stats: RowStatistics,
+    segment_height: int,
+    overlap: int,
+    tolerance: int = SEGMENT_SNAP_TOLERANCE,
+    min_height: int = SEGMENT_MIN_HEIGHT,
+) -> List[Tuple[int, int]]:
+    """
+    Returns (top, bottom) rows of strips whose cuts fall in whitespace gutters.
+
+    Each cut snaps to the quiet band (rows without visible content) nearest to
+    the fixed-height boundary, up to `tolerance` rows either side of it, and is
+    placed in the middle of that band. Cuts inside a gutter need no overlap. If
+    no gutter is in range the least active row is used and the strips overlap
+    as in fixed mode. A final strip shorter than `min_height` is merged into
+    the one before it.
+    """
+    height = stats.height
+    quiet = stats.row_std <= ROW_ACTIVITY_STD
+    cuts = []
+    top = 0
+    while top < height:
+        target = top + segment_height
+        if target >= height:
+            cuts.append((top, height))
+            break
+
+        low = min(max(top + min_height, target - tolerance), target)
+        high = min(target + tolerance, height - 1)
+        quiet_rows = low + np.flatnonzero(quiet[low:high + 1])
+        if len(quiet_rows):
+            # Middle of the gutter containing the quiet row nearest the boundary
+            nearest = int(quiet_rows[np.argmin(np.abs(quiet_rows - target))])
+            band_start = band_end = nearest
+            while band_start > low and quiet[band_start - 1]:
+                band_start -= 1
+            while band_end < high and quiet[band_end + 1]:
+                band_end += 1
+            cut = max((band_start + band_end + 1) // 2, top + 1)
+            cuts.append((top, cut))
+            top = cut
+        else:
+            cut = low + int(np.argmin(stats.row_std[low:high + 1]))
+            cuts.append((top, cut))
+            top = max(cut - overlap, top + 1)
+
+    if len(cuts) > 1 and cuts[-1][1] - cuts[-1][0] < min_height:
+        cuts[-2:] = [(cuts[-2][0], cuts[-1][1])]
+    return cuts
+
+def _register(
+    segment_path: str, segment: Image.Image, phash_index: Optional[PerceptualHashIndex], digests: Optional[Dict[str, str]]
+) -> None:
+    """Hashes a saved segment's pixels once, for the perceptual-hash index and `digests`."""
+    if phash_index is None and digests is None:
+        return
+    digest = pixel_digest(segment)
+    if digests is not None:
+        digests[segment_path] = digest
+    if phash_index is not None:
+        phash_index.add(segment_path, segment, digest)
+
+def segment_image(
+    image_path: str,
+    segment_height: int,
+    overlap: int,
+    output_folder: str,
+    output_prefix: str = "segment_",
+    mode: str = SEGMENT_MODE,
+    phash_index: Optional[PerceptualHashIndex] = None,
+    digests: Optional[Dict[str, str]] = None,
+) -> list:
     """
     Splits an image into vertical segments with overlap.
-    
+
+    Images over the MAX_SCREENSHOT_PIXELS budget are downsampled or truncated
+    according to OVERSIZE_POLICY (see `BandSource`).
+
     Args:
         image_path: Path to input image
         segment_height: Height of each segment in pixels
         overlap: Overlap between segments in pixels 
         output_folder: Folder to save segments
         output_prefix: Prefix for segment filenames
+        mode: "fixed" cuts every `segment_height` pixels; "content" snaps cuts
+              to nearby whitespace gutters (see `content_cuts`)
+        phash_index: When given, every saved segment is registered so that
+                     near-duplicates can reuse an existing analysis
+        digests: When given, filled with the `pixel_digest` of every saved
+                 segment by path, so later stages need not decode it again
     
     Returns:
         List of paths to saved valid segments
     """
+    if mode not in SEGMENT_MODES:
+        raise ValueError(f"Unknown segmentation mode '{mode}', expected one of {SEGMENT_MODES}")
     if not os.path.exists(output_folder):
         os.makedirs(output_folder)
     
-    img = Image.open(image_path)
-    width, height = img.size
-    y = 0
-    segment_index = 1
+    # The screenshot is read in row bands, so memory depends on the segment
+    # height rather than on the page height
+    source = BandSource(image_path)
+    stats = RowStatistics()
+    add_band = lambda band: stats.add_rows(np.asarray(band.convert("L")))
+    if mode == "content":
+        # Cuts depend on the whole page, so statistics take a first pass
+        for _, band in source:
+            add_band(band)
+        cuts = content_cuts(stats, segment_height, overlap)
+        on_band = None
+    else:
+        cuts = fixed_cuts(source.height, segment_height, overlap)
+        on_band = add_band
     valid_segments = []
-    
-    while y < height:
-        bottom = min(y + segment_height, height)
-        segment = img.crop((0, y, width, bottom))
-        
-        # Skip uniform segments
-        seg_rgb = segment.convert("RGB")
-        colors = seg_rgb.getcolors(maxcolors=1000000)
-        if colors and len(colors) == 1 and colors[0][1] in [(255, 255, 255), (0, 0, 0)]:
-            y = y + segment_height - overlap
-            segment_index += 1
-            continue
 
+    # Blank and near-uniform segments are skipped without being assembled
+    strips = iter_strips(source, cuts, on_band=on_band, keep=lambda top, bottom: not stats.is_low_information(top, bottom))
+    for segment_index, top, bottom, segment in strips:
         segment_path = os.path.join(output_folder, f"{output_prefix}{segment_index}.png")
         segment.save(segment_path)
         valid_segments.append(segment_path)
-        
-        if bottom == height:
-            break
-            
-        y = y + segment_height - overlap
-        segment_index += 1
+        _register(segment_path, segment, phash_index, digests)
+
+    return valid_segments
+
+async def save_segment_stream(
+    segments: AsyncIterable[Tuple[int, bytes]],
+    output_folder: str,
+    output_prefix: str = "segment_",
+    phash_index: Optional[PerceptualHashIndex] = None,
+    digests: Optional[Dict[str, str]] = None,
+) -> list:
+    """
+    Saves already-cut PNG segments (e.g. from `capture_segments`) as they arrive.
+
+    Only one segment is decoded at a time, to check whether it is blank; the PNG
+    bytes are written as-is.
 
-    return valid_segments
\ No newline at end of file
+    Args:
+        segments: Async iterable of (segment_index, png_bytes)
+        output_folder: Folder to save segments
+        output_prefix: Prefix for segment filenames
+        phash_index: Perceptual-hash index to register saved segments in
+        digests: Filled with the pixel digest of every saved segment (see `segment_image`)
+
+    Returns:
+        List of paths to saved valid segments
+    """
+    os.makedirs(output_folder, exist_ok=True)
+    valid_segments = []
+
+    async for segment_index, png_bytes in segments:
+        with Image.open(BytesIO(png_bytes)) as segment:
+            if is_low_information(segment):
+                continue
+
+            segment_path = os.path.join(output_folder, f"{output_prefix}{segment_index}.png")
+            with open(segment_path, "wb") as f:
+                f.write(png_bytes)
+            valid_segments.append(segment_path)
+            _register(segment_path, segment, phash_index, digests)
+
+    return valid_segments
+
+def remove_stale_segments(output_folder: str, segments: List[str], output_prefix: str = "segment_") -> List[str]:
+    """
+    Deletes segment files in `output_folder` that are not in `segments`, e.g.
+    those left by an earlier capture of a page that has since become shorter.
+
+    Returns:
+        List of paths of the deleted files
+    """
+    keep = {os.path.normpath(path) for path in segments}
+    stale = [
+        os.path.join(output_folder, f) for f in sorted(os.listdir(output_folder))
+        if f.startswith(output_prefix) and f.lower().endswith(".png")
+        and os.path.normpath(os.path.join(output_folder, f)) not in keep
+    ]
+    for path in stale:
+        os.remove(path)
+    return stale
@@ -3,17 +3,21 @@ import os
 import logging
 import colorlog
 from urllib.parse import urlparse
-from typing import Dict, List
-import tiktoken
+from typing import Dict, List, Optional
 from datetime import datetime
 
 # Import existing modules
-from src.screenshot.capture import capture_screenshot
-from src.image_processing.segmentation import segment_image
-from src.analysis.gemini import process_folder
-from src.analysis.vector_store import create_vector_store, get_all_analyses
+from src.screenshot.capture import capture_screenshot, capture_segments
+from src.screenshot.browser_pool import BrowserPool
+from src.screenshot.network import RoutingPolicy
+from src.fingerprint import FingerprintStore, dom_fingerprint, segment_fingerprints
+from src.image_processing.segmentation import segment_image, save_segment_stream, remove_stale_segments
+from src.image_processing.dedup import PerceptualHashIndex
+from src.analysis.gemini import AnalysisEngine, process_folder, records_complete
+from src.analysis.vision_cache import VisionCache
+from src.analysis.vector_store import chunk_documents, update_sharded_store, get_all_analyses
 from src.analysis.chat import create_chat_chain
-from src.config.setting import SEGMENT_HEIGHT, SEGMENT_OVERLAP
+from src.config.setting import SEGMENT_HEIGHT, SEGMENT_OVERLAP, STREAM_SEGMENTS, SEGMENT_MODE
 
 # Configure logging
 def setup_logging():
@@ -70,13 +74,27 @@ def setup_logging():
 # Initialize logger
 logger = setup_logging()
 
-TOKEN_LIMIT = 8191  # OpenAI's max token limit for embeddings
+async def process_website(
+    url: str,
+    output_base: str,
+    pool: Optional[BrowserPool] = None,
+    fingerprints: Optional[FingerprintStore] = None,
+    phash_index: Optional[PerceptualHashIndex] = None,
+    engine: Optional[AnalysisEngine] = None,
+) -> bool:
+    """
+    Process a single website end-to-end, capturing through `pool` when given.
 
-# Initialize the tokenizer
-tokenizer = tiktoken.get_encoding("cl100k_base")
+    With a fingerprint store, work stops at the earliest stage whose inputs are
+    unchanged since the last run and the previous results.jsonl is reused. A
+    results.jsonl with failed segments is never reused, and fingerprints are only
+    stored once every segment has an analysis, so failures are retried. With a
+    perceptual-hash index, near-duplicate segments reuse existing analyses.
+    Segments are analysed through `engine`, whose rate limits span all sites.
 
-async def process_website(url: str, output_base: str) -> None:
-    """Process a single website end-to-end."""
+    Returns:
+        True if the site's analyses were regenerated, False if they were reused
+    """
     logger.info(f"Starting processing for website: {url}")
     
     domain = urlparse(url).netloc.replace("www.", "")
@@ -84,51 +102,114 @@ async def process_website(url: str, output_base: str) -> None:
     os.makedirs(output_dir, exist_ok=True)
     logger.debug(f"Created output directory: {output_dir}")
     
+    routing = RoutingPolicy.from_settings()
+    previous = fingerprints.get(url) if fingerprints is not None else {}
+    has_results = records_complete(output_dir)
+    dom_hash = None
+    digests: Dict[str, str] = {}  # Pixel digests of the saved segments, computed as they are written
+    
+    async def check_dom(page) -> bool:
+        nonlocal dom_hash
+        dom_hash = await dom_fingerprint(page)
+        return not (has_results and dom_hash == previous.get("dom_hash"))
+    
     try:
-        logger.info("Capturing screenshot...")
-        screenshot = await capture_screenshot(url)
-        logger.debug(f"Screenshot captured successfully: {len(screenshot)} bytes")
+        # Content-aware cuts need the whole screenshot, so they only apply to the full-page path
+        if STREAM_SEGMENTS and SEGMENT_MODE == "fixed":
+            logger.info("Capturing screenshot as segment tiles...")
+            segments = await save_segment_stream(
+                capture_segments(url, SEGMENT_HEIGHT, SEGMENT_OVERLAP, pool=pool, routing=routing, on_ready=check_dom),
+                output_dir,
+                phash_index=phash_index,
+                digests=digests
+            )
+        else:
+            logger.info("Capturing screenshot...")
+            screenshot = await capture_screenshot(url, pool=pool, routing=routing, on_ready=check_dom)
+            segments = []
+            if screenshot is not None:
+                logger.debug(f"Screenshot captured successfully: {len(screenshot)} bytes")
+                
+                temp_path = os.path.join(output_dir, "temp.png")
+                with open(temp_path, "wb") as f:
+                    f.write(screenshot)
+                logger.debug(f"Temporary screenshot saved to: {temp_path}")
+                
+                logger.info("Segmenting screenshot...")
+                segments = segment_image(
+                    temp_path, SEGMENT_HEIGHT, SEGMENT_OVERLAP, output_dir,
+                    mode=SEGMENT_MODE, phash_index=phash_index, digests=digests
+                )
+                
+                os.remove(temp_path)
+                logger.debug("Temporary screenshot removed")
         
-        temp_path = os.path.join(output_dir, "temp.png")
-        with open(temp_path, "wb") as f:
-            f.write(screenshot)
-        logger.debug(f"Temporary screenshot saved to: {temp_path}")
+        logger.debug(f"Blocked {routing.blocked_count} requests during capture")
+        
+        if has_results and dom_hash == previous.get("dom_hash"):
+            logger.info(f"Page content unchanged, reusing previous analysis: {url}")
+            return False
         
-        logger.info("Segmenting screenshot...")
-        segments = segment_image(temp_path, SEGMENT_HEIGHT, SEGMENT_OVERLAP, output_dir)
         logger.info(f"Created {len(segments)} segments")
         logger.debug(f"Segment paths: {segments}")
+        stale = remove_stale_segments(output_dir, segments)
+        if stale:
+            logger.info(f"Removed {len(stale)} segments no longer on the page")
         
-        os.remove(temp_path)
-        logger.debug("Temporary screenshot removed")
+        segment_hashes = await asyncio.to_thread(segment_fingerprints, segments, digests)
+        if has_results and segment_hashes == previous.get("segments"):
+            logger.info(f"Segments unchanged, reusing previous analysis: {url}")
+            fingerprints.update(url, dom_hash, segment_hashes)
+            return False
         
         logger.info("Analyzing segments with Gemini Vision...")
-        process_folder(output_dir)
+        await process_folder(output_dir, phash_index=phash_index, engine=engine, segments=segments, digests=digests)
         logger.info("Segment analysis complete")
         
+        if fingerprints is not None:
+            if records_complete(output_dir):
+                fingerprints.update(url, dom_hash, segment_hashes)
+            else:
+                logger.warning(f"Some segments failed, fingerprints not stored so the next run retries them: {url}")
+        return True
+        
     except Exception as e:
         logger.error(f"Error processing website {url}: {str(e)}", exc_info=True)
         raise
 
-def count_tokens(text: str) -> int:
-    """Returns the number of tokens in the given text using OpenAI's tokenizer."""
-    return len(tokenizer.encode(text))
-
 async def process_all_websites(websites: Dict[str, List[str]]) -> None:
     """Process all websites and create combined vector store."""
     logger.info("Starting batch processing of websites")
     logger.debug(f"Websites to process: {websites}")
     
-    tasks = []
-    for category, urls in websites.items():
-        base_dir = f"{category}_websites"
-        os.makedirs(base_dir, exist_ok=True)
-        logger.debug(f"Created directory for {category}: {base_dir}")
-        tasks.extend([process_website(url, base_dir) for url in urls])
-    
-    logger.info("Processing all websites concurrently...")
-    await asyncio.gather(*tasks)
-    logger.info("Website processing complete")
+    fingerprints = FingerprintStore()
+    phash_index = PerceptualHashIndex()
+    vision_cache = VisionCache()
+    logger.debug(f"Pruned {vision_cache.prune()} expired vision cache entries")
+    engine = AnalysisEngine(cache=vision_cache)
+    
+    async with BrowserPool() as pool:
+        tasks = []
+        for category, urls in websites.items():
+            base_dir = f"{category}_websites"
+            os.makedirs(base_dir, exist_ok=True)
+            logger.debug(f"Created directory for {category}: {base_dir}")
+            tasks.extend([process_website(
+                url, base_dir, pool=pool, fingerprints=fingerprints, phash_index=phash_index, engine=engine
+            ) for url in urls])
+        
+        logger.info("Processing all websites concurrently...")
+        try:
+            changed = await asyncio.gather(*tasks)
+        finally:
+            engine.close()
+    logger.info(f"Website processing complete ({sum(changed)} of {len(changed)} sites changed)")
+    logger.info(f"Vision cache: {vision_cache.hits} hits, {vision_cache.misses} misses")
+    vision_cache.close()
+    
+    if not any(changed) and os.path.exists("combined_vectorstore"):
+        logger.info("No site changed since the last run, keeping existing vector store")
+        return
     
     base_dirs = {
         "target": "target_websites",
@@ -139,23 +220,17 @@ async def process_all_websites(websites: Dict[str, List[str]]) -> None:
     all_documents = get_all_analyses(base_dirs)
     logger.info(f"Collected {len(all_documents)} document segments")
     
-    logger.info("Checking token limits for each segment...")
-    for doc in all_documents:
-        segment_text = doc.page_content
-        segment_tokens = count_tokens(segment_text)
-        
-        logger.debug(
-            f"Segment {doc.metadata['segment_index']} "
-            f"(Website: {doc.metadata['website']}): {segment_tokens} tokens"
-        )
-        
-        if segment_tokens > TOKEN_LIMIT:
-            excess_tokens = segment_tokens - TOKEN_LIMIT
-            logger.warning(
-                f"Segment {doc.metadata['segment_index']} exceeds token limit "
-                f"by {excess_tokens} tokens"
-            )
-    
-    logger.info("Creating vector store...")
-    create_vector_store(all_documents, "combined_vectorstore")
-    logger.info("Vector store created successfully")
\ No newline at end of file
+    logger.info("Chunking analyses to the embedding token limit...")
+    chunks = chunk_documents(all_documents)
+    logger.info(f"Split {len(all_documents)} segments into {len(chunks)} chunks")
+    
+    logger.info("Updating vector store...")
+    updates = update_sharded_store(chunks, "combined_vectorstore")
+    for (category, website), update in updates.items():
+        if update.added or update.removed:
+            logger.info(f"Shard {category}/{website}: {update.added} added, {update.removed} removed")
+    logger.info(
+        f"Vector store updated: {sum(u.added for u in updates.values())} added, "
+        f"{sum(u.removed for u in updates.values())} removed, "
+        f"{sum(u.unchanged for u in updates.values())} unchanged across {len(updates)} shards"
+    )
\ No newline at end of file
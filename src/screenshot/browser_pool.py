@@ -0,0 +1,157 @@
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Dict, List, Optional
+from playwright.async_api import async_playwright, Browser, Page
+from ..config.setting import BROWSER_POOL_SIZE, MAX_CONCURRENT_PAGES, MAX_PAGES_PER_BROWSER
+
+logger = logging.getLogger('website_critic.browser_pool')
+
+
+class _BrowserSlot:
+    """A pool position holding one live browser and its usage counters."""
+
+    def __init__(self, browser: Browser):
+        self.browser = browser
+        self.pages_served = 0
+
+
+class BrowserPool:
+    """
+    Keeps a small number of headless Chromium browsers alive for a whole run.
+
+    Every call to `page()` gets a fresh, isolated browser context, so cookies and
+    storage never leak between sites. A semaphore caps the number of pages open at
+    once, and browsers are replaced after `max_pages_per_browser` pages or as soon
+    as they disconnect (crash).
+
+    Usage:
+        async with BrowserPool() as pool:
+            async with pool.page() as page:
+                await page.goto(url)
+    """
+
+    def __init__(
+        self,
+        size: int = BROWSER_POOL_SIZE,
+        max_concurrent_pages: int = MAX_CONCURRENT_PAGES,
+        max_pages_per_browser: int = MAX_PAGES_PER_BROWSER,
+        launch_options: Optional[dict] = None,
+    ):
+        if size < 1:
+            raise ValueError("Browser pool size must be at least 1")
+        if max_concurrent_pages < 1:
+            raise ValueError("max_concurrent_pages must be at least 1")
+        self.size = size
+        self.max_pages_per_browser = max_pages_per_browser
+        self.launch_options = {"headless": True, **(launch_options or {})}
+        self._semaphore = asyncio.Semaphore(max_concurrent_pages)
+        self._lock = asyncio.Lock()
+        self._playwright = None
+        self._slots: List[_BrowserSlot] = []
+        # Open page count per browser, including browsers already retired from a slot
+        self._active: Dict[Browser, int] = {}
+        self._retired: List[Browser] = []
+        self._next_slot = 0
+        self.browsers_launched = 0
+
+    async def __aenter__(self) -> "BrowserPool":
+        await self.start()
+        return self
+
+    async def __aexit__(self, exc_type, exc, tb) -> None:
+        await self.close()
+
+    async def start(self) -> None:
+        """Start Playwright and launch the initial set of browsers."""
+        if self._playwright is not None:
+            return
+        self._playwright = await async_playwright().start()
+        for _ in range(self.size):
+            self._slots.append(_BrowserSlot(await self._launch()))
+        logger.debug(f"Browser pool started with {self.size} browser(s)")
+
+    async def close(self) -> None:
+        """Close every browser (live and retired) and stop Playwright."""
+        if self._playwright is None:
+            return
+        browsers = [slot.browser for slot in self._slots] + self._retired
+        self._slots = []
+        self._retired = []
+        self._active = {}
+        for browser in browsers:
+            await self._close_browser(browser)
+        await self._playwright.stop()
+        self._playwright = None
+        logger.debug("Browser pool closed")
+
+    @asynccontextmanager
+    async def page(self, **context_options) -> AsyncIterator[Page]:
+        """
+        Yields a new page in its own browser context.
+
+        Args:
+            **context_options: Passed to `browser.new_context` (viewport, scale, ...)
+        """
+        if self._playwright is None:
+            raise RuntimeError("BrowserPool.start() must be called before requesting pages")
+
+        async with self._semaphore:
+            browser = await self._acquire()
+            context = None
+            try:
+                context = await browser.new_context(**context_options)
+                yield await context.new_page()
+            finally:
+                if context is not None:
+                    try:
+                        await context.close()
+                    except Exception as e:
+                        logger.debug(f"Ignoring error while closing context: {e}")
+                await self._release(browser)
+
+    async def _launch(self) -> Browser:
+        browser = await self._playwright.chromium.launch(**self.launch_options)
+        self._active[browser] = 0
+        self.browsers_launched += 1
+        return browser
+
+    async def _acquire(self) -> Browser:
+        """Pick the next slot round-robin, recycling its browser if it is spent or dead."""
+        async with self._lock:
+            slot = self._slots[self._next_slot]
+            self._next_slot = (self._next_slot + 1) % len(self._slots)
+
+            crashed = not slot.browser.is_connected()
+            if crashed or slot.pages_served >= self.max_pages_per_browser:
+                reason = "crashed" if crashed else f"served {slot.pages_served} pages"
+                logger.info(f"Recycling browser ({reason})")
+                old_browser = slot.browser
+                slot.browser = await self._launch()
+                slot.pages_served = 0
+                self._retired.append(old_browser)
+                await self._close_if_idle(old_browser)
+
+            slot.pages_served += 1
+            self._active[slot.browser] += 1
+            return slot.browser
+
+    async def _release(self, browser: Browser) -> None:
+        async with self._lock:
+            if browser in self._active:
+                self._active[browser] -= 1
+                await self._close_if_idle(browser)
+
+    async def _close_if_idle(self, browser: Browser) -> None:
+        """Retired browsers are closed once their last page has been released."""
+        if browser in self._retired and self._active.get(browser, 0) == 0:
+            self._retired.remove(browser)
+            self._active.pop(browser, None)
+            await self._close_browser(browser)
+
+    @staticmethod
+    async def _close_browser(browser: Browser) -> None:
+        try:
+            await browser.close()
+        except Exception as e:
+            logger.debug(f"Ignoring error while closing browser: {e}")
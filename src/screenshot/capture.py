@@ -1,41 +1,134 @@
 import asyncio
-from playwright.async_api import async_playwright
-
-async def auto_scroll(page):
-    """Scrolls down the page gradually to trigger lazy-loading."""
-    await page.evaluate("""
-        async () => {
-            await new Promise((resolve) => {
-                let totalHeight = 0;
-                const distance = 100;
-                const timer = setInterval(() => {
-                    window.scrollBy(0, distance);
-                    totalHeight += distance;
-                    if (totalHeight >= document.body.scrollHeight) {
-                        clearInterval(timer);
-                        resolve();
-                    }
-                }, 100);
-            });
-        }
-    """)
-
-async def capture_screenshot(url: str) -> bytes:
-    """Captures full page screenshot."""
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Awaitable, Callable, Optional, Tuple
+from playwright.async_api import async_playwright, Page
+from .browser_pool import BrowserPool
+from .network import RoutingPolicy, attach_har
+from .readiness import auto_scroll, load_page
+from ..config.setting import READINESS_STRATEGY, SEGMENT_HEIGHT, SEGMENT_OVERLAP, HAR_MODE
+
+ReadyHook = Callable[[Page], Awaitable[bool]]
+
+CONTEXT_OPTIONS = {
+    'viewport': {'width': 1280, 'height': 720},
+    'device_scale_factor': 2
+}
+
+@asynccontextmanager
+async def _open_page(pool: Optional[BrowserPool]) -> AsyncIterator[Page]:
+    """Yields a page from `pool`, or from a dedicated browser when no pool is given."""
+    if pool is not None:
+        async with pool.page(**CONTEXT_OPTIONS) as page:
+            yield page
+        return
+
     async with async_playwright() as p:
         browser = await p.chromium.launch(headless=True)
-        context = await browser.new_context(
-            viewport={'width': 1280, 'height': 720},
-            device_scale_factor=2
+        try:
+            context = await browser.new_context(**CONTEXT_OPTIONS)
+            try:
+                yield await context.new_page()
+            finally:
+                # Closing the context explicitly flushes any HAR being recorded
+                await context.close()
+        finally:
+            await browser.close()
+
+async def _prepare_page(
+    page: Page,
+    url: str,
+    readiness: str,
+    routing: Optional[RoutingPolicy],
+    har_mode: Optional[str],
+) -> None:
+    if har_mode:
+        await attach_har(page, url, har_mode)
+    if routing is not None:
+        await routing.apply(page)
+    page.on("dialog", lambda dialog: asyncio.create_task(dialog.dismiss()))
+    await load_page(page, url, readiness)
+
+async def capture_screenshot(
+    url: str,
+    pool: Optional[BrowserPool] = None,
+    readiness: str = READINESS_STRATEGY,
+    routing: Optional[RoutingPolicy] = None,
+    har_mode: Optional[str] = HAR_MODE,
+    on_ready: Optional[ReadyHook] = None,
+) -> Optional[bytes]:
+    """
+    Captures full page screenshot.
+
+    Args:
+        url: Page to capture
+        pool: Shared browser pool. When omitted a dedicated browser is launched
+              for this URL and closed afterwards.
+        readiness: Page readiness strategy ("fixed", "adaptive" or "none")
+        routing: Request-blocking policy; all requests are allowed when omitted
+        har_mode: "record", "replay" or "auto" to capture through a per-URL HAR
+                  archive, or None to use the live network only
+        on_ready: Awaited with the page once it is ready; returning False skips
+                  the screenshot (e.g. when the page is known to be unchanged)
+
+    Returns:
+        PNG bytes, or None if `on_ready` skipped the capture
+    """
+    async with _open_page(pool) as page:
+        await _prepare_page(page, url, readiness, routing, har_mode)
+        if on_ready is not None and not await on_ready(page):
+            return None
+        return await page.screenshot(full_page=True, timeout=60000)
+
+async def capture_segments(
+    url: str,
+    segment_height: int = SEGMENT_HEIGHT,
+    overlap: int = SEGMENT_OVERLAP,
+    pool: Optional[BrowserPool] = None,
+    readiness: str = READINESS_STRATEGY,
+    routing: Optional[RoutingPolicy] = None,
+    har_mode: Optional[str] = HAR_MODE,
+    on_ready: Optional[ReadyHook] = None,
+) -> AsyncIterator[Tuple[int, bytes]]:
+    """
+    Captures a page as a stream of segment-sized PNG tiles.
+
+    Tiles follow the same boundaries and numbering as `segment_image` would
+    produce from the full-page screenshot, but each one is rendered through a
+    clip region, so no full-page image is ever held in memory.
+
+    Args:
+        url: Page to capture
+        segment_height: Height of each segment in image pixels
+        overlap: Overlap between segments in image pixels
+        pool: Shared browser pool (see `capture_screenshot`)
+        readiness: Page readiness strategy ("fixed", "adaptive" or "none")
+        routing: Request-blocking policy (see `capture_screenshot`)
+        har_mode: HAR record/replay mode (see `capture_screenshot`)
+        on_ready: Ready hook (see `capture_screenshot`); nothing is yielded if it
+                  returns False
+
+    Yields:
+        (segment_index, png_bytes) tuples, starting at index 1
+    """
+    scale = CONTEXT_OPTIONS['device_scale_factor']
+    async with _open_page(pool) as page:
+        await _prepare_page(page, url, readiness, routing, har_mode)
+        if on_ready is not None and not await on_ready(page):
+            return
+        size = await page.evaluate(
+            "({w: document.documentElement.scrollWidth, h: document.documentElement.scrollHeight})"
         )
-        page = await context.new_page()
-        
-        page.on("dialog", lambda dialog: asyncio.create_task(dialog.dismiss()))
-        await page.goto(url, wait_until="networkidle")
-        await page.wait_for_timeout(2000)
-        await auto_scroll(page)
-        await page.wait_for_timeout(2000)
-        
-        screenshot_bytes = await page.screenshot(full_page=True, timeout=60000)
-        await browser.close()
-        return screenshot_bytes
\ No newline at end of file
+        height = int(size['h'] * scale)
+
+        y = 0
+        segment_index = 1
+        while y < height:
+            bottom = min(y + segment_height, height)
+            clip = {'x': 0, 'y': y / scale, 'width': size['w'], 'height': (bottom - y) / scale}
+            yield segment_index, await page.screenshot(clip=clip, full_page=True, timeout=60000)
+
+            if bottom == height:
+                break
+
+            y = y + segment_height - overlap
+            segment_index += 1
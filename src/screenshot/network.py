@@ -0,0 +1,94 @@
+import hashlib
+import logging
+import os
+import re
+from typing import Iterable
+from urllib.parse import urlparse
+from playwright.async_api import Page, Route
+from ..config.setting import BLOCKED_RESOURCE_TYPES, BLOCKED_DOMAINS, HAR_DIR
+
+logger = logging.getLogger('website_critic.network')
+
+HAR_MODES = ("record", "replay", "auto")
+
+
+class RoutingPolicy:
+    """
+    Decides which requests a capture is allowed to make.
+
+    Requests are aborted when their Playwright resource type (e.g. "media",
+    "font") is blocked, or when their host is a blocked domain or a subdomain
+    of one. Everything else falls through to the next route handler (a HAR
+    replay, if one is attached) or to the network.
+    """
+
+    def __init__(self, blocked_resource_types: Iterable[str] = (), blocked_domains: Iterable[str] = ()):
+        self.blocked_resource_types = frozenset(blocked_resource_types)
+        self.blocked_domains = frozenset(d.lower().lstrip(".") for d in blocked_domains)
+        self.blocked_count = 0
+
+    @classmethod
+    def from_settings(cls) -> "RoutingPolicy":
+        return cls(BLOCKED_RESOURCE_TYPES, BLOCKED_DOMAINS)
+
+    def should_block(self, resource_type: str, url: str) -> bool:
+        if resource_type in self.blocked_resource_types:
+            return True
+        host = (urlparse(url).hostname or "").lower()
+        return any(host == domain or host.endswith("." + domain) for domain in self.blocked_domains)
+
+    async def apply(self, page: Page) -> None:
+        """Installs the policy on `page`. Page routes run before context-level HAR routes."""
+        if self.blocked_resource_types or self.blocked_domains:
+            await page.route("**/*", self._handle)
+
+    async def _handle(self, route: Route) -> None:
+        request = route.request
+        if self.should_block(request.resource_type, request.url):
+            self.blocked_count += 1
+            await route.abort("blockedbyclient")
+        else:
+            await route.fallback()
+
+
+def har_path(url: str, har_dir: str = HAR_DIR) -> str:
+    """Returns the HAR archive path used to record/replay `url`."""
+    parsed = urlparse(url)
+    slug = re.sub(r"[^A-Za-z0-9.-]+", "_", f"{parsed.netloc}{parsed.path}").strip("_")[:80]
+    digest = hashlib.sha1(url.encode("utf-8")).hexdigest()[:10]
+    return os.path.join(har_dir, f"{slug}_{digest}.har")
+
+
+async def attach_har(page: Page, url: str, mode: str, har_dir: str = HAR_DIR) -> str:
+    """
+    Records the page's traffic to, or replays it from, a per-URL HAR archive.
+
+    Args:
+        page: Page whose browser context should record or replay
+        url: URL being captured (selects the archive)
+        mode: "record" saves live traffic, "replay" serves only from the archive
+              and aborts anything missing, "auto" replays if an archive exists
+              and records otherwise
+        har_dir: Directory holding the archives
+
+    Returns:
+        Path of the archive used
+    """
+    if mode not in HAR_MODES:
+        raise ValueError(f"Unknown HAR mode '{mode}', expected one of {HAR_MODES}")
+
+    path = har_path(url, har_dir)
+    if mode == "auto":
+        mode = "replay" if os.path.exists(path) else "record"
+
+    if mode == "record":
+        os.makedirs(har_dir, exist_ok=True)
+        # The archive is written when the browser context closes
+        await page.context.route_from_har(path, update=True, update_content="embed")
+        logger.debug(f"Recording HAR for {url} to {path}")
+    else:
+        if not os.path.exists(path):
+            raise FileNotFoundError(f"No HAR archive recorded for {url} (expected {path})")
+        await page.context.route_from_har(path, not_found="abort")
+        logger.debug(f"Replaying {url} from {path}")
+    return path
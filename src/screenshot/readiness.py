@@ -0,0 +1,162 @@
+import asyncio
+import logging
+import time
+from playwright.async_api import Page
+from ..config.setting import (
+    READINESS_STRATEGY,
+    READINESS_QUIET_MS,
+    READINESS_STEP_TIMEOUT_MS,
+    READINESS_DEADLINE_MS,
+)
+
+logger = logging.getLogger('website_critic.readiness')
+
+READINESS_STRATEGIES = ("fixed", "adaptive", "none")
+
+# Records the time of the most recent DOM mutation so quietness can be measured in-page.
+MUTATION_TRACKER_SCRIPT = """
+    window.__wcLastMutation = Date.now();
+    new MutationObserver(() => { window.__wcLastMutation = Date.now(); })
+        .observe(document, {subtree: true, childList: true, attributes: true, characterData: true});
+"""
+
+POLL_INTERVAL = 0.05
+
+
+async def auto_scroll(page):
+    """Scrolls down the page gradually to trigger lazy-loading."""
+    await page.evaluate("""
+        async () => {
+            await new Promise((resolve) => {
+                let totalHeight = 0;
+                const distance = 100;
+                const timer = setInterval(() => {
+                    window.scrollBy(0, distance);
+                    totalHeight += distance;
+                    if (totalHeight >= document.body.scrollHeight) {
+                        clearInterval(timer);
+                        resolve();
+                    }
+                }, 100);
+            });
+        }
+    """)
+
+
+class NetworkActivity:
+    """Counts in-flight requests on a page and remembers when traffic last changed."""
+
+    def __init__(self, page: Page):
+        self.in_flight = 0
+        self.last_activity = time.monotonic()
+        page.on("request", self._on_start)
+        page.on("requestfinished", self._on_end)
+        page.on("requestfailed", self._on_end)
+
+    def _on_start(self, request) -> None:
+        self.in_flight += 1
+        self.last_activity = time.monotonic()
+
+    def _on_end(self, request) -> None:
+        self.in_flight = max(0, self.in_flight - 1)
+        self.last_activity = time.monotonic()
+
+    def idle_ms(self) -> float:
+        """Milliseconds since the network went quiet, or 0 while requests are pending."""
+        if self.in_flight:
+            return 0.0
+        return (time.monotonic() - self.last_activity) * 1000
+
+
+async def wait_for_quiet(page: Page, network: NetworkActivity, quiet_ms: int, timeout_ms: float) -> bool:
+    """
+    Waits until both the network and the DOM have been quiet for `quiet_ms`.
+
+    Returns:
+        True if the page settled, False if `timeout_ms` elapsed first
+    """
+    give_up = time.monotonic() + timeout_ms / 1000
+    while True:
+        if network.idle_ms() >= quiet_ms:
+            dom_idle = await page.evaluate("Date.now() - (window.__wcLastMutation || 0)")
+            if dom_idle >= quiet_ms:
+                return True
+        if time.monotonic() >= give_up:
+            return False
+        await asyncio.sleep(POLL_INTERVAL)
+
+
+async def adaptive_scroll(
+    page: Page,
+    network: NetworkActivity,
+    quiet_ms: int = READINESS_QUIET_MS,
+    step_timeout_ms: int = READINESS_STEP_TIMEOUT_MS,
+    deadline_ms: int = READINESS_DEADLINE_MS,
+) -> int:
+    """
+    Scrolls one viewport at a time, waiting for the page to settle after each step.
+
+    Stops once the bottom is reached and the document stops growing, or when the
+    overall deadline expires. Scrolls back to the top before returning.
+
+    Returns:
+        Number of scroll steps taken
+    """
+    deadline = time.monotonic() + deadline_ms / 1000
+
+    def remaining_ms() -> float:
+        return max(0.0, (deadline - time.monotonic()) * 1000)
+
+    await wait_for_quiet(page, network, quiet_ms, min(step_timeout_ms, remaining_ms()))
+
+    steps = 0
+    while remaining_ms() > 0:
+        metrics = await page.evaluate(
+            "({y: window.scrollY, vh: window.innerHeight, h: document.documentElement.scrollHeight})"
+        )
+        if metrics["y"] + metrics["vh"] >= metrics["h"]:
+            # At the bottom: done unless the last settle grew the document
+            await wait_for_quiet(page, network, quiet_ms, min(step_timeout_ms, remaining_ms()))
+            height = await page.evaluate("document.documentElement.scrollHeight")
+            if height <= metrics["h"]:
+                break
+            continue
+
+        await page.evaluate("window.scrollBy(0, window.innerHeight)")
+        steps += 1
+        await wait_for_quiet(page, network, quiet_ms, min(step_timeout_ms, remaining_ms()))
+    else:
+        logger.warning(f"Readiness deadline of {deadline_ms} ms reached after {steps} scroll steps")
+
+    await page.evaluate("window.scrollTo(0, 0)")
+    await wait_for_quiet(page, network, quiet_ms, min(step_timeout_ms, max(remaining_ms(), quiet_ms)))
+    return steps
+
+
+async def load_page(page: Page, url: str, strategy: str = READINESS_STRATEGY) -> None:
+    """
+    Navigates to `url` and waits until the page is ready to be captured.
+
+    Args:
+        page: Playwright page
+        url: Page to open
+        strategy: "fixed" (legacy sleeps plus 100 px scroll timer), "adaptive"
+                  (viewport scrolling with network/DOM quiet detection) or
+                  "none" (capture as soon as the load event fires)
+    """
+    if strategy not in READINESS_STRATEGIES:
+        raise ValueError(f"Unknown readiness strategy '{strategy}', expected one of {READINESS_STRATEGIES}")
+
+    if strategy == "fixed":
+        await page.goto(url, wait_until="networkidle")
+        await page.wait_for_timeout(2000)
+        await auto_scroll(page)
+        await page.wait_for_timeout(2000)
+    elif strategy == "adaptive":
+        network = NetworkActivity(page)
+        await page.add_init_script(MUTATION_TRACKER_SCRIPT)
+        await page.goto(url, wait_until="load")
+        steps = await adaptive_scroll(page, network)
+        logger.debug(f"Page settled after {steps} scroll steps: {url}")
+    else:
+        await page.goto(url, wait_until="load")
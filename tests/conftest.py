@@ -0,0 +1,181 @@
+import asyncio
+import functools
+import hashlib
+import json
+import re
+import threading
+import time
+from contextlib import contextmanager
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from types import SimpleNamespace
+
+import numpy as np
+import pytest
+import requests
+from google.genai import errors
+from langchain_core.embeddings import Embeddings
+
+FIXTURES = Path(__file__).parent / "fixtures"
+
+
+def rate_limit_error() -> errors.ClientError:
+    response = requests.Response()
+    response.status_code = 429
+    response._content = json.dumps({"error": {"code": 429, "message": "Quota exceeded", "status": "RESOURCE_EXHAUSTED"}}).encode()
+    return errors.ClientError(429, response)
+
+
+class FakeModels:
+    """
+    Stands in for `client.aio.models`: answers after `latency` seconds, failing
+    the first `rate_limited` calls, and every call for `failing_segments`,
+    with 429. JSON (batched) requests get one
+    entry per segment label, or unparsable text with `malformed_batches`.
+    """
+
+    def __init__(self, latency=0.0, rate_limited=0, malformed_batches=False, failing_segments=()):
+        self.latency = latency
+        self.rate_limited = rate_limited
+        self.failing_segments = set(failing_segments)
+        self.malformed_batches = malformed_batches
+        self.calls = []
+        self.in_flight = 0
+        self.max_in_flight = 0
+
+    async def generate_content(self, model, contents, config=None):
+        prompt = contents[0]
+        self.calls.append(prompt)
+        self.in_flight += 1
+        self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        try:
+            segment = int(re.search(r"Segment (\d+)", prompt).group(1))
+            latency = self.latency(segment) if callable(self.latency) else self.latency
+            await asyncio.sleep(latency)
+            if self.rate_limited > 0 or segment in self.failing_segments:
+                self.rate_limited = max(0, self.rate_limited - 1)
+                raise rate_limit_error()
+            if config is not None and config.response_mime_type == "application/json":
+                if self.malformed_batches:
+                    return SimpleNamespace(text="Sorry, here are the analyses: ...")
+                labels = [part for part in contents[1:] if isinstance(part, str)]
+                answer = {
+                    label: {"analysis": f"Analysis of segment {label.split()[-1]}", "critique": "Fine"}
+                    for label in labels
+                }
+                return SimpleNamespace(text=json.dumps(answer))
+            return SimpleNamespace(text=f"Analysis of segment {segment}")
+        finally:
+            self.in_flight -= 1
+
+
+class FakeGenaiClient:
+    def __init__(self, **kwargs):
+        self.models = FakeModels(**kwargs)
+        self.aio = SimpleNamespace(models=self.models)
+
+
+@pytest.fixture
+def fake_genai():
+    """Factory for fake Gemini clients: fake_genai(latency=..., rate_limited=...)."""
+    return FakeGenaiClient
+
+
+class FakeEmbeddings(Embeddings):
+    """
+    Deterministic local embedder: each text maps to a fixed unit vector.
+    Records every text it embeds and the most batches it embedded at once.
+    """
+
+    def __init__(self, dimension=16, latency=0.0):
+        self.dimension = dimension
+        self.latency = latency
+        self.embedded = []
+        self.calls = 0
+        self.in_flight = 0
+        self.max_in_flight = 0
+        self._lock = threading.Lock()
+
+    def _vector(self, text):
+        seed = int.from_bytes(hashlib.sha256(text.encode("utf-8")).digest()[:8], "little")
+        vector = np.random.default_rng(seed).normal(size=self.dimension)
+        return (vector / np.linalg.norm(vector)).tolist()
+
+    def embed_documents(self, texts):
+        with self._lock:
+            self.calls += 1
+            self.embedded.extend(texts)
+            self.in_flight += 1
+            self.max_in_flight = max(self.max_in_flight, self.in_flight)
+        time.sleep(self.latency)
+        with self._lock:
+            self.in_flight -= 1
+        return [self._vector(text) for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+
+@pytest.fixture
+def fake_embeddings():
+    return FakeEmbeddings()
+
+
+class FakeEncoding:
+    """Offline stand-in for a tiktoken encoding: every word with its trailing whitespace is one token."""
+
+    def __init__(self):
+        self.vocab = {}
+        self.pieces = []
+
+    def _id(self, piece):
+        if piece not in self.vocab:
+            self.vocab[piece] = len(self.pieces)
+            self.pieces.append(piece)
+        return self.vocab[piece]
+
+    def encode_ordinary_batch(self, texts, num_threads=8):
+        return [[self._id(piece) for piece in re.findall(r"\s+|\S+\s*", text)] for text in texts]
+
+    def decode_with_offsets(self, tokens):
+        offsets, text = [], ""
+        for token in tokens:
+            offsets.append(len(text))
+            text += self.pieces[token]
+        return text, offsets
+
+
+@pytest.fixture
+def fake_encoding():
+    return FakeEncoding()
+
+
+class QuietHandler(SimpleHTTPRequestHandler):
+    def log_message(self, format, *args):
+        pass
+
+
+@contextmanager
+def serve_fixtures():
+    """Serves tests/fixtures on a free local port and yields its base URL; the server stops on exit."""
+    handler = functools.partial(QuietHandler, directory=str(FIXTURES))
+    server = ThreadingHTTPServer(("127.0.0.1", 0), handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    try:
+        yield f"http://127.0.0.1:{server.server_address[1]}"
+    finally:
+        server.shutdown()
+        server.server_close()
+
+
+@pytest.fixture
+def fixture_server_factory():
+    """Context manager serving tests/fixtures, for tests that stop the server part way through."""
+    return serve_fixtures
+
+
+@pytest.fixture(scope="module")
+def fixture_server():
+    """Base URL of tests/fixtures served over HTTP for the whole module."""
+    with serve_fixtures() as url:
+        yield url
@@ -0,0 +1,106 @@
+import logging
+import numpy as np
+import pytest
+from PIL import Image
+from src.image_processing.bands import BandSource, iter_png_bands, iter_strips
+from src.image_processing.segmentation import segment_image
+
+
+def _page(mode, size=(97, 1300), seed=0):
+    """Noisy gradients so the PNG encoder uses every filter type."""
+    rng = np.random.default_rng(seed)
+    width, height = size
+    ramp = np.add.outer(np.arange(height), np.arange(width)) % 256
+    pixels = np.stack([ramp, ramp[::-1], rng.integers(0, 256, (height, width))], axis=-1).astype(np.uint8)
+    pixels[200:400] = 255  # Flat rows
+    img = Image.fromarray(pixels, "RGB")
+    if mode == "P":
+        return img.quantize(64)
+    return img.convert(mode)
+
+
+@pytest.mark.parametrize("mode", ["RGB", "RGBA", "L", "LA", "P"])
+def test_png_bands_match_full_decode(tmp_path, mode):
+    path = tmp_path / "page.png"
+    original = _page(mode)
+    original.save(path)
+
+    bands = list(iter_png_bands(str(path), band_height=128))
+
+    assert [top for top, _ in bands] == list(range(0, 1300, 128))
+    stacked = np.concatenate([np.asarray(band) for _, band in bands])
+    assert np.array_equal(stacked, np.asarray(original))
+
+
+def test_strips_match_crops(tmp_path):
+    path = tmp_path / "page.png"
+    original = _page("RGB")
+    original.save(path)
+    cuts = [(0, 500), (450, 950), (900, 1300)]
+    seen_rows = []
+
+    strips = list(iter_strips(BandSource(str(path), band_height=100), cuts, on_band=lambda band: seen_rows.append(band.height)))
+
+    assert [index for index, *_ in strips] == [1, 2, 3]
+    for _, top, bottom, strip in strips:
+        assert np.array_equal(np.asarray(strip), np.asarray(original.crop((0, top, original.width, bottom))))
+    assert sum(seen_rows) == 1300
+
+
+def test_strips_rejected_by_keep_are_not_built(tmp_path):
+    path = tmp_path / "page.png"
+    _page("RGB").save(path)
+
+    strips = iter_strips(BandSource(str(path), band_height=100), [(0, 500), (500, 1000)], keep=lambda top, bottom: top > 0)
+
+    assert [index for index, *_ in strips] == [2]
+
+
+def test_oversize_screenshot_is_downsampled(tmp_path, caplog):
+    path = tmp_path / "page.png"
+    _page("RGB", size=(100, 1000)).save(path)
+
+    with caplog.at_level(logging.WARNING, logger="website_critic.segmentation"):
+        source = BandSource(str(path), band_height=64, max_pixels=30_000)
+    bands = list(source)
+
+    assert source.scale == 2 and (source.width, source.height) == (50, 500)
+    assert sum(band.height for _, band in bands) == 500
+    assert "downsampling" in caplog.text
+
+
+def test_oversize_screenshot_is_truncated(tmp_path, caplog):
+    path = tmp_path / "page.png"
+    _page("RGB", size=(100, 1000)).save(path)
+
+    with caplog.at_level(logging.WARNING, logger="website_critic.segmentation"):
+        source = BandSource(str(path), band_height=64, max_pixels=30_000, oversize="truncate")
+    bands = list(source)
+
+    assert source.height == 300
+    assert sum(band.height for _, band in bands) == 300
+    assert "truncating" in caplog.text
+
+
+def test_non_png_falls_back_to_full_decode(tmp_path):
+    path = tmp_path / "page.bmp"
+    original = _page("RGB", size=(60, 700))
+    original.save(path)
+
+    source = BandSource(str(path), band_height=256)
+
+    assert not source.streamable
+    stacked = np.concatenate([np.asarray(band) for _, band in source])
+    assert np.array_equal(stacked, np.asarray(original))
+
+
+def test_segment_image_output_unchanged_by_banding(tmp_path):
+    path = tmp_path / "page.png"
+    original = _page("RGB")
+    original.save(path)
+
+    segments = segment_image(str(path), segment_height=500, overlap=50, output_folder=str(tmp_path / "out"))
+
+    assert len(segments) == 3
+    with Image.open(segments[1]) as second:
+        assert np.array_equal(np.asarray(second), np.asarray(original.crop((0, 450, original.width, 950))))
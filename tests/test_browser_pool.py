@@ -0,0 +1,117 @@
+import pytest
+import asyncio
+from pathlib import Path
+from src.screenshot import browser_pool
+from src.screenshot.browser_pool import BrowserPool
+from src.screenshot.capture import capture_screenshot
+
+FIXTURE_URL = (Path(__file__).parent / "fixtures" / "static_page.html").as_uri()
+
+
+class FakePage:
+    pass
+
+
+class FakeContext:
+    def __init__(self, browser):
+        self.browser = browser
+
+    async def new_page(self):
+        return FakePage()
+
+    async def close(self):
+        self.browser.open_contexts -= 1
+
+
+class FakeBrowser:
+    def __init__(self):
+        self.connected = True
+        self.closed = False
+        self.open_contexts = 0
+
+    def is_connected(self):
+        return self.connected
+
+    async def new_context(self, **options):
+        self.open_contexts += 1
+        return FakeContext(self)
+
+    async def close(self):
+        self.closed = True
+        self.connected = False
+
+
+class FakePlaywright:
+    def __init__(self):
+        self.launched = []
+        self.stopped = False
+        self.chromium = self
+
+    async def launch(self, **options):
+        browser = FakeBrowser()
+        self.launched.append(browser)
+        return browser
+
+    async def start(self):
+        return self
+
+    async def stop(self):
+        self.stopped = True
+
+
+@pytest.fixture
+def fake_playwright(monkeypatch):
+    fake = FakePlaywright()
+    monkeypatch.setattr(browser_pool, "async_playwright", lambda: fake)
+    return fake
+
+
+@pytest.mark.asyncio
+async def test_pool_recycles_after_max_pages(fake_playwright):
+    async with BrowserPool(size=1, max_pages_per_browser=2) as pool:
+        for _ in range(5):
+            async with pool.page():
+                pass
+    # 5 pages at 2 pages per browser -> 3 browsers
+    assert len(fake_playwright.launched) == 3
+    assert all(b.closed for b in fake_playwright.launched)
+    assert fake_playwright.stopped
+
+
+@pytest.mark.asyncio
+async def test_pool_replaces_crashed_browser(fake_playwright):
+    async with BrowserPool(size=1) as pool:
+        fake_playwright.launched[0].connected = False
+        async with pool.page():
+            pass
+    assert len(fake_playwright.launched) == 2
+
+
+@pytest.mark.asyncio
+async def test_pool_limits_concurrent_pages(fake_playwright):
+    active = 0
+    peak = 0
+
+    async def use_page(pool):
+        nonlocal active, peak
+        async with pool.page():
+            active += 1
+            peak = max(peak, active)
+            await asyncio.sleep(0.01)
+            active -= 1
+
+    async with BrowserPool(size=2, max_concurrent_pages=3) as pool:
+        await asyncio.gather(*(use_page(pool) for _ in range(10)))
+    assert peak == 3
+    assert all(b.open_contexts == 0 for b in fake_playwright.launched)
+
+
+@pytest.mark.asyncio
+async def test_capture_screenshot_with_pool():
+    async with BrowserPool(size=1) as pool:
+        screenshots = await asyncio.gather(
+            capture_screenshot(FIXTURE_URL, pool=pool),
+            capture_screenshot(FIXTURE_URL, pool=pool),
+        )
+        assert pool.browsers_launched == 1
+    assert all(isinstance(s, bytes) and len(s) > 0 for s in screenshots)
@@ -1,6 +1,6 @@
 import pytest
 import asyncio
-from src.screenshot.capture import capture_screenshot, auto_scroll
+from src.screenshot.capture import capture_screenshot, capture_segments, auto_scroll
 
 @pytest.mark.asyncio
 async def test_capture_screenshot():
@@ -18,4 +18,16 @@ async def test_auto_scroll():
         await page.goto("https://example.com")
         await auto_scroll(page)
         height = await page.evaluate("document.body.scrollHeight")
-        assert height > 0
\ No newline at end of file
+        assert height > 0
+
+@pytest.mark.asyncio
+async def test_capture_segments():
+    from pathlib import Path
+    from PIL import Image
+    import io
+    url = (Path(__file__).parent / "fixtures" / "static_page.html").as_uri()
+    tiles = [tile async for tile in capture_segments(url, segment_height=1000, overlap=50)]
+    assert [index for index, _ in tiles] == list(range(1, len(tiles) + 1))
+    assert len(tiles) > 1
+    for _, png_bytes in tiles:
+        assert Image.open(io.BytesIO(png_bytes)).height <= 1000
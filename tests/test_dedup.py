@@ -0,0 +1,111 @@
+import os
+import pytest
+import random
+from PIL import Image, ImageDraw
+from src.image_processing.dedup import PerceptualHashIndex, dhash, hamming, same_content
+
+
+def _banner(text_blocks, seed=0, size=(800, 300)):
+    img = Image.new('RGB', size, color='white')
+    draw = ImageDraw.Draw(img)
+    for x, y, w, h in text_blocks:
+        draw.rectangle((x, y, x + w, y + h), fill=(20, 40, 90))
+    # JPEG-like noise that should not change the hash much
+    rng = random.Random(seed)
+    for _ in range(200):
+        img.putpixel((rng.randrange(size[0]), rng.randrange(size[1])), (rng.randrange(256),) * 3)
+    return img
+
+
+HEADER = [(20, 20, 200, 40), (500, 30, 120, 30), (20, 150, 760, 10)]
+FOOTER = [(300, 100, 200, 150), (20, 260, 100, 20)]
+
+
+def test_dhash_tolerates_noise():
+    assert hamming(dhash(_banner(HEADER, seed=1)), dhash(_banner(HEADER, seed=2))) <= 8
+    assert hamming(dhash(_banner(HEADER)), dhash(_banner(FOOTER))) > 8
+
+
+def test_index_marks_duplicates_and_reuses_analysis(tmp_path):
+    paths = {}
+    for name, blocks, seed in [("a", HEADER, 1), ("b", HEADER, 2), ("c", FOOTER, 3)]:
+        paths[name] = str(tmp_path / f"{name}.png")
+        _banner(blocks, seed).save(paths[name])
+
+    index = PerceptualHashIndex(str(tmp_path / "index.json"))
+    assert index.add(paths["a"]) is None
+    assert index.add(paths["b"]) == paths["a"]
+    assert index.add(paths["c"]) is None
+
+    assert index.analysis_for(paths["b"]) is None
+    index.record_analysis(paths["a"], "Header analysis")
+    assert index.analysis_for(paths["b"]) == "Header analysis"
+    assert index.analysis_for(paths["c"]) is None
+
+
+def test_index_persists_and_keeps_analysis_for_unchanged_segment(tmp_path):
+    path = str(tmp_path / "segment_1.png")
+    _banner(HEADER, seed=1).save(path)
+    index = PerceptualHashIndex(str(tmp_path / "index.json"))
+    index.add(path)
+    index.record_analysis(path, "Previous run")
+    index.save()
+
+    # Next run: same segment re-captured with the same pixels
+    _banner(HEADER, seed=1).save(path)
+    reloaded = PerceptualHashIndex(str(tmp_path / "index.json"))
+    reloaded.add(path)
+    assert reloaded.analysis_for(path) == "Previous run"
+
+    # Any pixel change at the same path loses the stale analysis
+    _banner(HEADER, seed=5).save(path)
+    reloaded.add(path)
+    assert reloaded.analysis_for(path) is None
+
+
+def _with_text(img, text):
+    img = img.copy()
+    ImageDraw.Draw(img).text((300, 200), text, fill=(0, 0, 0))
+    return img
+
+
+def test_text_only_edit_is_not_a_duplicate(tmp_path):
+    original = _banner(HEADER, seed=1)
+    edited = _with_text(original, "Fees from $499")
+    # The perceptual hash cannot tell them apart, the full-resolution comparison can
+    assert hamming(dhash(original), dhash(edited)) <= 8
+    assert same_content(original, _banner(HEADER, seed=2))
+    assert not same_content(original, edited)
+
+    paths = [str(tmp_path / "a.png"), str(tmp_path / "b.png")]
+    original.save(paths[0])
+    edited.save(paths[1])
+    index = PerceptualHashIndex(str(tmp_path / "index.json"))
+    index.add(paths[0])
+    index.record_analysis(paths[0], "Header analysis")
+    assert index.add(paths[1]) is None
+    assert index.analysis_for(paths[1]) is None
+
+
+def test_changed_canonical_unlinks_duplicates_and_save_drops_missing_files(tmp_path):
+    canonical, duplicate = str(tmp_path / "a.png"), str(tmp_path / "b.png")
+    _banner(HEADER, seed=1).save(canonical)
+    _banner(HEADER, seed=2).save(duplicate)
+    index = PerceptualHashIndex(str(tmp_path / "index.json"))
+    index.add(canonical)
+    index.record_analysis(canonical, "Header analysis")
+    assert index.add(duplicate) == canonical
+
+    _with_text(_banner(HEADER, seed=1), "New headline").save(canonical)
+    index.add(canonical)
+    assert index.duplicate_of(duplicate) is None
+    assert index.analysis_for(duplicate) is None
+
+    os.remove(canonical)
+    index.save()
+    reloaded = PerceptualHashIndex(str(tmp_path / "index.json"))
+    assert len(reloaded) == 1
+    # The remaining segment is canonical again and is found by later near-duplicates
+    other = str(tmp_path / "c.png")
+    _banner(HEADER, seed=3).save(other)
+    assert reloaded.add(other) == duplicate
@@ -0,0 +1,65 @@
+import numpy as np
+from src.analysis.embeddings import CachedEmbeddings
+
+from conftest import FakeEmbeddings
+
+
+def word_count(texts):
+    return [len(text.split()) for text in texts]
+
+
+def service(tmp_path, embedder, **kwargs):
+    return CachedEmbeddings(embedder, model="fake", cache_path=str(tmp_path / "embeddings.sqlite"),
+                            count_tokens=word_count, **kwargs)
+
+
+def test_vectors_match_the_embedder_in_input_order(tmp_path, fake_embeddings):
+    texts = ["alpha", "beta", "alpha", "gamma"]
+    vectors = service(tmp_path, fake_embeddings).embed_documents(texts)
+
+    expected = FakeEmbeddings().embed_documents(texts)
+    assert np.allclose(vectors, expected, atol=1e-6)
+    assert sorted(fake_embeddings.embedded) == ["alpha", "beta", "gamma"]
+
+
+def test_cache_persists_across_instances_and_serves_queries(tmp_path, fake_embeddings):
+    first = service(tmp_path, fake_embeddings)
+    first.embed_documents(["alpha", "beta"])
+    first.close()
+
+    second = service(tmp_path, fake_embeddings)
+    second.embed_documents(["alpha", "beta", "delta"])
+    query = second.embed_query("alpha")
+    second.embed_query("how do I improve the hero section?")
+    second.embed_query("how do I improve the hero section?")
+
+    assert fake_embeddings.embedded == ["alpha", "beta", "delta", "how do I improve the hero section?"]
+    assert np.allclose(query, FakeEmbeddings().embed_query("alpha"), atol=1e-6)
+    assert (second.hits, second.misses) == (4, 2)
+
+
+def test_cache_is_keyed_by_model(tmp_path, fake_embeddings):
+    service(tmp_path, fake_embeddings).embed_documents(["alpha"])
+    CachedEmbeddings(fake_embeddings, model="other", cache_path=str(tmp_path / "embeddings.sqlite"),
+                     count_tokens=word_count).embed_documents(["alpha"])
+
+    assert fake_embeddings.embedded == ["alpha", "alpha"]
+
+
+def test_batches_respect_count_and_token_limits(tmp_path, fake_embeddings):
+    embeddings = service(tmp_path, fake_embeddings, batch_size=3, batch_tokens=6)
+    texts = [f"text {i}" for i in range(5)] + ["one two three four five six seven"]
+
+    assert [len(batch) for batch in embeddings._batches(texts)] == [3, 2, 1]
+    embeddings.embed_documents(texts)
+    assert fake_embeddings.calls == 3
+
+
+def test_batches_run_with_bounded_concurrency(tmp_path):
+    embedder = FakeEmbeddings(latency=0.05)
+    embeddings = service(tmp_path, embedder, batch_size=1, max_concurrency=3)
+
+    embeddings.embed_documents([f"text {i}" for i in range(9)])
+
+    assert embedder.calls == 9
+    assert 1 < embedder.max_in_flight <= 3
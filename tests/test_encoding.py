@@ -0,0 +1,34 @@
+import pytest
+import io
+from PIL import Image
+from src.analysis.encoding import encode_image, encode_segments, encoding_for
+
+
+@pytest.fixture
+def segment_paths(tmp_path):
+    paths = []
+    for i, color in enumerate(['red', 'green', 'blue'], start=1):
+        path = tmp_path / f"segment_{i}.png"
+        Image.new('RGB', (2560, 2000), color=color).save(path)
+        paths.append(str(path))
+    return paths
+
+
+def test_encode_image_limits_long_edge(segment_paths):
+    encoded = encode_image(segment_paths[0], max_edge=1024, format="WEBP", quality=80)
+    img = Image.open(io.BytesIO(encoded.data))
+    assert encoded.mime_type == "image/webp"
+    assert img.format == "WEBP"
+    assert img.size == (1024, 800)
+
+
+def test_encode_image_rejects_unknown_format(segment_paths):
+    with pytest.raises(ValueError):
+        encode_image(segment_paths[0], format="BMP")
+
+
+def test_encode_segments_keeps_order(segment_paths):
+    encoded = encode_segments(segment_paths, "gemini-2.0-flash", max_workers=2)
+    colors = [Image.open(io.BytesIO(e.data)).convert("RGB").getpixel((5, 5)) for e in encoded]
+    assert [max(range(3), key=lambda c: rgb[c]) for rgb in colors] == [0, 1, 2]
+    assert max(Image.open(io.BytesIO(encoded[0].data)).size) <= encoding_for("gemini-2.0-flash")["max_edge"]
@@ -0,0 +1,26 @@
+import numpy as np
+import pytest
+import faiss
+from src.analysis.faiss_index import INDEX_TYPES, build_index, choose_index_type, index_type_of
+
+
+def test_auto_policy_grows_with_corpus():
+    assert choose_index_type(500) == "flat"
+    assert choose_index_type(100_000) == "ivf_flat"
+    assert choose_index_type(2_000_000) == "ivf_pq"
+    assert choose_index_type(10, "hnsw") == "hnsw"
+    with pytest.raises(ValueError):
+        choose_index_type(10, "lsh")
+
+
+@pytest.mark.parametrize("index_type", INDEX_TYPES)
+def test_built_indexes_are_trained_and_find_neighbours(index_type):
+    rng = np.random.default_rng(0)
+    vectors = rng.normal(size=(2000, 64)).astype(np.float32)
+    index = build_index(vectors, index_type)
+    index.add(vectors)
+
+    assert index_type_of(index) == index_type
+    assert index_type_of(faiss.deserialize_index(faiss.serialize_index(index))) == index_type
+    _, found = index.search(vectors[:50], 10)
+    assert np.mean([i in row for i, row in enumerate(found)]) > 0.8
@@ -0,0 +1,35 @@
+import pytest
+from PIL import Image
+from src.fingerprint import FingerprintStore, normalise_text, pixel_fingerprint, segment_fingerprints
+
+
+def test_normalise_text_ignores_whitespace_changes():
+    assert normalise_text("Download\n  Brochure\u200b ") == normalise_text("Download Brochure")
+
+
+def test_pixel_fingerprint_ignores_png_encoding(tmp_path):
+    img = Image.new('RGB', (200, 100), color='white')
+    img.paste((255, 0, 0), (10, 10, 50, 50))
+    img.save(tmp_path / "fast.png", compress_level=1)
+    img.save(tmp_path / "small.png", compress_level=9)
+
+    assert pixel_fingerprint(str(tmp_path / "fast.png")) == pixel_fingerprint(str(tmp_path / "small.png"))
+
+    img.paste((0, 0, 255), (60, 10, 70, 20))
+    img.save(tmp_path / "changed.png")
+    assert pixel_fingerprint(str(tmp_path / "changed.png")) != pixel_fingerprint(str(tmp_path / "fast.png"))
+
+
+def test_fingerprint_store_round_trip(tmp_path):
+    path = str(tmp_path / "fingerprints.json")
+    img_path = tmp_path / "segment_1.png"
+    Image.new('RGB', (10, 10), color='red').save(img_path)
+    segments = segment_fingerprints([str(img_path)])
+
+    store = FingerprintStore(path)
+    assert store.get("https://example.com") == {}
+    store.update("https://example.com", "abc", segments)
+
+    reloaded = FingerprintStore(path)
+    assert reloaded.get("https://example.com")["dom_hash"] == "abc"
+    assert reloaded.get("https://example.com")["segments"] == {"segment_1.png": segments["segment_1.png"]}
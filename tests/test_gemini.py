@@ -1,11 +1,16 @@
 import pytest
 from unittest.mock import patch, MagicMock
-from src.analysis.gemini import analyze_image, process_folder
+import time
+from PIL import Image
+from src.analysis.gemini import AnalysisEngine, analyze_image, process_folder
+from src.image_processing.dedup import PerceptualHashIndex
+
 
 @pytest.fixture
 def mock_gemini_response():
     return "Mock analysis result"
 
+
 def test_analyze_image(tmp_path, mock_gemini_response):
     with patch('google.genai.Client') as mock_client:
         mock_client.return_value.models.generate_content.return_value.text = mock_gemini_response
@@ -16,14 +21,276 @@ def test_analyze_image(tmp_path, mock_gemini_response):
         result = analyze_image(str(test_img))
         assert result == mock_gemini_response
 
-def test_process_folder(tmp_path):
-    with patch('src.analysis.gemini.analyze_image') as mock_analyze:
-        mock_analyze.return_value = "Test analysis"
-        
-        # Create test images
-        (tmp_path / "img1.png").touch()
-        (tmp_path / "img2.png").touch()
-        
-        result = process_folder(str(tmp_path))
-        assert "Test analysis" in result
-        assert mock_analyze.call_count == 2
\ No newline at end of file
+
+@pytest.mark.asyncio
+async def test_process_folder(tmp_path, fake_genai):
+    fake = fake_genai()
+    
+    # Create test images
+    _segments(tmp_path, 2)
+    
+    result = await process_folder(str(tmp_path), engine=AnalysisEngine(fake, batch_size=1))
+    assert "Analysis of segment 1" in result and "Analysis of segment 2" in result
+    assert len(fake.models.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_process_folder_analyses_only_given_segments(tmp_path, fake_genai):
+    import json
+    
+    _segments(tmp_path, 3)
+    segments = [str(tmp_path / f"segment_{i}.png") for i in (1, 2)]
+    fake = fake_genai()
+    await process_folder(str(tmp_path), engine=AnalysisEngine(fake, batch_size=1), segments=segments)
+    
+    records = [json.loads(line) for line in (tmp_path / "results.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [r["segment"] for r in records] == ["segment_1.png", "segment_2.png"]
+    assert len(fake.models.calls) == 2
+
+
+@pytest.mark.asyncio
+async def test_process_folder_uses_given_digests(tmp_path, fake_genai):
+    import json
+    
+    _segments(tmp_path, 2)
+    digests = {str(tmp_path / "segment_1.png"): "digest-from-segmentation"}
+    await process_folder(str(tmp_path), engine=AnalysisEngine(fake_genai(), batch_size=1), digests=digests)
+    
+    records = [json.loads(line) for line in (tmp_path / "results.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert records[0]["image_hash"] == "digest-from-segmentation"
+    assert records[1]["image_hash"] and records[1]["image_hash"] != records[0]["image_hash"]
+
+
+def _segments(folder, count):
+    for i in range(1, count + 1):
+        img = Image.new('RGB', (200, 100), color='white')
+        img.paste((i * 20, 0, 120), (20, 20, 20 + i * 15, 60))
+        img.save(folder / f"segment_{i}.png")
+
+
+@pytest.mark.asyncio
+async def test_process_folder_reuses_duplicate_analysis(tmp_path, fake_genai):
+    fake = fake_genai()
+    index = PerceptualHashIndex(str(tmp_path / "index.json"))
+    for i in (1, 2):
+        path = tmp_path / f"segment_{i}.png"
+        img = Image.new('RGB', (200, 100), color='white')
+        img.paste((0, 0, 120), (20, 20, 120, 60))
+        img.save(path)
+        index.add(str(path))
+    
+    result = await process_folder(str(tmp_path), phash_index=index, engine=AnalysisEngine(fake))
+    
+    assert len(fake.models.calls) == 1
+    assert result.count("Analysis of segment 1") == 2
+    assert f"Duplicate Of: {tmp_path / 'segment_1.png'}" in result
+
+
+@pytest.mark.asyncio
+async def test_process_folder_runs_segments_concurrently_in_order(tmp_path, fake_genai):
+    _segments(tmp_path, 12)
+    # Later segments answer first
+    fake = fake_genai(latency=lambda segment: 0.02 * (13 - segment))
+    
+    start = time.perf_counter()
+    result = await process_folder(str(tmp_path), engine=AnalysisEngine(fake, max_concurrency=4, batch_size=1))
+    elapsed = time.perf_counter() - start
+    
+    positions = [result.index(f"Analysis of segment {i}\n") for i in range(1, 13)]
+    assert positions == sorted(positions)
+    assert fake.models.max_in_flight == 4
+    assert elapsed < sum(0.02 * i for i in range(1, 13))
+
+
+@pytest.mark.asyncio
+async def test_engine_retries_rate_limited_requests(tmp_path, fake_genai):
+    _segments(tmp_path, 3)
+    fake = fake_genai(rate_limited=2)
+    engine = AnalysisEngine(fake, retry_delay=0.01, batch_size=1)
+    
+    result = await process_folder(str(tmp_path), engine=engine)
+    
+    assert len(fake.models.calls) == 5
+    assert "Failed to process" not in result
+    assert all(f"Analysis of segment {i}" in result for i in (1, 2, 3))
+
+
+@pytest.mark.asyncio
+async def test_engine_gives_up_after_max_retries(tmp_path, fake_genai):
+    _segments(tmp_path, 1)
+    fake = fake_genai(rate_limited=10)
+    engine = AnalysisEngine(fake, max_retries=2, retry_delay=0.01, batch_size=1)
+    
+    result = await process_folder(str(tmp_path), engine=engine)
+    
+    assert len(fake.models.calls) == 3
+    assert "Failed to process segment_1.png: 429" in result
+
+
+@pytest.mark.asyncio
+async def test_engine_answers_repeated_segments_from_vision_cache(tmp_path, fake_genai):
+    from src.analysis.vision_cache import VisionCache
+    
+    _segments(tmp_path, 3)
+    cache = VisionCache(str(tmp_path / "cache.sqlite"))
+    first = fake_genai()
+    await process_folder(str(tmp_path), engine=AnalysisEngine(first, cache=cache, batch_size=1))
+    (tmp_path / "analysis_journal.jsonl").unlink()  # Leave only the cache to answer from
+    
+    second = fake_genai()
+    result = await process_folder(str(tmp_path), engine=AnalysisEngine(second, cache=cache, batch_size=1))
+    
+    assert len(first.models.calls) == 3
+    assert second.models.calls == []
+    assert all(f"Analysis of segment {i}" in result for i in (1, 2, 3))
+    assert (cache.hits, cache.misses) == (3, 3)
+
+
+@pytest.mark.asyncio
+async def test_vision_cache_keeps_segment_numbers_apart(tmp_path, fake_genai):
+    from src.analysis.vision_cache import VisionCache
+    
+    for i in (1, 2):
+        Image.new('RGB', (200, 100), color='white').save(tmp_path / f"segment_{i}.png")
+    cache = VisionCache(str(tmp_path / "cache.sqlite"))
+    await process_folder(str(tmp_path), engine=AnalysisEngine(fake_genai(), cache=cache, batch_size=1))
+    (tmp_path / "analysis_journal.jsonl").unlink()
+    
+    # Identical pixels, but each segment's cached answer carries its own label
+    result = await process_folder(str(tmp_path), engine=AnalysisEngine(fake_genai(), cache=cache, batch_size=1))
+    assert "Analysis of segment 1\n" in result and "Analysis of segment 2\n" in result
+    assert cache.hits == 2
+
+
+@pytest.mark.asyncio
+async def test_engine_batches_segments_into_fewer_requests(tmp_path, fake_genai):
+    _segments(tmp_path, 10)
+    fake = fake_genai()
+    engine = AnalysisEngine(fake, batch_size=4)
+    
+    result = await process_folder(str(tmp_path), engine=engine)
+    
+    assert engine.requests_sent == 3
+    positions = [result.index(f"Analysis of segment {i}\n") for i in range(1, 11)]
+    assert positions == sorted(positions)
+    assert result.count("Critique:\nFine") == 10
+
+
+@pytest.mark.asyncio
+async def test_engine_falls_back_to_single_requests_on_unparsable_batch(tmp_path, fake_genai):
+    _segments(tmp_path, 3)
+    fake = fake_genai(malformed_batches=True)
+    engine = AnalysisEngine(fake, batch_size=4)
+    
+    result = await process_folder(str(tmp_path), engine=engine)
+    
+    assert engine.requests_sent == 4
+    assert "Failed to process" not in result
+    assert all(f"Analysis of segment {i}" in result for i in (1, 2, 3))
+
+
+@pytest.mark.asyncio
+async def test_engine_encodes_every_folder_in_one_pool(tmp_path, fake_genai):
+    engine = AnalysisEngine(fake_genai(), batch_size=1, encode_workers=2)
+    pools = []
+    for site in ("a", "b"):
+        (tmp_path / site).mkdir()
+        _segments(tmp_path / site, 2)
+        await process_folder(str(tmp_path / site), engine=engine)
+        pools.append(engine._encode_pool)
+    
+    assert pools[0] is not None and pools[0] is pools[1]
+    engine.close()
+    assert engine._encode_pool is None
+
+
+def test_parse_batch_response():
+    from src.analysis.gemini import parse_batch_response
+    
+    text = '```json\n{"Segment 1": {"analysis": "Hero", "critique": "Clear"}, "Segment 2": {"analysis": "Footer", "critique": "Busy"}}\n```'
+    analyses = parse_batch_response(text, ["Segment 1", "Segment 2"])
+    
+    assert analyses["Segment 1"] == "Segment Analysis:\nHero\n\nCritique:\nClear"
+    assert parse_batch_response(text, ["Segment 1", "Segment 3"]) is None
+    assert parse_batch_response("not json", ["Segment 1"]) is None
+
+
+@pytest.mark.asyncio
+async def test_interrupted_folder_resumes_from_journal(tmp_path, fake_genai):
+    _segments(tmp_path, 4)
+    failing = fake_genai(failing_segments={3, 4})
+    first = await process_folder(str(tmp_path), engine=AnalysisEngine(failing, batch_size=1, max_retries=0))
+    assert first.count("Failed to process") == 2
+    
+    resumed = fake_genai()
+    result = await process_folder(str(tmp_path), engine=AnalysisEngine(resumed, batch_size=1))
+    
+    assert len(resumed.models.calls) == 2
+    assert all("Segment 3" in c or "Segment 4" in c for c in resumed.models.calls)
+    assert "Failed to process" not in result
+    assert all(f"Analysis of segment {i}" in result for i in (1, 2, 3, 4))
+
+
+@pytest.mark.asyncio
+async def test_journal_ignores_changed_segments(tmp_path, fake_genai):
+    _segments(tmp_path, 2)
+    await process_folder(str(tmp_path), engine=AnalysisEngine(fake_genai(), batch_size=1))
+    Image.new('RGB', (200, 100), color='black').save(tmp_path / "segment_2.png")
+    
+    fake = fake_genai()
+    await process_folder(str(tmp_path), engine=AnalysisEngine(fake, batch_size=1))
+    
+    assert len(fake.models.calls) == 1 and "Segment 2" in fake.models.calls[0]
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_pauses_all_workers(tmp_path, fake_genai):
+    _segments(tmp_path, 6)
+    fake = fake_genai(rate_limited=3)
+    engine = AnalysisEngine(fake, batch_size=1, retry_delay=0.001, breaker_threshold=3, breaker_cooldown=0.2)
+    
+    start = time.perf_counter()
+    result = await process_folder(str(tmp_path), engine=engine)
+    
+    assert engine.breaker.times_opened == 1
+    assert time.perf_counter() - start >= 0.2
+    assert "Failed to process" not in result
+
+
+@pytest.mark.asyncio
+async def test_process_folder_writes_records_and_derived_text(tmp_path, fake_genai):
+    import json
+    
+    _segments(tmp_path, 3)
+    fake = fake_genai(failing_segments={2})
+    result = await process_folder(str(tmp_path), engine=AnalysisEngine(fake, batch_size=1, max_retries=0))
+    
+    records = [json.loads(line) for line in (tmp_path / "results.jsonl").read_text(encoding="utf-8").splitlines()]
+    assert [r["segment_id"] for r in records] == [1, 2, 3]
+    assert records[0]["source"] == "gemini" and records[0]["analysis"] == "Analysis of segment 1"
+    assert records[0]["image_hash"] and records[0]["analysis_seconds"] is not None
+    assert records[1]["analysis"] is None and records[1]["error"].startswith("429")
+    assert (tmp_path / "results.txt").read_text(encoding="utf-8") == result
+    assert "Segment ID: 3" in result and "Failed to process segment_2.png" in result
+
+
+@pytest.mark.asyncio
+async def test_records_complete_only_without_failed_segments(tmp_path, fake_genai):
+    from src.analysis.gemini import records_complete
+    
+    assert not records_complete(str(tmp_path))
+    _segments(tmp_path, 2)
+    await process_folder(str(tmp_path), engine=AnalysisEngine(fake_genai(failing_segments={2}), batch_size=1, max_retries=0))
+    assert not records_complete(str(tmp_path))
+    
+    await process_folder(str(tmp_path), engine=AnalysisEngine(fake_genai(), batch_size=1))
+    assert records_complete(str(tmp_path))
+
+
+def test_analysis_sections():
+    from src.analysis.gemini import analysis_sections
+    
+    sections = analysis_sections("Segment Analysis:\nHero with a headline.\n\n**Critique:**\nCTA is weak.")
+    
+    assert sections == {"segment_analysis": "Hero with a headline.", "critique": "CTA is weak."}
+    assert analysis_sections("Free-form answer") == {"segment_analysis": "Free-form answer", "critique": ""}
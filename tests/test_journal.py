@@ -0,0 +1,29 @@
+from src.analysis.journal import AnalysisJournal
+
+
+def test_journal_survives_torn_last_line(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = AnalysisJournal(str(path))
+    journal.append("segment_1.png", "hash-1", "First")
+    journal.append("segment_2.png", "hash-2", "Second")
+    with open(path, "a", encoding="utf-8") as f:
+        f.write('{"segment": "segment_3.png", "image_ha')
+
+    reopened = AnalysisJournal(str(path))
+
+    assert len(reopened) == 2
+    assert reopened.get("segment_2.png", "hash-2") == "Second"
+    assert reopened.get("segment_2.png", "other-hash") is None
+
+
+def test_compact_keeps_latest_entry_of_current_segments(tmp_path):
+    path = tmp_path / "journal.jsonl"
+    journal = AnalysisJournal(str(path))
+    journal.append("segment_1.png", "old", "Old")
+    journal.append("segment_1.png", "new", "New")
+    journal.append("segment_9.png", "gone", "Gone")
+
+    journal.compact(["segment_1.png", "segment_2.png"])
+
+    assert path.read_text(encoding="utf-8").count("\n") == 1
+    assert AnalysisJournal(str(path)).get("segment_1.png", "new") == "New"
@@ -0,0 +1,23 @@
+from src.analysis.lexical import exact_match, match_any, query_terms, reciprocal_rank_fusion
+
+
+def test_query_terms_drop_stopwords_and_duplicates():
+    assert query_terms("Where is the CTA, and is the CTA above the fold?") == ["cta", "above", "fold"]
+
+
+def test_exact_match_needs_specific_terms():
+    assert exact_match("Where is the Download Brochure CTA?") == '"download" AND "brochure" AND "cta"'
+    assert exact_match('Is "apply now" visible?') == '"apply now"'
+    assert exact_match("How does the hero section look?") is None
+    assert exact_match("Critique the FAQ") is None
+    # Capitalised words that are not next to each other are usually names, not labels
+    assert exact_match("How does Acme compare to Globex?") is None
+
+
+def test_match_any_quotes_terms():
+    assert match_any(["cta", "don't"]) == '"cta" OR "don\'t"'
+
+
+def test_reciprocal_rank_fusion_rewards_agreement():
+    fused = reciprocal_rank_fusion([["a", "b", "c"], ["b", "c", "d"]], k=1)
+    assert [item for item, _ in fused] == ["b", "c", "a", "d"]
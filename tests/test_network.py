@@ -0,0 +1,35 @@
+import pytest
+from PIL import Image
+import io
+from src.screenshot.network import RoutingPolicy, har_path
+from src.screenshot.capture import capture_screenshot
+
+
+def test_routing_policy_blocks_types_and_domains():
+    policy = RoutingPolicy(["font", "media"], ["hotjar.com"])
+    assert policy.should_block("font", "https://example.com/a.woff2")
+    assert policy.should_block("script", "https://static.hotjar.com/c/hotjar.js")
+    assert policy.should_block("script", "https://hotjar.com/x.js")
+    assert not policy.should_block("script", "https://nothotjar.com/x.js")
+    assert not policy.should_block("image", "https://example.com/hero.png")
+
+
+def test_har_path_is_stable_per_url(tmp_path):
+    first = har_path("https://www.example.com/course?id=1", str(tmp_path))
+    assert first == har_path("https://www.example.com/course?id=1", str(tmp_path))
+    assert first != har_path("https://www.example.com/course?id=2", str(tmp_path))
+    assert first.endswith(".har")
+
+
+@pytest.mark.asyncio
+async def test_har_record_then_offline_replay(tmp_path, monkeypatch, fixture_server_factory):
+    # HAR_DIR is relative, so archives land in tmp_path
+    monkeypatch.chdir(tmp_path)
+
+    with fixture_server_factory() as base_url:
+        url = f"{base_url}/lazy_images.html"
+        recorded = await capture_screenshot(url, har_mode="record")
+
+    assert (tmp_path / har_path(url)).exists()
+    replayed = await capture_screenshot(url, har_mode="replay")
+    assert Image.open(io.BytesIO(replayed)).size == Image.open(io.BytesIO(recorded)).size
@@ -0,0 +1,90 @@
+import asyncio
+import random
+import pytest
+from src.analysis.parallel_map import map_concurrently
+
+
+@pytest.mark.asyncio
+async def test_results_keep_input_order_within_concurrency_limit():
+    in_flight, peak = 0, 0
+
+    async def work(item):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(random.uniform(0.01, 0.05))
+        in_flight -= 1
+        return item * 2
+
+    progress = []
+    results = await map_concurrently(work, list(range(20)), max_concurrency=4, on_progress=lambda d, t: progress.append((d, t)))
+
+    assert results == [item * 2 for item in range(20)]
+    assert peak == 4
+    assert progress[-1] == (20, 20) and len(progress) == 20
+
+
+@pytest.mark.asyncio
+async def test_failures_are_retried_then_returned():
+    attempts = {}
+
+    async def flaky(item):
+        attempts[item] = attempts.get(item, 0) + 1
+        if item == "broken" or attempts[item] < 2:
+            raise RuntimeError(f"{item} failed")
+        return item
+
+    results = await map_concurrently(flaky, ["a", "broken", "b"], max_retries=2, retry_delay=0.001)
+
+    assert results[0] == "a" and results[2] == "b"
+    assert isinstance(results[1], RuntimeError)
+    assert attempts == {"a": 2, "broken": 3, "b": 2}
+
+
+class RecordingLimiter:
+    def __init__(self):
+        self.acquired = []
+
+    async def acquire(self, tokens=0):
+        self.acquired.append(tokens)
+
+
+@pytest.mark.asyncio
+async def test_every_attempt_is_admitted_by_the_limiter():
+    limiter = RecordingLimiter()
+    failed = set()
+
+    async def work(text):
+        if text == "retry" and text not in failed:
+            failed.add(text)
+            raise RuntimeError("rate limited")
+        return text
+
+    results = await map_concurrently(work, ["ab", "retry"], limiter=limiter, tokens=len, retry_delay=0.001)
+
+    assert results == ["ab", "retry"]
+    assert sorted(limiter.acquired) == [2, 5, 5]
+
+
+@pytest.mark.asyncio
+async def test_rate_limited_calls_do_not_hold_a_slot():
+    class SlowLimiter:
+        async def acquire(self, tokens=0):
+            if tokens:
+                await asyncio.sleep(0.2)
+
+    started = []
+
+    async def work(item):
+        started.append(item)
+        return item
+
+    # "wait" sleeps in the limiter while the cached items use the only slot
+    task = asyncio.ensure_future(map_concurrently(
+        work, ["wait", "cached", "cached too"], max_concurrency=1, limiter=SlowLimiter(),
+        tokens=lambda item: 1 if item == "wait" else None,
+    ))
+    await asyncio.sleep(0.1)
+    assert started == ["cached", "cached too"]
+    assert await task == ["wait", "cached", "cached too"]
+
@@ -0,0 +1,104 @@
+import asyncio
+import pytest
+from src.analysis.rate_limit import CircuitBreaker, RateLimiter, TokenBucket, backoff_delay
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_token_bucket_refills_at_rate():
+    clock = FakeClock()
+    bucket = TokenBucket(60, capacity=2, clock=clock)
+
+    bucket.consume(2)
+    assert bucket.wait_time(1) == pytest.approx(1.0)
+    clock.now = 0.5
+    assert bucket.wait_time(1) == pytest.approx(0.5)
+    clock.now = 10
+    assert bucket.tokens <= 2 and bucket.wait_time(2) == 0
+
+
+@pytest.mark.asyncio
+async def test_rate_limiter_spaces_requests_beyond_burst():
+    limiter = RateLimiter(requests_per_minute=600, tokens_per_minute=10**6)
+    limiter.requests = TokenBucket(600, capacity=1)
+
+    start = asyncio.get_running_loop().time()
+    for _ in range(4):
+        await limiter.acquire(100)
+    elapsed = asyncio.get_running_loop().time() - start
+
+    # One request is available immediately, the next three at 10 per second
+    assert 0.25 < elapsed < 0.6
+
+
+def test_backoff_delay_is_jittered_and_capped():
+    delays = [backoff_delay(attempt, base=1.0, cap=5.0) for attempt in range(8) for _ in range(20)]
+
+    assert all(0 <= delay <= 5.0 for delay in delays)
+    assert len(set(delays)) > 100
+
+
+def test_circuit_breaker_opens_after_consecutive_failures():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=3, cooldown=10, clock=clock)
+
+    breaker.record_failure()
+    breaker.record_failure()
+    breaker.record_success()
+    breaker.record_failure()
+    breaker.record_failure()
+    assert breaker.state == "closed"
+
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 1
+    clock.now = 10
+    assert breaker.state == "half-open"
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_lets_one_probe_through_then_reopens_on_failure():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+
+    await breaker.wait()  # The probe
+    waiter = asyncio.ensure_future(breaker.wait())
+    await asyncio.sleep(0.1)
+    assert not waiter.done()
+
+    breaker.record_failure()
+    assert breaker.state == "open" and breaker.times_opened == 2
+    clock.now = 20
+    await asyncio.wait_for(waiter, 1)  # Next probe
+    breaker.record_success()
+    assert breaker.state == "closed"
+
+
+@pytest.mark.asyncio
+async def test_circuit_breaker_hands_cancelled_probe_to_next_caller():
+    clock = FakeClock()
+    breaker = CircuitBreaker(failure_threshold=1, cooldown=10, clock=clock)
+    breaker.record_failure()
+    clock.now = 10
+    admitted = asyncio.Event()
+
+    async def probe():
+        async with breaker.admit():
+            admitted.set()
+            await asyncio.sleep(10)  # e.g. waiting for the rate limiter
+
+    task = asyncio.ensure_future(probe())
+    await admitted.wait()
+    waiter = asyncio.ensure_future(breaker.wait())
+    await asyncio.sleep(0.1)
+    assert not waiter.done()
+
+    task.cancel()
+    assert await asyncio.wait_for(waiter, 1) is not None  # The next caller becomes the probe
@@ -0,0 +1,40 @@
+import pytest
+import pytest_asyncio
+import time
+from src.screenshot.readiness import load_page
+
+COUNT_LOADED_IMAGES = "Array.from(document.images).filter(img => img.complete && img.naturalWidth > 0).length"
+
+
+@pytest_asyncio.fixture
+async def browser_page():
+    from playwright.async_api import async_playwright
+    async with async_playwright() as p:
+        browser = await p.chromium.launch()
+        page = await browser.new_page(viewport={'width': 1280, 'height': 720})
+        yield page
+        await browser.close()
+
+
+@pytest.mark.asyncio
+async def test_load_page_rejects_unknown_strategy():
+    with pytest.raises(ValueError):
+        await load_page(None, "http://example.com", strategy="eventually")
+
+
+@pytest.mark.asyncio
+async def test_adaptive_loads_lazy_images(fixture_server, browser_page):
+    start = time.monotonic()
+    await load_page(browser_page, f"{fixture_server}/lazy_images.html", strategy="adaptive")
+    elapsed = time.monotonic() - start
+
+    assert await browser_page.evaluate(COUNT_LOADED_IMAGES) == 12
+    assert await browser_page.evaluate("window.scrollY") == 0
+    # The fixed strategy sleeps 4 s and scrolls 100 px per 100 ms (~15 s for this page)
+    assert elapsed < 12
+
+
+@pytest.mark.asyncio
+async def test_none_skips_lazy_content(fixture_server, browser_page):
+    await load_page(browser_page, f"{fixture_server}/lazy_images.html", strategy="none")
+    assert await browser_page.evaluate(COUNT_LOADED_IMAGES) < 12
@@ -0,0 +1,29 @@
+import time
+from src.analysis.report_cache import ReportCache
+
+
+def test_results_are_keyed_by_text_prompt_and_model(tmp_path):
+    cache = ReportCache(str(tmp_path / "report.sqlite"))
+    cache.put("segment text", "critique {text}", "gpt-3.5-turbo", "Critique")
+
+    assert cache.get("segment text", "critique {text}", "gpt-3.5-turbo") == "Critique"
+    assert cache.get("segment text, edited", "critique {text}", "gpt-3.5-turbo") is None
+    assert cache.get("segment text", "critique v2 {text}", "gpt-3.5-turbo") is None
+    assert cache.get("segment text", "critique {text}", "gpt-4o") is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_results_persist_and_stale_ones_are_pruned(tmp_path):
+    path = str(tmp_path / "report.sqlite")
+    cache = ReportCache(path)
+    cache.put("old", "prompt", "model", "Old summary")
+    cache.put("new", "prompt", "model", "New summary")
+    cache._db.execute("UPDATE entries SET created_at = ? WHERE input_hash = ?",
+                      (time.time() - 40 * 86400, ReportCache.key("old", "prompt", "model")[0]))
+    cache._db.commit()
+    cache.close()
+
+    reopened = ReportCache(path)
+    assert reopened.prune(max_age_days=30) == 1
+    assert reopened.get("old", "prompt", "model") is None
+    assert reopened.get("new", "prompt", "model") == "New summary"
@@ -1,7 +1,8 @@
 import pytest
+import io
 from PIL import Image
 import os
-from src.image_processing.segmentation import segment_image
+from src.image_processing.segmentation import segment_image, save_segment_stream, content_cuts, RowStatistics, remove_stale_segments
 
 @pytest.fixture
 def test_image():
@@ -23,4 +24,117 @@ def test_segment_image(tmp_path, test_image):
     )
     
     assert len(segments) > 0
-    assert all(os.path.exists(s) for s in segments)
\ No newline at end of file
+    assert all(os.path.exists(s) for s in segments)
+
+def _png_bytes(img):
+    buffer = io.BytesIO()
+    img.save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+@pytest.mark.asyncio
+async def test_save_segment_stream(tmp_path):
+    content = Image.new('RGB', (100, 50), color='red')
+    content.paste((255, 255, 255), (10, 10, 90, 40))
+
+    async def tiles():
+        yield 1, _png_bytes(Image.new('RGB', (100, 50), color='white'))
+        yield 2, _png_bytes(content)
+        yield 3, _png_bytes(content.crop((0, 0, 100, 20)))
+
+    segments = await save_segment_stream(tiles(), str(tmp_path))
+
+    assert [os.path.basename(s) for s in segments] == ["segment_2.png", "segment_3.png"]
+    assert Image.open(segments[1]).size == (100, 20)
+
+
+@pytest.mark.asyncio
+async def test_segment_writers_report_pixel_digests(tmp_path, test_image):
+    from src.fingerprint import pixel_fingerprint
+
+    image_path = tmp_path / "test.png"
+    test_image.save(image_path)
+    digests = {}
+    segments = segment_image(str(image_path), 500, 50, str(tmp_path / "full"), digests=digests)
+    assert digests == {path: pixel_fingerprint(path) for path in segments}
+
+    async def tiles():
+        yield 1, _png_bytes(test_image.crop((0, 0, 800, 500)))
+
+    digests = {}
+    segments = await save_segment_stream(tiles(), str(tmp_path / "stream"), digests=digests)
+    assert digests == {segments[0]: pixel_fingerprint(segments[0])}
+
+
+def test_low_information_segments_are_skipped(tmp_path):
+    img = Image.new('RGB', (400, 900), color=(250, 250, 248))  # off-white page
+    img.paste((200, 200, 200), (0, 450, 400, 451))  # thin divider in the middle strip
+    for x in range(20, 380, 8):  # "text" in the last strip
+        img.paste((30, 30, 30), (x, 700, x + 4, 720))
+    image_path = tmp_path / "page.png"
+    img.save(image_path)
+
+    segments = segment_image(str(image_path), segment_height=300, overlap=0, output_folder=str(tmp_path))
+
+    assert [os.path.basename(s) for s in segments] == ["segment_3.png"]
+
+
+def test_row_statistics():
+    img = Image.new('L', (100, 4), color=255)
+    img.paste(0, (0, 1, 50, 2))  # half black row
+    img.paste(0, (0, 3, 100, 4))  # fully black row
+    stats = RowStatistics.from_image(img)
+
+    assert stats.height == 4
+    assert list(stats.row_std > 0) == [False, True, False, False]
+    assert stats.row_entropy[1] == pytest.approx(1.0)
+    assert stats.strip_entropy(0, 4) == pytest.approx(0.954, abs=1e-3)
+    assert stats.active_fraction(0, 4) == 0.25
+
+
+def _card_page(cards, height, width=400):
+    """White page with textured 'cards' at the given (top, bottom) rows."""
+    img = Image.new('L', (width, height), color=255)
+    for top, bottom in cards:
+        for y in range(top, bottom, 6):
+            for x in range(10, width - 10, 12):
+                img.paste(0, (x, y, x + 6, y + 3))
+    return img
+
+
+def test_content_cuts_snap_to_gutters():
+    cards = [(100, 900), (1000, 1900), (2000, 2500)]
+    stats = RowStatistics.from_image(_card_page(cards, 2600))
+
+    cuts = content_cuts(stats, segment_height=1000, overlap=50, tolerance=400, min_height=300)
+
+    assert cuts[0][0] == 0 and cuts[-1][1] == 2600
+    for top, bottom in cuts:
+        assert bottom - top <= 1000 + 400
+    # Every card lies entirely inside one segment
+    for card_top, card_bottom in cards:
+        assert any(top <= card_top and card_bottom <= bottom for top, bottom in cuts)
+
+
+def test_content_cuts_merge_short_leftover():
+    stats = RowStatistics.from_image(_card_page([(0, 900), (1000, 1100)], 1100))
+    cuts = content_cuts(stats, segment_height=1000, overlap=50, tolerance=200, min_height=300)
+    assert cuts == [(0, 1100)]
+
+
+def test_segment_image_content_mode_keeps_naming(tmp_path):
+    image_path = tmp_path / "page.png"
+    _card_page([(100, 900), (1000, 1900), (2000, 2500)], 2600).save(image_path)
+
+    segments = segment_image(str(image_path), 1000, 50, str(tmp_path / "out"), mode="content")
+
+    assert [os.path.basename(s) for s in segments] == ["segment_1.png", "segment_2.png", "segment_3.png"]
+
+
+def test_remove_stale_segments(tmp_path):
+    for name in ("segment_1.png", "segment_2.png", "segment_3.png", "results.jsonl"):
+        (tmp_path / name).write_bytes(b"")
+    kept = [str(tmp_path / "segment_1.png"), str(tmp_path / "segment_2.png")]
+
+    assert remove_stale_segments(str(tmp_path), kept) == [str(tmp_path / "segment_3.png")]
+    assert sorted(os.listdir(tmp_path)) == ["results.jsonl", "segment_1.png", "segment_2.png"]
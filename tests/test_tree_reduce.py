@@ -0,0 +1,113 @@
+import asyncio
+import pytest
+from src.analysis.tree_reduce import pack_groups, tree_reduce
+
+
+def word_counts(texts):
+    return [len(text.split()) for text in texts]
+
+
+def test_pack_groups_respects_budget_with_fan_in_of_two():
+    texts = ["a b", "c d", "e f g", "h", "i j k l m n"]
+    keys = [str(i) for i in range(len(texts))]
+    assert pack_groups(keys, word_counts(texts), budget=5, fan_in=1000) == [[0, 1], [2, 3], [4]]
+    # A text that does not fit next to the previous one starts its own group
+    assert pack_groups(keys, word_counts(texts), budget=3, fan_in=1000) == [[0], [1], [2], [3], [4]]
+    # Every key is a boundary with a fan-in of one
+    assert pack_groups(keys, word_counts(texts), budget=100, fan_in=1) == [[0, 1], [2, 3], [4]]
+
+
+def test_pack_groups_never_exceeds_budget_to_pair_texts():
+    assert pack_groups(["a", "b", "c"], [9000] * 3, budget=10_000) == [[0], [1], [2]]
+
+
+def test_pack_groups_keeps_boundaries_when_one_text_grows():
+    keys = [f"site/{i}" for i in range(200)]
+    counts = [10] * 200
+    before = pack_groups(keys, counts, budget=100, fan_in=4)
+    counts[50] = 60
+    after = pack_groups(keys, counts, budget=100, fan_in=4)
+
+    # Only the groups from the grown text to the next key boundary differ
+    changed = [position for group in after if group not in before for position in group]
+    assert changed and min(changed) <= 50 and max(changed) - min(changed) < 20
+    assert all(sum(counts[position] for position in group) <= 100 for group in after)
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_summarises_levels_in_parallel():
+    calls, in_flight, peak = [], 0, 0
+
+    async def summarize(text, level):
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        calls.append(level)
+        return f"summary{level} " + "word " * 9
+
+    analyses = [f"analysis {i} " + "word " * 8 for i in range(32)]
+    report = await tree_reduce(analyses, summarize, budget=25, fan_in=1000, count_tokens=word_counts, max_concurrency=8)
+
+    # Texts and summaries are 10 words: 16 groups of analyses, then 8, 4, 2 and the final call
+    assert calls.count(0) == 16 and calls.count(1) == 8 and calls[-1] == 4
+    assert report.startswith("summary4")
+    assert peak > 1
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_single_group_is_one_call():
+    levels = []
+
+    async def summarize(text, level):
+        levels.append(level)
+        return text.upper()
+
+    assert await tree_reduce(["a", "b"], summarize, budget=100, count_tokens=word_counts) == "A\n\nB"
+    assert levels == [0]
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_retries_final_call():
+    attempts = 0
+
+    async def summarize(text, level):
+        nonlocal attempts
+        attempts += 1
+        if attempts == 1:
+            raise RuntimeError("transient")
+        return "report"
+
+    assert await tree_reduce(["a", "b"], summarize, budget=100, count_tokens=word_counts, retry_delay=0) == "report"
+    assert attempts == 2
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_rejects_empty_input():
+    async def summarize(text, level):
+        return text
+
+    with pytest.raises(ValueError):
+        await tree_reduce([], summarize, count_tokens=word_counts)
+
+
+def first_words(text, count):
+    return " ".join(text.split()[:count])
+
+
+@pytest.mark.asyncio
+async def test_tree_reduce_calls_fit_budget():
+    inputs = []
+
+    async def summarize(text, level):
+        inputs.append(len(text.split()))
+        # Summaries as long as their input would never converge without truncation
+        return "summary " * 20
+
+    texts = ["word " * 30, "word " * 5, "word " * 19, "word " * 19]
+    report = await tree_reduce(texts, summarize, budget=20, fan_in=1000, count_tokens=word_counts, truncate=first_words)
+
+    assert report.startswith("summary")
+    assert max(inputs) <= 20
+
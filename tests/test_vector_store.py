@@ -1,17 +1,328 @@
 import pytest
 from src.analysis.vector_store import create_vector_store, chunk_text
 
+
 def test_chunk_text():
     text = "This is a test " * 100  # Create long text
     chunks = chunk_text(text, max_tokens=100, overlap=20)
     assert len(chunks) > 1
     assert all(isinstance(chunk, str) for chunk in chunks)
 
+
 def test_create_vector_store(tmp_path):
-    chunks = ["Test chunk 1", "Test chunk 2"]
-    store = create_vector_store(chunks, str(tmp_path / "test_vectors"))
+    from langchain.docstore.document import Document
+    from src.analysis.embeddings import CachedEmbeddings
+    
+    chunks = [Document(page_content="Test chunk 1"), Document(page_content="Test chunk 2")]
+    embeddings = CachedEmbeddings(cache_path=str(tmp_path / "embedding_cache.sqlite"))
+    store = create_vector_store(chunks, str(tmp_path / "test_vectors"), embeddings)
     assert store is not None
     
     # Test similarity search
     results = store.similarity_search("test", k=1)
-    assert len(results) == 1
\ No newline at end of file
+    assert len(results) == 1
+
+
+def test_get_all_analyses_loads_records(tmp_path):
+    import json
+    from src.analysis.vector_store import get_all_analyses
+    
+    site = tmp_path / "target_websites" / "example.com"
+    site.mkdir(parents=True)
+    analysis = "Segment Analysis:\nSegment 2 of the page\n\nCritique:\nSegment ID: fine"
+    records = [
+        {"segment": "segment_1.png", "segment_id": 1, "image_hash": "a", "processed_at": "t", "duplicate_of": None,
+         "analysis": None, "error": "429 RESOURCE_EXHAUSTED"},
+        {"segment": "segment_2.png", "segment_id": 2, "image_hash": "b", "processed_at": "t", "duplicate_of": None,
+         "analysis": analysis, "error": None},
+    ]
+    (site / "results.jsonl").write_text("".join(json.dumps(r) + "\n" for r in records), encoding="utf-8")
+    
+    documents = get_all_analyses({"target": str(tmp_path / "target_websites")})
+    
+    assert len(documents) == 1
+    assert documents[0].page_content == analysis
+    assert documents[0].metadata["segment_index"] == 2
+    assert documents[0].metadata["website"] == "example.com"
+
+
+def _document(website, segment_id, text):
+    from langchain.docstore.document import Document
+    return Document(page_content=text, metadata={
+        "website": website, "category": "target", "segment": f"segment_{segment_id}.png", "segment_index": segment_id,
+    })
+
+
+def test_update_vector_store_embeds_only_changes(tmp_path, fake_embeddings):
+    from src.analysis.vector_store import update_vector_store
+    
+    persist_dir = str(tmp_path / "store")
+    documents = [_document("a.com", i, f"Analysis {i}") for i in range(1, 5)]
+    store, update = update_vector_store(documents, persist_dir, fake_embeddings)
+    assert (update.added, update.removed, update.unchanged) == (4, 0, 0)
+    
+    # Segment 2 changed, segment 4 disappeared
+    fake_embeddings.embedded.clear()
+    documents = [documents[0], _document("a.com", 2, "Analysis 2, revised"), documents[2]]
+    store, update = update_vector_store(documents, persist_dir, fake_embeddings)
+    
+    assert fake_embeddings.embedded == ["Analysis 2, revised"]
+    assert (update.added, update.removed, update.unchanged) == (1, 2, 2)
+    assert store.index.ntotal == 3
+    assert store.similarity_search("Analysis 2, revised", k=1)[0].page_content == "Analysis 2, revised"
+
+
+def test_update_vector_store_noop_skips_embedding(tmp_path, fake_embeddings):
+    from src.analysis.vector_store import update_vector_store
+    
+    persist_dir = str(tmp_path / "store")
+    documents = [_document("a.com", 1, "Analysis 1")]
+    update_vector_store(documents, persist_dir, fake_embeddings)
+    calls = fake_embeddings.calls
+    
+    _, update = update_vector_store(documents, persist_dir, fake_embeddings)
+    
+    assert fake_embeddings.calls == calls
+    assert (update.added, update.removed, update.unchanged) == (0, 0, 1)
+
+
+def test_update_vector_store_rebuilds_indexes_without_removal(tmp_path, fake_embeddings):
+    from src.analysis.vector_store import update_vector_store
+    
+    persist_dir = str(tmp_path / "store")
+    documents = [_document("a.com", i, f"Analysis {i}") for i in range(1, 81)]
+    store, _ = update_vector_store(documents, persist_dir, fake_embeddings, index_type="ivf_flat")
+    assert type(store.index).__name__ == "IndexIVFFlat"
+    
+    store, update = update_vector_store(documents[1:], persist_dir, fake_embeddings, index_type="ivf_flat")
+    
+    assert (update.added, update.removed, update.unchanged) == (0, 1, 79)
+    assert store.index.ntotal == 79
+    assert store.similarity_search("Analysis 42", k=1)[0].page_content == "Analysis 42"
+
+
+def test_saved_store_opens_lazily_without_pickle(tmp_path, fake_embeddings):
+    import os
+    from src.analysis.disk_store import PositionMap, load_store
+    from src.analysis.vector_store import update_vector_store
+    
+    persist_dir = str(tmp_path / "store")
+    documents = [_document("a.com", i, f"Analysis {i}") for i in range(1, 81)]
+    update_vector_store(documents, persist_dir, fake_embeddings, index_type="ivf_flat")
+    
+    assert sorted(name for name in os.listdir(persist_dir) if not name.endswith(("-wal", "-shm"))) == [
+        "docstore.sqlite", "index.1.faiss", "index.1.ivfdata"
+    ]
+    store = load_store(persist_dir, fake_embeddings)
+    assert isinstance(store.index_to_docstore_id, PositionMap)
+    hit = store.similarity_search("Analysis 17", k=1)[0]
+    assert hit.page_content == "Analysis 17" and hit.metadata["website"] == "a.com"
+    
+    # A snapshot taken before an update keeps the reader on its own generation
+    with store.docstore.snapshot() as generation:
+        update_vector_store(documents[:40], persist_dir, fake_embeddings, index_type="ivf_flat")
+        assert load_store(persist_dir, fake_embeddings).index.ntotal == 40
+        assert generation == store.docstore.index_generation == 1
+        assert store.index.ntotal == 80 and len(store.index_to_docstore_id) == 80
+        assert store.similarity_search("Analysis 77", k=1)[0].page_content == "Analysis 77"
+    with store.docstore.snapshot() as generation:
+        assert generation == 2  # Later snapshots see the update, so the store is stale
+
+
+def test_open_sharded_store_reopens_updated_shards_without_pinning_the_wal(tmp_path, fake_embeddings):
+    import os
+    import sqlite3
+    from src.analysis.vector_store import ShardedStore, update_sharded_store
+    
+    persist_dir = str(tmp_path / "store")
+    update_sharded_store([_document("a.com", i, f"Analysis {i}") for i in range(1, 6)], persist_dir, fake_embeddings)
+    store = ShardedStore(persist_dir, fake_embeddings)
+    assert store.search("Analysis 5", k=1)[0].page_content == "Analysis 5"
+    
+    update_sharded_store([_document("a.com", i, f"Analysis {i}") for i in range(1, 4)], persist_dir, fake_embeddings)
+    # No read transaction is left open between queries, so the WAL can be checkpointed
+    with sqlite3.connect(os.path.join(persist_dir, "target", "a.com", "docstore.sqlite")) as db:
+        assert db.execute("PRAGMA wal_checkpoint(TRUNCATE)").fetchone()[0] == 0
+    
+    assert {doc.page_content for doc in store.search("Analysis", k=5)} == {f"Analysis {i}" for i in range(1, 4)}
+    assert store.store(("target", "a.com")).docstore.index_generation == 2
+
+
+def test_interrupted_save_keeps_previous_generation(tmp_path, fake_embeddings, monkeypatch):
+    from src.analysis.disk_store import SQLiteDocstore, load_store
+    from src.analysis.vector_store import update_vector_store
+    
+    persist_dir = str(tmp_path / "store")
+    documents = [_document("a.com", i, f"Analysis {i}") for i in range(1, 21)]
+    update_vector_store(documents, persist_dir, fake_embeddings)
+    
+    # Crash after the new index is written, before the docstore commits
+    def crash(self):
+        self._db.close()  # Like a dead process: the open transaction is rolled back
+        raise KeyboardInterrupt
+    monkeypatch.setattr(SQLiteDocstore, "commit", crash)
+    with pytest.raises(KeyboardInterrupt):
+        update_vector_store(documents[:10] + [_document("a.com", 99, "Analysis 99")], persist_dir, fake_embeddings)
+    monkeypatch.undo()
+    
+    store = load_store(persist_dir, fake_embeddings)
+    assert store.index.ntotal == 20
+    assert store.similarity_search("Analysis 15", k=1)[0].page_content == "Analysis 15"
+    _, update = update_vector_store(documents[:10], persist_dir, fake_embeddings)
+    assert update.removed == 10
+
+
+def test_store_saved_before_generations_is_upgraded_once(tmp_path, fake_embeddings):
+    import os
+    import sqlite3
+    from src.analysis.disk_store import load_store
+    from src.analysis.vector_store import update_vector_store
+    
+    persist_dir = str(tmp_path / "store")
+    update_vector_store([_document("a.com", i, f"Analysis {i}") for i in range(1, 6)], persist_dir, fake_embeddings)
+    os.rename(os.path.join(persist_dir, "index.1.faiss"), os.path.join(persist_dir, "index.faiss"))
+    with sqlite3.connect(os.path.join(persist_dir, "docstore.sqlite")) as db:
+        db.execute("DROP TABLE meta")
+        db.execute("DROP TABLE documents_fts")
+        db.execute("PRAGMA user_version = 0")
+    
+    assert load_store(persist_dir, fake_embeddings).similarity_search("Analysis 3", k=1)[0].page_content == "Analysis 3"
+    assert "index.faiss" not in os.listdir(persist_dir)
+    
+    # Read-only opens of an up-to-date store do not write
+    before = {name: os.stat(os.path.join(persist_dir, name)).st_mtime_ns for name in os.listdir(persist_dir)}
+    store = load_store(persist_dir, fake_embeddings)
+    assert store.docstore.lexical_search("Analysis", 10)
+    assert {name: os.stat(os.path.join(persist_dir, name)).st_mtime_ns for name in os.listdir(persist_dir)} == before
+
+
+def test_legacy_pickle_store_is_converted(tmp_path, fake_embeddings):
+    import os
+    from langchain_community.vectorstores import FAISS
+    from src.analysis.disk_store import load_store
+    
+    persist_dir = str(tmp_path / "store")
+    FAISS.from_documents([_document("a.com", 1, "Analysis 1")], fake_embeddings).save_local(persist_dir)
+    
+    store = load_store(persist_dir, fake_embeddings)
+    
+    assert not os.path.exists(os.path.join(persist_dir, "index.pkl"))
+    assert store.similarity_search("Analysis 1", k=1)[0].page_content == "Analysis 1"
+
+
+def test_sharded_store_updates_and_searches_per_site(tmp_path, fake_embeddings):
+    from src.analysis.vector_store import ShardedStore, update_sharded_store
+    
+    persist_dir = str(tmp_path / "store")
+    documents = [_document("a.com", i, f"A analysis {i}") for i in range(1, 4)]
+    documents += [_document("b.com", i, f"B analysis {i}") for i in range(1, 4)]
+    updates = update_sharded_store(documents, persist_dir, fake_embeddings)
+    assert {shard: u.added for shard, u in updates.items()} == {("target", "a.com"): 3, ("target", "b.com"): 3}
+    
+    # Only b.com changed; a.com's shard is not rewritten
+    a_index = tmp_path / "store" / "target" / "a.com" / "index.1.faiss"
+    a_mtime = a_index.stat().st_mtime_ns
+    fake_embeddings.embedded.clear()
+    updates = update_sharded_store(documents[:5], persist_dir, fake_embeddings)
+    assert updates[("target", "b.com")].removed == 1 and updates[("target", "a.com")].removed == 0
+    assert a_index.stat().st_mtime_ns == a_mtime and fake_embeddings.embedded == []
+    
+    store = ShardedStore(persist_dir, fake_embeddings)
+    assert store.search("B analysis 2", k=1)[0].page_content == "B analysis 2"
+    assert {d.metadata["website"] for d in store.search("B analysis 2", k=3, shards=[("target", "a.com")])} == {"a.com"}
+    
+    retriever = store.as_retriever(k=3)
+    assert {d.metadata["website"] for d in retriever.invoke("How does the hero on a.com compare?")} == {"a.com"}
+    assert store.mentioned_shards("what about b's footer?") == []
+    
+    update_sharded_store(documents[:3], persist_dir, fake_embeddings)
+    assert ShardedStore(persist_dir, fake_embeddings).shards == [("target", "a.com")]
+
+
+def test_hybrid_search_fast_path_skips_embedding(tmp_path, fake_embeddings):
+    from src.analysis.vector_store import ShardedStore, update_sharded_store
+    
+    persist_dir = str(tmp_path / "store")
+    texts = [
+        "Hero with a large Download Brochure CTA in orange",
+        "Testimonials carousel with learner photos",
+        "Footer with contact details and social links",
+        "Pricing table with a scholarship deadline banner",
+    ]
+    update_sharded_store([_document("a.com", i, text) for i, text in enumerate(texts, start=1)], persist_dir, fake_embeddings)
+    store = ShardedStore(persist_dir, fake_embeddings)
+    fake_embeddings.embedded.clear()
+    
+    hits = store.hybrid_search("Where is the Download Brochure CTA?", k=2)
+    assert [doc.page_content for doc in hits] == [texts[0]]
+    assert fake_embeddings.embedded == [] and store.fast_path_queries == 1
+    
+    hits = store.hybrid_search("which section mentions the scholarship deadline?", k=2)
+    assert hits[0].page_content == texts[3]
+    assert fake_embeddings.embedded == ["which section mentions the scholarship deadline?"]
+
+
+def test_fast_path_needs_a_clear_bm25_margin(tmp_path, fake_embeddings):
+    from src.analysis.vector_store import ShardedStore, update_sharded_store
+    
+    persist_dir = str(tmp_path / "store")
+    texts = [
+        "Hero with a Download Brochure link",
+        "Download the brochure: a brochure download form, download brochure again",
+        "Footer with contact details",
+        "Pricing table with a deadline banner",
+    ]
+    update_sharded_store([_document("a.com", i, text) for i, text in enumerate(texts, start=1)], persist_dir, fake_embeddings)
+    store = ShardedStore(persist_dir, fake_embeddings)
+    fake_embeddings.embedded.clear()
+    
+    # The full match barely outscores a partial one, so the vector ranking is consulted too
+    assert store.strong_matches("Where is the Download Brochure CTA?") is None
+    store.hybrid_search("Where is the Download Brochure CTA?", k=2)
+    assert store.fast_path_queries == 0 and len(fake_embeddings.embedded) == 1
+
+
+def test_lexical_search_fuses_shards_by_rank(tmp_path, fake_embeddings):
+    from src.analysis.vector_store import ShardedStore, update_sharded_store
+    
+    persist_dir = str(tmp_path / "store")
+    # "pricing" is common on a.com and rare on b.com, so raw BM25 scores favour b.com
+    documents = [_document("a.com", i, f"Pricing section {i}") for i in range(1, 6)]
+    documents += [_document("b.com", i, f"Pricing section {i}") for i in range(1, 3)]
+    documents += [_document("b.com", i, f"Footer {i}") for i in range(3, 11)]
+    update_sharded_store(documents, persist_dir, fake_embeddings)
+    store = ShardedStore(persist_dir, fake_embeddings)
+    
+    hits = store.lexical_search('"pricing"', k=2)
+    assert {doc.metadata["website"] for doc, _ in hits} == {"a.com", "b.com"}
+
+
+def test_chunk_documents_splits_on_sections_then_tokens(fake_encoding):
+    from src.analysis.vector_store import chunk_documents
+    
+    analysis = "Segment Analysis:\n" + "hero copy " * 6 + "\n\nCritique:\n" + "weak cta " * 20
+    short = _document("a.com", 2, "Segment Analysis:\nFooter\n\nCritique:\nFine")
+    chunks = chunk_documents([_document("a.com", 1, analysis), short], max_tokens=15, overlap=3, encoding=fake_encoding)
+    
+    long_chunks = [c for c in chunks if c.metadata["segment_index"] == 1]
+    assert long_chunks[0].page_content.startswith("Segment Analysis:") and "Critique" not in long_chunks[0].page_content
+    assert long_chunks[1].page_content.startswith("Critique:")
+    assert all(len(fake_encoding.encode_ordinary_batch([c.page_content])[0]) <= 15 for c in long_chunks)
+    for chunk in long_chunks:
+        assert analysis[chunk.metadata["chunk_start"]:chunk.metadata["chunk_end"]] == chunk.page_content
+        assert chunk.metadata["chunk_count"] == len(long_chunks)
+    # Consecutive windows of the long critique overlap by three tokens
+    assert long_chunks[1].metadata["chunk_end"] > long_chunks[2].metadata["chunk_start"]
+    assert long_chunks[-1].metadata["chunk_end"] == len(analysis)
+    
+    assert chunks[-1].page_content == short.page_content and chunks[-1].metadata["chunk_count"] == 1
+
+
+def test_chunk_documents_packs_small_sections_together(fake_encoding):
+    from src.analysis.vector_store import chunk_documents
+    
+    analysis = "Segment Analysis:\nHero\n\nCritique:\nFine\n" + "Segment Analysis:\n" + "x " * 20
+    chunks = chunk_documents([_document("a.com", 1, analysis)], max_tokens=20, overlap=0, encoding=fake_encoding)
+    
+    assert chunks[0].page_content == "Segment Analysis:\nHero\n\nCritique:\nFine\n"
+    assert [c.metadata["chunk_index"] for c in chunks] == list(range(len(chunks)))
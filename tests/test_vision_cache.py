@@ -0,0 +1,42 @@
+import time
+from src.analysis.vision_cache import VisionCache
+
+
+def test_cache_keys_on_image_prompt_and_model(tmp_path):
+    cache = VisionCache(str(tmp_path / "cache.sqlite"))
+    cache.put(b"pixels", "prompt {segment_num}", "model-a", "Analysis")
+
+    assert cache.get(b"pixels", "prompt {segment_num}", "model-a") == "Analysis"
+    assert cache.get(b"other pixels", "prompt {segment_num}", "model-a") is None
+    assert cache.get(b"pixels", "new prompt {segment_num}", "model-a") is None
+    assert cache.get(b"pixels", "prompt {segment_num}", "model-b") is None
+    assert (cache.hits, cache.misses) == (1, 3)
+
+
+def test_cache_persists_entries_and_counters(tmp_path):
+    path = str(tmp_path / "cache.sqlite")
+    cache = VisionCache(path)
+    cache.put(b"pixels", "prompt", "model", "Analysis")
+    cache.get(b"pixels", "prompt", "model")
+    cache.close()
+
+    reopened = VisionCache(path)
+    assert reopened.get(b"pixels", "prompt", "model") == "Analysis"
+    assert reopened.stats()["hits"] == 2 and reopened.stats()["entries"] == 1
+
+
+def test_prune_by_age_then_size(tmp_path):
+    cache = VisionCache(str(tmp_path / "cache.sqlite"))
+    for i in range(4):
+        cache.put(f"image {i}".encode(), "prompt", "model", "x" * 100)
+    cache._db.execute("UPDATE entries SET created_at = ? WHERE input_hash = ?",
+                      (time.time() - 40 * 86400, VisionCache.key(b"image 0", "prompt", "model")[0]))
+    # image 1 is the least recently used of the rest
+    cache._db.execute("UPDATE entries SET last_used = 0 WHERE input_hash = ?",
+                      (VisionCache.key(b"image 1", "prompt", "model")[0],))
+
+    assert cache.prune(max_bytes=250, max_age_days=30) == 2
+    assert cache.get(b"image 0", "prompt", "model") is None
+    assert cache.get(b"image 1", "prompt", "model") is None
+    assert cache.get(b"image 2", "prompt", "model") is not None
+    assert cache.stats()["bytes"] == 200